@@ -2,12 +2,15 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 from . import models, schemas
 from .database import get_db
+from .password_hashing import BCRYPT_ROUNDS, crypt_context, password_hasher
+from .token_cache import token_cache
 from dotenv import load_dotenv
 import os
 load_dotenv("/app/.env")
@@ -18,7 +21,7 @@ SECRET_KEY = os.getenv("BACKEND_SECRET_KEY")  # In production, use environment v
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = crypt_context(BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def verify_password(plain_password, hashed_password):
@@ -30,10 +33,26 @@ def get_password_hash(password):
 def get_user(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = get_user(db, email)
-    if not user or not verify_password(password, user.hashed_password):
+def _save_user(db: Session, user: models.User):
+    db.commit()
+    db.refresh(user)  # Reload now rather than lazily on the event loop
+
+async def authenticate_user(db: Session, email: str, password: str):
+    """Check a login, verifying the password on the hashing pool
+
+    The queries run in the threadpool so they don't block the event loop.
+    """
+    user = await run_in_threadpool(get_user, db, email)
+    if not user:
+        return False
+    valid, needs_rehash = await password_hasher.verify(password, user.hashed_password)
+    if not valid:
         return False
+    if needs_rehash:
+        # BCRYPT_ROUNDS changed since this hash was made
+        user.hashed_password = await password_hasher.hash(password)
+        await run_in_threadpool(_save_user, db, user)
+        token_cache.invalidate_user(user.id)
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -66,6 +85,10 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cached = token_cache.get(token)
+    if cached is not None:
+        # Attach the cached row to this request's session without a SELECT
+        return db.merge(cached, load=False)
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -77,4 +100,11 @@ async def get_current_user(
     user = get_user(db, email=token_data.email)
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    token_cache.put(token, user.id, _detached_copy(user), payload["exp"])
+    return user
+
+def _detached_copy(user: models.User) -> models.User:
+    """Copy of a loaded User that belongs to no session, for the token cache"""
+    copy = models.User(**{attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs})
+    make_transient_to_detached(copy)
+    return copy
\ No newline at end of file
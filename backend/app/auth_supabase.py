@@ -6,13 +6,20 @@ from typing import Optional, Dict, Any
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer, HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
+import asyncio
+import jwt
 import logging
+import os
+import time
 
 # Import the Supabase client
-from .supabase import supabase, get_anon_client
+from .supabase import supabase, supabase_url, get_auth_client, get_async_supabase
+from .dependencies import SupabaseErrorHandler
+from .token_cache import token_cache
 
 # Setup security schemes
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 security = HTTPBearer()
 
 # Setup logging
@@ -21,6 +28,23 @@ logger = logging.getLogger(__name__)
 # Constants
 ACCESS_TOKEN_EXPIRE_MINUTES = 30  # Keep compatibility with original value
 
+# Access tokens are verified locally: HS256 tokens against the project's JWT
+# secret, asymmetric ones against the Supabase Auth JWKS
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWKS_URL = os.getenv("SUPABASE_JWKS_URL", f"{supabase_url}/auth/v1/.well-known/jwks.json")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+SUPABASE_JWT_ISSUER = os.getenv("SUPABASE_JWT_ISSUER")  # Checked only when set
+JWT_LEEWAY_SECONDS = float(os.getenv("JWT_LEEWAY_SECONDS", "30"))
+LOCAL_ALGORITHMS = ("HS256", "RS256", "ES256")
+# The JWKS is fetched at most once per this many seconds; tokens whose key id
+# isn't in the last fetched set are rejected in between
+JWKS_REFRESH_SECONDS = float(os.getenv("JWKS_REFRESH_SECONDS", "300"))
+
+_jwks_client = None
+_signing_keys: Dict[str, Any] = {}  # kid -> key, exactly the keys of the last JWKS fetched
+_jwks_fetched_at: Optional[float] = None
+_jwks_lock: Optional[asyncio.Lock] = None
+
 class UserData(BaseModel):
     """Simplified user data model retrieved from Supabase Auth"""
     id: str
@@ -30,11 +54,12 @@ class UserData(BaseModel):
 async def authenticate_user(email: str, password: str):
     """Authenticate a user through Supabase Auth"""
     try:
-        # Use anon key for authentication (this is the proper security model)
-        auth_client = get_anon_client()
+        # Use anon key for authentication (this is the proper security model);
+        # the shared auth client reuses pooled connections
+        auth_client = get_auth_client()
         
         # Use Supabase's built-in auth system
-        response = auth_client.auth.sign_in_with_password({
+        response = auth_client.sign_in_with_password({
             "email": email,
             "password": password
         })
@@ -46,7 +71,14 @@ async def authenticate_user(email: str, password: str):
         return None
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
-    """Get the current user from a JWT token using Supabase Auth"""
+    """Get the current user from a JWT token, verified locally"""
+    return await _current_user(token, check_revocation=False)
+
+async def get_current_user_verified(token: str = Depends(oauth2_scheme)):
+    """Get the current user, also checking with Supabase Auth that the session wasn't revoked"""
+    return await _current_user(token, check_revocation=True)
+
+async def _current_user(token: str, check_revocation: bool):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -54,113 +86,150 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     )
     
     try:
-        # Manually verify the token (Supabase doesn't have a direct "verify token" method)
-        user_data = await verify_token(token)
+        user_data = await verify_token(token, check_revocation=check_revocation)
         
         # Return a UserData object
         return UserData(
             id=user_data["id"],
-            email=user_data["email"],
+            email=user_data["email"] or "",
             user_metadata=user_data.get("user_metadata", {})
         )
-    except HTTPException:
+    except HTTPException as e:
+        e.headers = e.headers or {"WWW-Authenticate": "Bearer"}
         raise
     except Exception as e:
         # Log the error
         logger.error(f"Token validation error: {str(e)}")
         raise credentials_exception
 
-async def verify_token(token: str) -> Dict[str, Any]:
-    """Verify a JWT token using Supabase's Auth API"""
-    try:
-        # Call Supabase's token refresh to validate the token
-        # We don't need to refresh, just decode it
-        from supabase.lib.client_options import ClientOptions
-        import jwt
-        import os
-        
-        # First, try to decode the JWT directly
-        # This won't verify signature but will check expiration
+def _get_jwks_client() -> "jwt.PyJWKClient":
+    global _jwks_client
+    if _jwks_client is None:
+        _jwks_client = jwt.PyJWKClient(SUPABASE_JWKS_URL, cache_keys=True)
+    return _jwks_client
+
+async def _get_signing_key(token: str, header: Dict[str, Any]):
+    """Key to check a token's signature with: the JWT secret for HS256, otherwise the JWKS key"""
+    if header.get("alg") == "HS256":
+        return SUPABASE_JWT_SECRET
+    kid = header.get("kid")
+    key = _signing_keys.get(kid)
+    if key is None:
+        await _refresh_signing_keys()
+        key = _signing_keys.get(kid)
+    if key is None:
+        raise jwt.InvalidTokenError(f"Unknown signing key: {kid}")
+    return key
+
+def _jwks_due() -> bool:
+    return _jwks_fetched_at is None or time.monotonic() - _jwks_fetched_at >= JWKS_REFRESH_SECONDS
+
+async def _refresh_signing_keys():
+    """Refetch the JWKS unless it was fetched within JWKS_REFRESH_SECONDS
+
+    Unknown key ids therefore cost at most one outbound request per interval,
+    however many tokens carry them.
+    """
+    global _jwks_fetched_at, _jwks_lock, _signing_keys
+    if not _jwks_due():
+        return
+    if _jwks_lock is None:
+        _jwks_lock = asyncio.Lock()
+    async with _jwks_lock:
+        if not _jwks_due():
+            return
+        _jwks_fetched_at = time.monotonic()
         try:
-            # Decode without verification first
-            decoded = jwt.decode(
-                token, 
-                options={"verify_signature": False}
-            )
-            
-            # If we get here, at least the token structure is valid
-            user_id = decoded.get("sub")
-            
-            if not user_id:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid token format - missing subject (user id)"
-                )
-                
-            # Try to get user information with this token
-            # Create a new client with this token for verification
-            from .supabase import supabase_url, anon_key
-            auth_client = create_client(
-                supabase_url,
-                anon_key,
-                options=ClientOptions(
-                    auto_refresh_token=False,
-                    persist_session=False,
-                    headers={
-                        "Authorization": f"Bearer {token}"
-                    }
-                )
-            )
-            
-            # Try to get the user with this token
-            user = auth_client.auth.get_user()
-            
-            # If we get here, the token is valid
-            return {
-                "id": user.user.id,
-                "email": user.user.email,
-                "user_metadata": user.user.user_metadata
-            }
-            
-        except Exception as inner_e:
-            # If direct decoding fails, log and continue to next approach
-            logger.warning(f"Token direct decode failed: {str(inner_e)}")
-            
-            # Fall back to getting user from profile in our database
-            # This assumes the token can access the database through RLS
-            anon_client = get_anon_client()
-            
-            # Set the auth token on the client
-            anon_client.auth.set_session(token, None)
-            
-            # Try to get the user's profile from our database 
-            profile_response = anon_client.table("profiles").select("*").limit(1).execute()
-            
-            if profile_response.data and len(profile_response.data) > 0:
-                # If we can get the profile, the token must be valid
-                return {
-                    "id": profile_response.data[0]["id"],
-                    "email": "user@example.com",  # We don't have email in profile
-                    "user_metadata": {
-                        "username": profile_response.data[0]["username"]
-                    }
+            # The JWKS request runs off the event loop
+            jwk_set = await asyncio.to_thread(_get_jwks_client().get_jwk_set, True)
+        except Exception as e:
+            logger.error(f"Error fetching the Supabase JWKS: {str(e)}")
+            return
+        _signing_keys = {jwk.key_id: jwk.key for jwk in jwk_set.keys if jwk.key_id}
+
+async def decode_token(token: str) -> Dict[str, Any]:
+    """Check a token's signature, expiry and audience locally and return its claims"""
+    header = jwt.get_unverified_header(token)
+    if header.get("alg") not in LOCAL_ALGORITHMS:
+        raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm: {header.get('alg')}")
+    key = await _get_signing_key(token, header)
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[header["alg"]],
+        audience=SUPABASE_JWT_AUDIENCE,
+        issuer=SUPABASE_JWT_ISSUER,
+        options={"require": ["exp", "sub"]},
+        leeway=JWT_LEEWAY_SECONDS,
+    )
+
+async def _fetch_auth_user(token: str) -> Dict[str, Any]:
+    """Ask Supabase Auth for the token's user; fails for revoked sessions and deleted users"""
+    client = await get_async_supabase()
+    if client is not None:
+        response = await client.auth.get_user(token)
+    else:
+        response = await asyncio.to_thread(supabase.auth.get_user, token)
+    if not response or not response.user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication token"
+        )
+    return {
+        "id": response.user.id,
+        "email": response.user.email,
+        "user_metadata": response.user.user_metadata or {}
+    }
+
+async def verify_token(token: str, check_revocation: bool = False) -> Dict[str, Any]:
+    """Verify a Supabase access token and return the user it belongs to
+
+    The signature and claims are checked locally. With check_revocation the
+    token is also validated by Supabase Auth over the network, which catches
+    signed-out sessions and deleted users; use it for sensitive operations.
+    HS256 tokens fall back to the network check when no JWT secret is set.
+    Verified tokens are cached until they expire.
+    """
+    if not check_revocation:
+        user_data = token_cache.get(token)
+        if user_data is not None:
+            return user_data
+    try:
+        if jwt.get_unverified_header(token).get("alg") == "HS256" and not SUPABASE_JWT_SECRET:
+            logger.warning("SUPABASE_JWT_SECRET is not set, validating token with Supabase Auth")
+            user_data = await _fetch_auth_user(token)
+            # Supabase Auth accepted it, so its exp can be trusted
+            expires_at = jwt.decode(token, options={"verify_signature": False}).get("exp", 0)
+        else:
+            claims = await decode_token(token)
+            if check_revocation:
+                user_data = await _fetch_auth_user(token)
+            else:
+                user_data = {
+                    "id": claims["sub"],
+                    "email": claims.get("email"),
+                    "user_metadata": claims.get("user_metadata") or {}
                 }
-            
-            # If both approaches fail, token is invalid
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication token"
-            )
-            
+            expires_at = claims["exp"]
+        token_cache.put(token, user_data["id"], user_data, expires_at)
+        return user_data
+    except HTTPException:
+        raise
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has expired"
+        )
     except jwt.PyJWTError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Invalid token format: {str(e)}"
+            detail=f"Invalid token: {str(e)}"
         )
     except Exception as e:
+        logger.error(f"Token validation error: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Could not validate credentials: {str(e)}"
+            detail="Could not validate credentials"
         )
 
 async def get_user_from_db(user_id: str):
@@ -193,29 +262,17 @@ async def create_user(email: str, password: str, username: str):
                 detail="Failed to create user through Supabase Auth"
             )
             
-        # The profile should be automatically created by the database trigger
-        # Let's verify it exists
-        user_id = user_response.user.id
-        
-        # Check if profile exists
-        profile = await get_user_from_db(user_id)
-        
-        # If for some reason the profile wasn't created by the trigger,
-        # we should handle that - though it shouldn't happen with proper DB setup
-        
+        # The profile is created by the database trigger; callers that need
+        # it read it with get_user_from_db
         return user_response.user
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"User creation error: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Failed to create user: {str(e)}"
-        )
+        SupabaseErrorHandler.handle_signup_error(e)
 
 # Alternative approach using HTTPBearer - useful for cases where standard OAuth2 doesn't fit
 async def get_current_user_http(auth: HTTPAuthorizationCredentials = Depends(security)):
     """Get the current user using HTTPBearer authentication scheme"""
     return await get_current_user(auth.credentials)
-
-# Import needed after function definition to avoid circular imports
-from supabase import create_client
@@ -52,6 +52,25 @@ class SupabaseErrorHandler:
                 headers={"WWW-Authenticate": "Bearer"}
             )
     
+    @staticmethod
+    def handle_signup_error(error):
+        """Handle user creation errors from Supabase Auth."""
+        error_message = str(error)
+        
+        # Supabase Auth enforces unique emails; newer versions also set an error code
+        if (getattr(error, "code", None) == "email_exists"
+                or "already been registered" in error_message
+                or "already registered" in error_message):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered"
+            )
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Failed to create user: {error_message}"
+            )
+    
     @staticmethod
     def handle_database_error(error):
         """Handle database errors from Supabase."""
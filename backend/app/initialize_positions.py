@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from .database import SessionLocal
 from . import models
+from .task_positions import spaced_positions
 
 def initialize_task_positions():
     """Initialize positions for existing tasks based on creation date"""
@@ -16,9 +17,9 @@ def initialize_task_positions():
                 models.Task.user_id == user.id
             ).order_by(models.Task.created_at).all()
             
-            # Update positions
-            for i, task in enumerate(tasks):
-                task.position = i + 1
+            # Update positions, leaving gaps so tasks can be moved without renumbering
+            for task, position in zip(tasks, spaced_positions(len(tasks))):
+                task.position = position
                 
         db.commit()
         print(f"Successfully initialized positions for tasks")
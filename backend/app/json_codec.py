@@ -0,0 +1,50 @@
+# app/json_codec.py
+"""
+JSON encoding shared by WebSocket broadcasts and REST responses.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. Both produce compact output with the same handling of datetimes,
+dates and UUIDs, so clients can't tell which encoder is active.
+"""
+import json
+import uuid
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def to_json_compatible(obj: Any) -> Any:
+    """Datetimes, dates and UUIDs as the strings the JSON encoding uses"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps_bytes(obj: Any) -> bytes:
+        """Encode obj as compact UTF-8 JSON"""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps_bytes(obj: Any) -> bytes:
+        """Encode obj as compact UTF-8 JSON"""
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=to_json_compatible).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """Encode obj as a compact JSON string, e.g. for a WebSocket text frame"""
+    return dumps_bytes(obj).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that renders with the shared encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
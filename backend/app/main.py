@@ -2,7 +2,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .database import engine
+from .json_codec import FastJSONResponse
 from . import models
+# The WebSocket router serves timers from the Supabase manager, so that is the one to start and stop
+from .ws_manager_supabase import manager as ws_manager
+from .password_hashing import password_hasher
 import os
 import logging
 from fastapi.responses import FileResponse
@@ -20,7 +24,7 @@ STATIC_DIR = "/app/app/frontend-build"  # Absolute path in container
 models.Base.metadata.create_all(bind=engine)
 
 # Main FastAPI app
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # CORS setup
 app.add_middleware(
@@ -31,6 +35,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def start_timers():
+    """Join the worker bus and resume timers saved by the previous worker"""
+    await ws_manager.startup()
+
+@app.on_event("shutdown")
+async def shutdown_timers():
+    """Stop background timer tasks and flush queued writes before the worker exits"""
+    await ws_manager.shutdown()
+    password_hasher.shutdown()
+
 # Include routers
 app.include_router(auth.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
@@ -25,7 +25,9 @@ except ImportError:
     pomodoro_router = None
 
 # Import Supabase client
-from .supabase import supabase, get_diagnostics
+from .supabase import supabase, clients, get_diagnostics, close_async_supabase
+from .ws_manager_supabase import manager as ws_manager
+from .json_codec import FastJSONResponse
 
 # Setup logging
 # First check if we're running in Docker (logs directory exists)
@@ -63,7 +65,8 @@ else:
 app = FastAPI(
     title="Pomodoro TimerFlow API",
     description="API for Pomodoro TimerFlow application using Supabase",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # Make supabase client available to routes via app.state
@@ -78,6 +81,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def start_timers():
+    """Join the worker bus and resume timers saved by the previous worker"""
+    await ws_manager.startup()
+
+@app.on_event("shutdown")
+async def shutdown_timers():
+    """Stop background timer tasks, flush queued writes and close the async Supabase client before the worker exits"""
+    await ws_manager.shutdown()
+    await close_async_supabase()
+
 # Request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
@@ -96,6 +110,15 @@ async def ping():
     """Simple ping endpoint to verify API is running"""
     return {"status": "ok", "service": "running", "version": "2.0.0"}
 
+@app.get("/api/metrics")
+async def metrics():
+    """WebSocket connection, timer and broadcast latency counters"""
+    return {
+        **ws_manager.get_metrics(),
+        "commands": websocket_router.commands.get_stats(),
+        "supabase_clients": clients.get_stats(),
+    }
+
 @app.get("/api/supabase-diagnostic")
 async def supabase_diagnostic():
     """Diagnostic endpoint to check Supabase configuration"""
@@ -0,0 +1,36 @@
+# app/metrics.py
+"""
+Lightweight in-process counters for the /api/metrics endpoint.
+"""
+from typing import Dict
+
+
+class LatencyStats:
+    """Running count, error count, average and max of an operation's duration"""
+
+    __slots__ = ("count", "errors", "total", "max", "last")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def record(self, seconds: float, error: bool = False):
+        self.count += 1
+        if error:
+            self.errors += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "last_ms": round(self.last * 1000, 3),
+        }
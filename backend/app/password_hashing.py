@@ -0,0 +1,125 @@
+# app/password_hashing.py
+"""
+bcrypt hashing and verification off the event loop.
+
+Each bcrypt call burns a few hundred milliseconds of CPU, so they run on a
+process pool instead of the worker's event loop. At most `workers` hashes
+run at once; up to `max_queue` more may wait, and anything beyond that is
+turned away with a 503 so a login burst can't pile up unbounded work.
+
+The bcrypt cost comes from BCRYPT_ROUNDS. Hashes made with a different cost
+verify as usual and are reported as needing a rehash, which login does
+transparently.
+
+This module is imported by the pool's worker processes, so it must stay
+free of app imports with side effects (database setup and the like).
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from .metrics import LatencyStats
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
+
+_contexts: Dict[int, CryptContext] = {}
+
+
+def crypt_context(rounds: int) -> CryptContext:
+    """bcrypt context whose policy is exactly `rounds`, so any other cost needs an update"""
+    context = _contexts.get(rounds)
+    if context is None:
+        context = _contexts[rounds] = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+    return context
+
+
+def hash_password(password: str, rounds: int) -> str:
+    return crypt_context(rounds).hash(password)
+
+
+def verify_password(password: str, hashed_password: str, rounds: int) -> Tuple[bool, bool]:
+    """(password matches, hash should be redone with the current cost)"""
+    context = crypt_context(rounds)
+    if not context.verify(password, hashed_password):
+        return False, False
+    return True, context.needs_update(hashed_password)
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = 2, max_queue: int = 64, rounds: int = 12):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self.hash_stats = LatencyStats()
+        self.rejected = 0
+        self._pending = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: workers start clean instead of forking the threaded server process
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-ins in progress, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        self._pending += 1
+        try:
+            async with self._semaphore:
+                started = time.perf_counter()
+                try:
+                    result = await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+                except Exception:
+                    self.hash_stats.record(time.perf_counter() - started, error=True)
+                    raise
+                self.hash_stats.record(time.perf_counter() - started)
+                return result
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, bool]:
+        """(password matches, hash should be redone with the current cost)"""
+        return await self._run(verify_password, password, hashed_password, self.rounds)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "rejected": self.rejected,
+            "rounds": self.rounds,
+            "hash": self.hash_stats.as_dict(),
+        }
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE, BCRYPT_ROUNDS)
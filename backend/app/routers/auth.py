@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from datetime import timedelta
 from .. import models, schemas, auth
 from ..database import get_db
+from ..token_cache import token_cache
 
 router = APIRouter(tags=["authentication"])
 
@@ -19,7 +20,7 @@ async def login_for_access_token(
             detail="Email and password are required",
         )
 
-    user = auth.authenticate_user(db, form_data.username, form_data.password)
+    user = await auth.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -37,4 +38,11 @@ async def login_for_access_token(
 @router.get("/verify-token")
 async def verify_token(current_user: models.User = Depends(auth.get_current_user)):
     """Verify if the provided token is valid"""
-    return {"valid": True, "user_id": current_user.id}
\ No newline at end of file
+    return {"valid": True, "user_id": current_user.id}
+
+
+@router.post("/logout")
+async def logout(token: str = Depends(auth.oauth2_scheme)):
+    """Log the user out; the token stops being served from the verified-token cache"""
+    token_cache.invalidate(token)
+    return {"status": "success"}
@@ -2,10 +2,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
+from typing import Optional
 import logging
 from .. import schemas
-from ..auth_supabase import authenticate_user, get_current_user, verify_token, ACCESS_TOKEN_EXPIRE_MINUTES, create_user
-from ..supabase import get_anon_client
+from ..auth_supabase import authenticate_user, get_current_user, get_current_user_verified, optional_oauth2_scheme, verify_token, ACCESS_TOKEN_EXPIRE_MINUTES, create_user
+from ..supabase import supabase, get_auth_client
+from ..token_cache import token_cache
 
 router = APIRouter(tags=["authentication"])
 logger = logging.getLogger(__name__)
@@ -42,11 +44,11 @@ async def login_for_access_token(
 async def refresh_access_token(refresh_token: str):
     """Refresh an expired access token"""
     try:
-        # Create a client with the anon key
-        auth_client = get_anon_client()
+        # Shared client with the anon key
+        auth_client = get_auth_client()
         
         # Use Supabase's refresh token endpoint
-        response = auth_client.auth.refresh_session(refresh_token)
+        response = auth_client.refresh_session(refresh_token)
         
         if not response or not response.session:
             raise HTTPException(
@@ -71,24 +73,23 @@ async def refresh_access_token(refresh_token: str):
         )
 
 @router.get("/verify-token")
-async def verify_token_endpoint(current_user = Depends(get_current_user)):
+async def verify_token_endpoint(current_user = Depends(get_current_user_verified)):
     """Verify if the provided token is valid"""
     return {"valid": True, "user_id": current_user.id}
 
 @router.post("/logout")
-async def logout(response: Response):
+async def logout(response: Response, token: Optional[str] = Depends(optional_oauth2_scheme)):
     """Log the user out by invalidating the session"""
-    try:
-        auth_client = get_anon_client()
-        auth_client.auth.sign_out()
-        response.delete_cookie(key="refreshToken")
-        return {"status": "success"}
-    except Exception as e:
-        logger.error(f"Logout error: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Logout failed: {str(e)}"
-        )
+    if token:
+        token_cache.invalidate(token)
+        try:
+            # Revoke the session's refresh tokens; the shared clients hold no session to sign out
+            supabase.auth.admin.sign_out(token)
+        except Exception as e:
+            # An expired or already revoked token leaves nothing to sign out
+            logger.warning(f"Could not revoke session on logout: {str(e)}")
+    response.delete_cookie(key="refreshToken")
+    return {"status": "success"}
 
 @router.post("/signup")
 async def signup(user_data: schemas.UserCreate):
@@ -115,6 +116,8 @@ async def signup(user_data: schemas.UserCreate):
             "username": user_data.username,
             "confirmed": True  # Will be true since we use email_confirm=True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Signup error: {str(e)}")
         raise HTTPException(
@@ -5,6 +5,8 @@ from datetime import datetime
 from .. import schemas
 from ..auth_supabase import get_current_user
 from ..supabase import supabase
+from ..ws_manager_supabase import manager
+from .. import timer_repository
 
 router = APIRouter(prefix="/pomodoro", tags=["pomodoro"])
 
@@ -79,19 +81,13 @@ async def complete_pomodoro_session(
             .execute()
             
         # If it was a work session, increment the task's completed_pomodoros count
-        if session_type == "work":
-            task_update = supabase.table("tasks") \
-                .select("completed_pomodoros") \
-                .eq("id", task_id) \
-                .execute()
-                
-            if task_update.data and len(task_update.data) > 0:
-                current_count = task_update.data[0]["completed_pomodoros"] or 0
-                
-                supabase.table("tasks") \
-                    .update({"completed_pomodoros": current_count + 1}) \
-                    .eq("id", task_id) \
-                    .execute()
+        if session_type == "work" and task_id is not None:
+            new_count = await timer_repository.increment_completed_pomodoros(task_id)
+            if new_count is not None:
+                # Timer completions still waiting in the write-behind queue count too
+                manager.task_cache.update(
+                    task_id, completed_pomodoros=new_count + manager.write_behind.pending_increment(task_id)
+                )
         
         return {"status": "success"}
     except HTTPException:
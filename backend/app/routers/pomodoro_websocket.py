@@ -1,173 +1,175 @@
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, Query
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, Query
 import logging
-from .. import auth_supabase
-from ..ws_manager_supabase import manager
+from .. import auth_supabase, schemas
+from ..ws_manager_supabase import manager, PROTOCOL_POLL, PROTOCOLS
+from ..timer_state import DEFAULT_POMODORO_SETTINGS
+from ..ws_commands import CommandRegistry
+from .. import ws_encoding
 from ..supabase import supabase
 
 router = APIRouter(tags=["pomodoro_websocket"])
 
 logger = logging.getLogger(__name__)
 
+commands = CommandRegistry()
+
+@commands.command("start", schemas.StartTimerCommand)
+async def start(websocket: WebSocket, user_id: str, command: schemas.StartTimerCommand):
+    # Get user settings (served from the settings cache after the first lookup)
+    try:
+        user_settings = await manager.load_user_settings(user_id)
+
+        if not user_settings:
+            # Default settings if not found
+            logger.warning(f"No settings found for user {user_id}, using defaults")
+            user_settings = DEFAULT_POMODORO_SETTINGS
+    except Exception as e:
+        logger.error(f"Error getting user settings: {str(e)}")
+        # Default settings
+        user_settings = DEFAULT_POMODORO_SETTINGS
+
+    # Start new timer session
+    await manager.start_timer(
+        user_id=user_id,
+        task_id=command.task_id,
+        session_type=command.session_type.value,
+        duration=command.duration,
+        preset_type=command.preset_type.value,
+        user_settings=user_settings
+    )
+    await manager.sync_timer_state(user_id)
+    logger.info(f"Timer started for user {user_id}")
+
+@commands.command("stop")
+async def stop(websocket: WebSocket, user_id: str, command: schemas.WSCommand):
+    manager.stop_timer(user_id)
+    await manager.broadcast_to_user(user_id, {"type": "timer_stopped"})
+    logger.info(f"Timer stopped for user {user_id}")
+
+@commands.command("pause")
+async def pause(websocket: WebSocket, user_id: str, command: schemas.WSCommand):
+    if user_id in manager.timer_states:
+        manager.pause_timer(user_id)
+        await manager.sync_timer_state(user_id)
+        logger.info(f"Timer paused for user {user_id}")
+
+@commands.command("resume")
+async def resume(websocket: WebSocket, user_id: str, command: schemas.WSCommand):
+    if user_id in manager.timer_states:
+        manager.resume_timer(user_id)
+        await manager.sync_timer_state(user_id)
+        logger.info(f"Timer resumed for user {user_id}")
+
+@commands.command("sync_request")
+async def sync_request(websocket: WebSocket, user_id: str, command: schemas.WSCommand):
+    # Reply only to the requesting device; other devices get pushes on change
+    await manager.sync_timer_state(user_id, websocket)
+    logger.debug(f"Timer state synced for user {user_id}")
+
+@commands.command("skip_to_next")
+async def skip_to_next(websocket: WebSocket, user_id: str, command: schemas.WSCommand):
+    if user_id in manager.timer_states:
+        await manager.skip_to_next(user_id)
+        await manager.sync_timer_state(user_id)
+        logger.info(f"Timer skipped to next session for user {user_id}")
+
+@commands.command("reset_rounds")
+async def reset_rounds(websocket: WebSocket, user_id: str, command: schemas.WSCommand):
+    await manager.reset_rounds(user_id)
+    await manager.sync_timer_state(user_id)
+    await manager.broadcast_to_user(user_id, {"type": "rounds_reset"})
+    logger.info(f"Rounds reset for user {user_id}")
+
+@commands.command("settings_updated")
+async def settings_updated(websocket: WebSocket, user_id: str, command: schemas.WSCommand):
+    # Refresh the user settings in memory
+    try:
+        # PUT /users/settings writes through to the settings cache
+        user_settings = await manager.load_user_settings(user_id)
+        if user_settings:
+            if user_id in manager.timer_states:
+                manager.timer_states[user_id].apply_settings(user_settings)
+                manager.mark_changed(user_id)
+                logger.info(f"Settings updated for user {user_id}")
+
+            # Notify all clients about settings update
+            await manager.broadcast_to_user(user_id, {
+                "type": "settings_updated",
+                "data": {
+                    "settings": user_settings.model_dump()
+                }
+            })
+    except Exception as e:
+        logger.error(f"Error refreshing settings: {str(e)}")
+
+    # Force timer state sync
+    await manager.sync_timer_state(user_id)
+
+@commands.command("change_preset", schemas.ChangePresetCommand)
+async def change_preset(websocket: WebSocket, user_id: str, command: schemas.ChangePresetCommand):
+    if user_id in manager.timer_states:
+        state = manager.timer_states[user_id]
+        state.preset_type = command.preset_type.value
+        # Update timer duration based on new preset type and current session
+        state.time_remaining = state.duration_for(state.session_type)
+        manager.mark_changed(user_id)
+        await manager.sync_timer_state(user_id)
+        logger.info(f"Preset changed to {state.preset_type} for user {user_id}")
+
 @router.websocket("/ws/")
 async def websocket_endpoint(
     websocket: WebSocket,
     token: str = Query(None),
+    protocol: str = Query(PROTOCOL_POLL),
 ):
     logger.info(f"WebSocket connection attempt with token provided: {token is not None}")
     if not token:
         await websocket.close(code=1008, reason="Missing authentication token")
         return
+    if protocol not in PROTOCOLS:
+        await websocket.close(code=1008, reason=f"Unsupported sync protocol: {protocol}")
+        return
 
     try:
-        # Verify token and get user
-        user_data = await auth_supabase.verify_token(token)
+        # Verify token and get user (checked locally, no Supabase Auth round trip)
+        try:
+            user_data = await auth_supabase.verify_token(token)
+        except HTTPException as e:
+            user_data = None
+            logger.warning(f"Invalid token provided: {e.detail}")
         if not user_data:
-            logger.warning("Invalid token provided")
             await websocket.close(code=1008, reason="Invalid authentication token")
             return
           
-        user_id = str(user_data["user_id"])
+        user_id = str(user_data["id"])
         logger.info(f"User authenticated: {user_id}")
         
         # Attach the supabase client to the websocket for use in handlers
         websocket.app = type('App', (), {'supabase': supabase})()
         
+        # Binary frames for clients that offer msgpack/cbor as a subprotocol, JSON otherwise
+        encoding = ws_encoding.negotiate(websocket.scope.get("subprotocols", []))
+
         # Connect to the websocket manager
-        await manager.connect(websocket, user_id)
-        logger.info(f"WebSocket connected for user: {user_id}")
+        await manager.connect(websocket, user_id, protocol, encoding)
+        encoding = encoding or ws_encoding.ENCODING_JSON
+        logger.info(f"WebSocket connected for user: {user_id} ({protocol} sync, {encoding})")
           
         while True:
             try:
-                data = await websocket.receive_json()
-                logger.debug(f"Received message from user {user_id}: {data['type']}")
-                  
-                if data["type"] == "start":
-                    # Get user settings from Supabase
-                    try:
-                        # Use profiles table with pomodoro_settings
-                        user_response = await supabase.table("profiles").select("pomodoro_settings").eq("id", user_id).execute()
-                        user_settings = user_response.data[0]["pomodoro_settings"] if user_response.data else None
-                        
-                        if not user_settings:
-                            # Default settings if not found
-                            logger.warning(f"No settings found for user {user_id}, using defaults")
-                            user_settings = {
-                                "short": {
-                                    "work_duration": 25,
-                                    "short_break": 5,
-                                    "long_break": 15,
-                                    "sessions_before_long_break": 4
-                                },
-                                "long": {
-                                    "work_duration": 50,
-                                    "short_break": 10,
-                                    "long_break": 30,
-                                    "sessions_before_long_break": 4
-                                }
-                            }
-                    except Exception as e:
-                        logger.error(f"Error getting user settings: {str(e)}")
-                        # Default settings
-                        user_settings = {
-                            "short": {
-                                "work_duration": 25,
-                                "short_break": 5,
-                                "long_break": 15,
-                                "sessions_before_long_break": 4
-                            },
-                            "long": {
-                                "work_duration": 50,
-                                "short_break": 10,
-                                "long_break": 30,
-                                "sessions_before_long_break": 4
-                            }
-                        }
-                    
-                    # Start new timer session
-                    manager.start_timer(
-                        user_id=user_id,
-                        task_id=data.get("task_id"),
-                        session_type=data.get("session_type", "work"),
-                        duration=data.get("duration", 25*60),  # Default 25 minutes in seconds
-                        preset_type=data.get("preset_type", "short"),
-                        user_settings=user_settings
-                    )
-                    await manager.sync_timer_state(user_id)
-                    logger.info(f"Timer started for user {user_id}")
-                  
-                elif data["type"] == "stop":
-                    manager.stop_timer(user_id)
-                    await manager.broadcast_to_user(user_id, {"type": "timer_stopped"})
-                    logger.info(f"Timer stopped for user {user_id}")
-                  
-                elif data["type"] == "pause":
-                    if user_id in manager.timer_states:
-                        manager.timer_states[user_id].pause()
-                        await manager.sync_timer_state(user_id)
-                        logger.info(f"Timer paused for user {user_id}")
-                  
-                elif data["type"] == "resume":
-                    if user_id in manager.timer_states:
-                        manager.timer_states[user_id].resume()
-                        await manager.sync_timer_state(user_id)
-                        logger.info(f"Timer resumed for user {user_id}")
+                data = await ws_encoding.receive(websocket, encoding)
+                manager.heartbeat.seen(websocket)
+
+                # Heartbeat replies skip the command lock so they measure the network round trip only
+                if isinstance(data, dict) and data.get("type") == "pong":
+                    manager.heartbeat.pong(websocket)
+                    continue
                   
-                elif data["type"] == "sync_request":
-                    await manager.sync_timer_state(user_id)
-                    logger.debug(f"Timer state synced for user {user_id}")
-                    
-                elif data["type"] == "skip_to_next":
-                    if user_id in manager.timer_states:
-                        manager.skip_to_next(user_id)
-                        await manager.sync_timer_state(user_id)
-                        logger.info(f"Timer skipped to next session for user {user_id}")
-
-                elif data["type"] == "reset_rounds":
-                    # Reset rounds for the user
-                    manager.reset_rounds(user_id)
-                    await manager.sync_timer_state(user_id)
-                    await manager.broadcast_to_user(user_id, {"type": "rounds_reset"})
-                    logger.info(f"Rounds reset for user {user_id}")
-                
-                elif data["type"] == "settings_updated":
-                    # Refresh the user settings in memory
-                    try:
-                        user_response = await supabase.table("profiles").select("pomodoro_settings").eq("id", user_id).execute()
-                        if user_response.data and len(user_response.data) > 0:
-                            user_settings = user_response.data[0]["pomodoro_settings"]
-                            if user_id in manager.timer_states:
-                                manager.timer_states[user_id].settings = user_settings
-                                logger.info(f"Settings updated for user {user_id}")
-                        
-                        # Notify all clients about settings update
-                        await manager.broadcast_to_user(user_id, {
-                            "type": "settings_updated",
-                            "data": {
-                                "settings": user_settings
-                            }
-                        })
-                    except Exception as e:
-                        logger.error(f"Error refreshing settings: {str(e)}")
-                    
-                    # Force timer state sync
-                    await manager.sync_timer_state(user_id)
-                
-                # Add a new handler for preset type changes
-                elif data["type"] == "change_preset":
-                    if user_id in manager.timer_states:
-                        preset_type = data.get("preset_type", "short")
-                        manager.timer_states[user_id].preset_type = preset_type
-                        # Update timer duration based on new preset type and current session
-                        state = manager.timer_states[user_id]
-                        current_session = state.session_type
-                        if current_session == 'work':
-                            state.time_remaining = state.settings[preset_type]['work_duration'] * 60
-                        elif current_session == 'short_break':
-                            state.time_remaining = state.settings[preset_type]['short_break'] * 60
-                        else:  # long_break
-                            state.time_remaining = state.settings[preset_type]['long_break'] * 60
-                        await manager.sync_timer_state(user_id)
-                        logger.info(f"Preset changed to {preset_type} for user {user_id}")
+                # Commands for the same user run one at a time
+                async with manager.lock_for(user_id):
+                    # Bring back the timer if it was evicted while idle
+                    await manager.ensure_resident(user_id)
+                    await commands.dispatch(data, websocket, user_id)
 
             except WebSocketDisconnect:
                 logger.info(f"WebSocket disconnected for user {user_id}")
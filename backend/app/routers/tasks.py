@@ -1,10 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import case, func, select, update
 from typing import List
-import asyncio
 from .. import models, schemas, auth
 from ..database import get_db
+from ..task_positions import POSITION_GAP, position_between, spaced_positions
 from ..ws_manager import manager
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
@@ -15,16 +15,13 @@ def create_task(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ):
-    # Find the highest position number for this user's tasks
-    highest_position = db.query(func.max(models.Task.position)).filter(
-        models.Task.user_id == current_user.id
-    ).scalar() or 0
-    
-    # Create task with position = highest + 1
+    # Place the task one gap after the user's last task, computed inside the INSERT
     db_task = models.Task(
-        **task.dict(), 
+        **task.dict(),
         user_id=current_user.id,
-        position=highest_position + 1
+        position=select(func.coalesce(func.max(models.Task.position), 0) + POSITION_GAP)
+        .where(models.Task.user_id == current_user.id)
+        .scalar_subquery()
     )
     db.add(db_task)
     db.commit()
@@ -40,7 +37,70 @@ def get_tasks(
     # Return tasks ordered by position
     return db.query(models.Task).filter(
         models.Task.user_id == current_user.id
-    ).order_by(models.Task.position).all()
+    ).order_by(models.Task.position, models.Task.id).all()
+
+
+@router.put("/order")
+def update_tasks_order(
+    task_order: schemas.TaskOrder,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user),
+):
+    """Update the order of tasks for a user"""
+    # Validate input
+    if not task_order.task_ids:
+        raise HTTPException(status_code=400, detail="Task IDs list cannot be empty")
+    
+    # Check for duplicate task IDs
+    if len(task_order.task_ids) != len(set(task_order.task_ids)):
+        raise HTTPException(status_code=400, detail="Duplicate task IDs found")
+
+    # Start a transaction
+    try:
+        # Update every position in one statement; only the user's own tasks match
+        positions = dict(zip(task_order.task_ids, spaced_positions(len(task_order.task_ids))))
+        updated_count = db.query(models.Task).filter(
+            models.Task.user_id == current_user.id,
+            models.Task.id.in_(task_order.task_ids)
+        ).update(
+            {models.Task.position: case(positions, value=models.Task.id)},
+            synchronize_session=False
+        )
+
+        # Check if all requested task IDs belong to the user
+        if updated_count != len(task_order.task_ids):
+            raise HTTPException(status_code=400, detail="Invalid task IDs")
+
+        db.commit()
+        
+        # Broadcast the order change to all connected clients for this user,
+        # on the event loop once the response is out
+        background_tasks.add_task(
+            manager.broadcast_to_user,
+            str(current_user.id),
+            {
+                "type": "task_order_updated",
+                "data": {"task_ids": task_order.task_ids}
+            }
+        )
+        
+        # Return updated task order for verification
+        return {
+            "status": "success",
+            "data": {
+                "task_ids": task_order.task_ids,
+                "updated_count": updated_count
+            }
+        }
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        db.rollback()
+        raise
+    except Exception as e:
+        # Roll back transaction on error
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to update task order: {str(e)}")
 
 
 @router.put("/{task_id}")
@@ -63,6 +123,7 @@ def update_task(
 
     db.commit()
     db.refresh(db_task)
+    manager.invalidate_task(task_id)
     return db_task
 
 
@@ -80,92 +141,91 @@ def delete_task(
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    # Get the position of the task to be deleted
-    deleted_position = db_task.position
-
     # Delete associated sessions first
     db.query(models.PomodoroSession).filter(
         models.PomodoroSession.task_id == task_id
     ).delete()
 
     # Delete the task
+    # Positions are sparse, so the remaining tasks keep theirs
     db.delete(db_task)
-    
-    # Update positions of remaining tasks
-    db.query(models.Task).filter(
-        models.Task.user_id == current_user.id,
-        models.Task.position > deleted_position
-    ).update(
-        {models.Task.position: models.Task.position - 1},
-        synchronize_session=False
-    )
-    
     db.commit()
+    manager.invalidate_task(task_id)
     return {"status": "success"}
 
 
-@router.put("/order")
-def update_tasks_order(
-    task_order: schemas.TaskOrder,
+def _rebalance_positions(db: Session, user_id: int):
+    """Spread a user's tasks back out to evenly spaced positions, keeping their order"""
+    ranked = select(
+        models.Task.id,
+        (func.row_number().over(order_by=(models.Task.position, models.Task.id)) * POSITION_GAP).label("position")
+    ).where(models.Task.user_id == user_id).subquery()
+    db.execute(
+        update(models.Task)
+        .where(models.Task.id == ranked.c.id)
+        .values(position=ranked.c.position)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _neighbour_positions(db: Session, user_id: int, move: schemas.TaskMove):
+    positions = dict(
+        db.query(models.Task.id, models.Task.position).filter(
+            models.Task.user_id == user_id,
+            models.Task.id.in_([i for i in (move.previous_task_id, move.next_task_id) if i is not None])
+        ).all()
+    )
+    for neighbour_id in (move.previous_task_id, move.next_task_id):
+        if neighbour_id is not None and neighbour_id not in positions:
+            raise HTTPException(status_code=400, detail="Invalid task IDs")
+    return positions.get(move.previous_task_id), positions.get(move.next_task_id)
+
+
+@router.put("/{task_id}/move")
+def move_task(
+    task_id: int,
+    move: schemas.TaskMove,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ):
-    """Update the order of tasks for a user"""
-    # Validate input
-    if not task_order.task_ids:
-        raise HTTPException(status_code=400, detail="Task IDs list cannot be empty")
-    
-    # Start a transaction
-    try:
-        # Verify all tasks belong to the current user
-        user_tasks = db.query(models.Task).filter(
-            models.Task.user_id == current_user.id,
-            models.Task.id.in_(task_order.task_ids)
-        ).all()
-        
-        # Check if all requested task IDs belong to the user
-        if len(user_tasks) != len(task_order.task_ids):
-            raise HTTPException(status_code=400, detail="Invalid task IDs")
-        
-        # Check for duplicate task IDs
-        if len(task_order.task_ids) != len(set(task_order.task_ids)):
-            raise HTTPException(status_code=400, detail="Duplicate task IDs found")
-        
-        # Create a mapping of task IDs to their tasks
-        task_map = {task.id: task for task in user_tasks}
-        
-        # Update positions
-        for index, task_id in enumerate(task_order.task_ids):
-            task = task_map.get(task_id)
-            if task:
-                task.position = index + 1
-        
-        db.commit()
-        
-        # Broadcast the order change to all connected clients for this user
-        asyncio.create_task(
-            manager.broadcast_to_user(
-                str(current_user.id),
-                {
-                    "type": "task_order_updated",
-                    "data": {"task_ids": task_order.task_ids}
-                }
-            )
-        )
-        
-        # Return updated task order for verification
-        return {
-            "status": "success",
+    """Move one task between two neighbours, writing only that task's position"""
+    if task_id in (move.previous_task_id, move.next_task_id):
+        raise HTTPException(status_code=400, detail="A task cannot be its own neighbour")
+
+    db_task = (
+        db.query(models.Task)
+        .filter(models.Task.id == task_id, models.Task.user_id == current_user.id)
+        .first()
+    )
+    if not db_task:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    before, after = _neighbour_positions(db, current_user.id, move)
+    if before is not None and after is not None and before >= after:
+        raise HTTPException(status_code=400, detail="Previous task must come before next task")
+
+    position = position_between(before, after)
+    if position is None:
+        # The neighbours are adjacent: respace the list once, then there is room again
+        _rebalance_positions(db, current_user.id)
+        before, after = _neighbour_positions(db, current_user.id, move)
+        position = position_between(before, after)
+
+    db_task.position = position
+    db.commit()
+
+    # Sent on the event loop once the response is out
+    background_tasks.add_task(
+        manager.broadcast_to_user,
+        str(current_user.id),
+        {
+            "type": "task_moved",
             "data": {
-                "task_ids": task_order.task_ids,
-                "updated_count": len(user_tasks)
+                "task_id": task_id,
+                "previous_task_id": move.previous_task_id,
+                "next_task_id": move.next_task_id,
             }
         }
-    except HTTPException:
-        # Re-raise HTTP exceptions
-        db.rollback()
-        raise
-    except Exception as e:
-        # Roll back transaction on error
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to update task order: {str(e)}")
\ No newline at end of file
+    )
+    return {"status": "success", "data": {"task_id": task_id, "position": position}}
@@ -1,11 +1,12 @@
 # tasks_supabase.py
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from typing import List
-import asyncio
 from datetime import datetime
 from .. import schemas
 from ..auth_supabase import get_current_user
 from ..supabase import supabase
+from ..task_positions import position_between, spaced_positions
 from ..ws_manager_supabase import manager
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
@@ -16,19 +17,7 @@ async def create_task(
     current_user = Depends(get_current_user),
 ):
     try:
-        # Find the highest position number for this user's tasks
-        position_query = supabase.table("tasks") \
-            .select("position") \
-            .eq("user_id", current_user.id) \
-            .order("position", desc=True) \
-            .limit(1) \
-            .execute()
-            
-        highest_position = 0
-        if position_query.data and len(position_query.data) > 0:
-            highest_position = position_query.data[0]["position"]
-        
-        # Create task with position = highest + 1
+        # No position: the tasks_assign_position trigger puts the task one gap after the user's last task
         task_data = {
             "title": task.title,
             "description": task.description,
@@ -36,8 +25,7 @@ async def create_task(
             "estimated_pomodoros": task.estimated_pomodoros,
             "completed_pomodoros": 0,
             "created_at": datetime.utcnow().isoformat(),
-            "is_active": True,
-            "position": highest_position + 1
+            "is_active": True
         }
         
         response = supabase.table("tasks").insert(task_data).execute()
@@ -59,12 +47,72 @@ async def get_tasks(
             .select("*") \
             .eq("user_id", current_user.id) \
             .order("position") \
+            .order("id") \
             .execute()
             
         return response.data
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve tasks: {str(e)}")
 
+def _reorder_tasks(user_id: str, task_ids: List[int]) -> int:
+    """Number of tasks repositioned; one reorder_tasks call updates every position, or none if any ID isn't the user's"""
+    response = supabase.rpc("reorder_tasks", {
+        "p_user_id": user_id,
+        "p_task_ids": task_ids,
+        "p_positions": spaced_positions(len(task_ids)),
+    }).execute()
+    updated_count = response.data
+    if isinstance(updated_count, list):
+        updated_count = updated_count[0] if updated_count else 0
+    return updated_count
+
+
+@router.put("/order")
+async def update_tasks_order(
+    task_order: schemas.TaskOrder,
+    current_user = Depends(get_current_user),
+):
+    """Update the order of tasks for a user"""
+    # Validate input
+    if not task_order.task_ids:
+        raise HTTPException(status_code=400, detail="Task IDs list cannot be empty")
+    
+    # Check for duplicate task IDs
+    if len(task_order.task_ids) != len(set(task_order.task_ids)):
+        raise HTTPException(status_code=400, detail="Duplicate task IDs found")
+
+    try:
+        # The supabase client blocks, so the RPC runs in the threadpool instead of on the event loop
+        updated_count = await run_in_threadpool(_reorder_tasks, current_user.id, task_order.task_ids)
+
+        # Check if all requested task IDs belong to the user
+        if updated_count != len(task_order.task_ids):
+            raise HTTPException(status_code=400, detail="Invalid task IDs")
+
+        # Broadcast the order change to all connected clients for this user
+        await manager.broadcast_to_user(
+            str(current_user.id),
+            {
+                "type": "task_order_updated",
+                "data": {"task_ids": task_order.task_ids}
+            }
+        )
+        
+        # Return updated task order for verification
+        return {
+            "status": "success",
+            "data": {
+                "task_ids": task_order.task_ids,
+                "updated_count": updated_count
+            }
+        }
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update task order: {str(e)}")
+
+
 @router.put("/{task_id}")
 async def update_task(
     task_id: int,
@@ -97,6 +145,7 @@ async def update_task(
         if not response.data or len(response.data) == 0:
             raise HTTPException(status_code=500, detail="Failed to update task")
             
+        manager.invalidate_task(task_id)
         return response.data[0]
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -110,9 +159,9 @@ async def delete_task(
     current_user = Depends(get_current_user),
 ):
     try:
-        # First, verify task belongs to user and get its position
+        # First, verify task belongs to user
         task_query = supabase.table("tasks") \
-            .select("id, position") \
+            .select("id") \
             .eq("id", task_id) \
             .eq("user_id", current_user.id) \
             .execute()
@@ -120,8 +169,6 @@ async def delete_task(
         if not task_query.data or len(task_query.data) == 0:
             raise HTTPException(status_code=404, detail="Task not found")
             
-        deleted_position = task_query.data[0]["position"]
-        
         # Delete associated pomodoro sessions
         supabase.table("pomodoro_sessions") \
             .delete() \
@@ -139,22 +186,9 @@ async def delete_task(
             .delete() \
             .eq("id", task_id) \
             .execute()
-            
-        # Update positions of remaining tasks
-        tasks_to_update = supabase.table("tasks") \
-            .select("id, position") \
-            .eq("user_id", current_user.id) \
-            .gt("position", deleted_position) \
-            .execute()
-            
-        # Update each task's position individually
-        # (This could be optimized with a batch update in PostgreSQL)
-        for task in tasks_to_update.data:
-            supabase.table("tasks") \
-                .update({"position": task["position"] - 1}) \
-                .eq("id", task["id"]) \
-                .execute()
-            
+        manager.invalidate_task(task_id)
+
+        # Positions are sparse, so the remaining tasks keep theirs
         return {"status": "success"}
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -162,62 +196,75 @@ async def delete_task(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete task: {str(e)}")
 
-@router.put("/order")
-async def update_tasks_order(
-    task_order: schemas.TaskOrder,
+
+def _neighbour_positions(user_id: str, move: schemas.TaskMove):
+    neighbour_ids = [i for i in (move.previous_task_id, move.next_task_id) if i is not None]
+    positions = {}
+    if neighbour_ids:
+        response = supabase.table("tasks") \
+            .select("id, position") \
+            .eq("user_id", user_id) \
+            .in_("id", neighbour_ids) \
+            .execute()
+        positions = {row["id"]: row["position"] for row in response.data}
+    for neighbour_id in neighbour_ids:
+        if neighbour_id not in positions:
+            raise HTTPException(status_code=400, detail="Invalid task IDs")
+    return positions.get(move.previous_task_id), positions.get(move.next_task_id)
+
+
+def _move_task(user_id: str, task_id: int, move: schemas.TaskMove) -> int:
+    """Write the task's new position between its neighbours and return it"""
+    before, after = _neighbour_positions(user_id, move)
+    if before is not None and after is not None and before >= after:
+        raise HTTPException(status_code=400, detail="Previous task must come before next task")
+
+    position = position_between(before, after)
+    if position is None:
+        # The neighbours are adjacent: respace the list once, then there is room again
+        supabase.rpc("rebalance_task_positions", {"p_user_id": user_id}).execute()
+        before, after = _neighbour_positions(user_id, move)
+        position = position_between(before, after)
+
+    response = supabase.table("tasks") \
+        .update({"position": position}) \
+        .eq("id", task_id) \
+        .eq("user_id", user_id) \
+        .execute()
+
+    if not response.data or len(response.data) == 0:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return position
+
+
+@router.put("/{task_id}/move")
+async def move_task(
+    task_id: int,
+    move: schemas.TaskMove,
     current_user = Depends(get_current_user),
 ):
-    """Update the order of tasks for a user"""
-    # Validate input
-    if not task_order.task_ids:
-        raise HTTPException(status_code=400, detail="Task IDs list cannot be empty")
-    
+    """Move one task between two neighbours, writing only that task's position"""
+    if task_id in (move.previous_task_id, move.next_task_id):
+        raise HTTPException(status_code=400, detail="A task cannot be its own neighbour")
+
     try:
-        # Get all user tasks
-        user_tasks_query = supabase.table("tasks") \
-            .select("id") \
-            .eq("user_id", current_user.id) \
-            .in_("id", task_order.task_ids) \
-            .execute()
-            
-        user_tasks = user_tasks_query.data
-        
-        # Check if all requested task IDs belong to the user
-        if len(user_tasks) != len(task_order.task_ids):
-            raise HTTPException(status_code=400, detail="Invalid task IDs")
-        
-        # Check for duplicate task IDs
-        if len(task_order.task_ids) != len(set(task_order.task_ids)):
-            raise HTTPException(status_code=400, detail="Duplicate task IDs found")
-        
-        # Update each task's position individually
-        for index, task_id in enumerate(task_order.task_ids):
-            supabase.table("tasks") \
-                .update({"position": index + 1}) \
-                .eq("id", task_id) \
-                .execute()
-        
-        # Broadcast the order change to all connected clients for this user
-        asyncio.create_task(
-            manager.broadcast_to_user(
-                str(current_user.id),
-                {
-                    "type": "task_order_updated",
-                    "data": {"task_ids": task_order.task_ids}
+        # The supabase client blocks, so the queries run in the threadpool instead of on the event loop
+        position = await run_in_threadpool(_move_task, current_user.id, task_id, move)
+
+        await manager.broadcast_to_user(
+            str(current_user.id),
+            {
+                "type": "task_moved",
+                "data": {
+                    "task_id": task_id,
+                    "previous_task_id": move.previous_task_id,
+                    "next_task_id": move.next_task_id,
                 }
-            )
-        )
-        
-        # Return updated task order for verification
-        return {
-            "status": "success",
-            "data": {
-                "task_ids": task_order.task_ids,
-                "updated_count": len(user_tasks)
             }
-        }
+        )
+        return {"status": "success", "data": {"task_id": task_id, "position": position}}
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to update task order: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to move task: {str(e)}")
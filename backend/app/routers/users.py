@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from .. import models, schemas, auth
 from ..database import get_db
+from ..password_hashing import password_hasher
+from ..settings_cache import settings_cache
+from ..token_cache import token_cache
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-@router.post("/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+def _check_available(db: Session, user: schemas.UserCreate):
     # Check if email exists
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
     if db_user:
@@ -19,16 +22,26 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     if db_user:
         raise HTTPException(status_code=400, detail="Username already taken")
 
+
+def _insert_user(db: Session, user: schemas.UserCreate, hashed_password: str) -> models.User:
     db_user = models.User(
         email=user.email,
         username=user.username,
-        hashed_password=auth.get_password_hash(user.password),
+        hashed_password=hashed_password,
     )
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
 
+
+@router.post("/", response_model=schemas.User)
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    # Queries run in the threadpool and the hash on the hashing pool, keeping the event loop free
+    await run_in_threadpool(_check_available, db, user)
+    hashed_password = await password_hasher.hash(user.password)
+    return await run_in_threadpool(_insert_user, db, user, hashed_password)
+
 @router.get("/me", response_model=schemas.User)
 def get_current_user_info(current_user: models.User = Depends(auth.get_current_user)):
     """Get current user information"""
@@ -54,6 +67,8 @@ def delete_current_user(
     # Finally delete the user
     db.delete(current_user)
     db.commit()
+    settings_cache.invalidate(str(current_user.id))
+    token_cache.invalidate_user(current_user.id)
     
     return {"status": "success"}
 
@@ -66,6 +81,10 @@ def update_settings(
 ):
     current_user.pomodoro_settings = settings.dict()
     db.commit()
+    # Write through so the timer manager doesn't re-read the user row
+    settings_cache.put(str(current_user.id), settings)
+    # Cached users hold the old settings
+    token_cache.invalidate_user(current_user.id)
     return {"status": "success"}
 
 
@@ -2,8 +2,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 import logging
 from .. import schemas
-from ..auth_supabase import get_current_user, create_user, get_user_from_db
+from ..auth_supabase import get_current_user, get_current_user_verified, create_user, get_user_from_db
 from ..supabase import supabase, get_anon_client
+from ..settings_cache import settings_cache
+from ..token_cache import token_cache
 
 router = APIRouter(prefix="/users", tags=["users"])
 logger = logging.getLogger(__name__)
@@ -13,17 +15,8 @@ logger = logging.getLogger(__name__)
 async def register_user(user: schemas.UserCreate):
     """Create a new user account"""
     try:
-        # Check if email exists using admin client
-        auth_response = supabase.auth.admin.list_users({
-            "filter": {
-                "email": user.email
-            }
-        })
-        
-        if auth_response and auth_response.users and len(auth_response.users) > 0:
-            raise HTTPException(status_code=400, detail="Email already registered")
-
-        # Create the user in Supabase Auth
+        # Create the user in Supabase Auth; its unique email index rejects
+        # duplicates with "Email already registered"
         user_response = await create_user(
             email=user.email,
             password=user.password,
@@ -72,7 +65,7 @@ async def get_current_user_info(current_user = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=f"Failed to retrieve user information: {str(e)}")
 
 @router.delete("/me", status_code=204)
-async def delete_current_user(current_user = Depends(get_current_user)):
+async def delete_current_user(current_user = Depends(get_current_user_verified)):
     """Delete the current user's account"""
     try:
         # Delete associated pomodoro sessions
@@ -86,9 +79,11 @@ async def delete_current_user(current_user = Depends(get_current_user)):
         
         # Delete profile
         supabase.table("profiles").delete().eq("id", current_user.id).execute()
+        settings_cache.invalidate(str(current_user.id))
         
         # Delete the user from Supabase Auth 
         supabase.auth.admin.delete_user(current_user.id)
+        token_cache.invalidate_user(current_user.id)
         
         return {"status": "success"}
     except Exception as e:
@@ -109,6 +104,8 @@ async def update_settings(
         if not response.data or len(response.data) == 0:
             raise HTTPException(status_code=404, detail="User profile not found")
             
+        # Write through so timers and GET /settings don't need to re-read the profile
+        settings_cache.put(str(current_user.id), settings)
         return {"status": "success"}
     except Exception as e:
         logger.error(f"Settings update error: {str(e)}")
@@ -117,12 +114,16 @@ async def update_settings(
 @router.get("/settings", response_model=schemas.UserSettings)
 async def get_settings(current_user = Depends(get_current_user)):
     try:
+        cached_settings = settings_cache.get(str(current_user.id))
+        if cached_settings is not None:
+            return cached_settings
+
         response = supabase.table("profiles").select("pomodoro_settings").eq("id", current_user.id).execute()
         
         if not response.data or len(response.data) == 0:
             raise HTTPException(status_code=404, detail="User profile not found")
             
-        return response.data[0]["pomodoro_settings"]
+        return settings_cache.put(str(current_user.id), response.data[0]["pomodoro_settings"])
     except Exception as e:
         logger.error(f"Settings retrieval error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve settings: {str(e)}")
@@ -17,6 +17,7 @@ class CheckpointType(str, Enum):
     LONG_BREAK_INTERRUPTED = "long_break_interrupted"
     SESSION_PAUSED = "session_paused"
     SESSION_RESUMED = "session_resumed"
+    TIMER_EVICTED = "timer_evicted"
 
 class SessionType(str, Enum):
     WORK = "work"
@@ -107,6 +108,24 @@ class PomodoroSession(PomodoroSessionBase):
 class TaskOrder(BaseModel):
     task_ids: List[int]
 
+class TaskMove(BaseModel):
+    """Where a task goes: between the tasks that will sit right before and after it"""
+    previous_task_id: Optional[int] = None
+    next_task_id: Optional[int] = None
+
 class WSMessage(BaseModel):
     type: str
     data: Dict[str, Any]
+
+# WebSocket commands sent by clients; payload fields sit next to "type"
+class WSCommand(BaseModel):
+    type: str
+
+class StartTimerCommand(WSCommand):
+    task_id: Optional[int] = None
+    session_type: SessionType = SessionType.WORK
+    duration: float = Field(25 * 60, gt=0)  # Seconds
+    preset_type: PresetType = PresetType.SHORT
+
+class ChangePresetCommand(WSCommand):
+    preset_type: PresetType = PresetType.SHORT
@@ -0,0 +1,55 @@
+# app/settings_cache.py
+"""
+Process-wide cache of users' pomodoro settings.
+
+Entries are validated schemas.UserSettings objects keyed by user id (as a
+string). The settings routes write through on update; the TTL bounds how
+long another worker process can serve settings changed elsewhere.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from . import schemas
+
+
+class SettingsCache:
+    def __init__(self, ttl: float = 300.0, maxsize: int = 100000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[float, schemas.UserSettings]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: str) -> Optional[schemas.UserSettings]:
+        """Get cached settings, or None if missing or expired"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, settings = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return settings
+
+    def put(self, user_id: str, settings: Any) -> schemas.UserSettings:
+        """Validate and cache settings (a dict or UserSettings), returning the model"""
+        if not isinstance(settings, schemas.UserSettings):
+            settings = schemas.UserSettings.model_validate(settings)
+        self._entries[user_id] = (time.monotonic() + self.ttl, settings)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return settings
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+settings_cache = SettingsCache(ttl=float(os.getenv("SETTINGS_CACHE_TTL", "300")))
@@ -0,0 +1,82 @@
+# app/sharding.py
+"""
+User-sharded containers for the ConnectionManager.
+
+Per-user maps are split into shards by a hash of the user id. Commands are
+serialized per user rather than per shard: a command that awaits the
+database can't interleave with another command for the same user, and it
+doesn't hold up the other users whose state shares its shard.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, MutableMapping, Optional
+
+
+class ShardedDict(MutableMapping):
+    """Dict keyed by user id, stored as shard_count smaller dicts"""
+
+    def __init__(self, shard_count: int = 64):
+        self.shard_count = shard_count
+        self.shards: List[Dict[str, Any]] = [{} for _ in range(shard_count)]
+
+    def shard(self, user_id: str) -> Dict[str, Any]:
+        return self.shards[hash(user_id) % self.shard_count]
+
+    def __getitem__(self, user_id: str) -> Any:
+        return self.shards[hash(user_id) % self.shard_count][user_id]
+
+    def __setitem__(self, user_id: str, value: Any):
+        self.shards[hash(user_id) % self.shard_count][user_id] = value
+
+    def __delitem__(self, user_id: str):
+        del self.shards[hash(user_id) % self.shard_count][user_id]
+
+    def __contains__(self, user_id: object) -> bool:
+        return user_id in self.shards[hash(user_id) % self.shard_count]
+
+    def get(self, user_id: str, default: Optional[Any] = None) -> Any:
+        return self.shards[hash(user_id) % self.shard_count].get(user_id, default)
+
+    def __iter__(self) -> Iterator[str]:
+        for shard in self.shards:
+            yield from list(shard)
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    def shard_sizes(self) -> List[int]:
+        return [len(shard) for shard in self.shards]
+
+
+class UserLocks:
+    """One asyncio.Lock per user, kept only while a command holds or waits on it"""
+
+    def __init__(self):
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.users: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, user_id: str) -> AsyncIterator[None]:
+        lock = self.locks.get(user_id)
+        if lock is None:
+            lock = self.locks[user_id] = asyncio.Lock()
+        self.users[user_id] = self.users.get(user_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            # Drop the lock with its last holder so idle users don't keep one
+            self.users[user_id] -= 1
+            if not self.users[user_id]:
+                del self.users[user_id]
+                del self.locks[user_id]
+
+    def locked(self, user_id: str) -> bool:
+        lock = self.locks.get(user_id)
+        return lock is not None and lock.locked()
+
+    def locked_count(self) -> int:
+        return sum(1 for lock in self.locks.values() if lock.locked())
+
+    def __len__(self) -> int:
+        return len(self.locks)
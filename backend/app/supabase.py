@@ -4,10 +4,28 @@ This module establishes the connection to Supabase services.
 """
 from supabase import create_client, Client
 from supabase.client import ClientOptions
+from typing import Optional
+import asyncio
+import dataclasses
+import httpx
 import os
 from dotenv import load_dotenv
 import logging
 
+try:
+    from supabase import acreate_client, AsyncClient
+except ImportError:  # supabase-py without the async client
+    acreate_client = None
+    AsyncClient = None
+try:
+    from supabase_auth import SyncGoTrueClient
+except ImportError:  # supabase-py before the auth package rename
+    from gotrue import SyncGoTrueClient
+try:
+    from supabase import AsyncClientOptions
+except ImportError:
+    AsyncClientOptions = ClientOptions
+
 logger = logging.getLogger(__name__)
 
 # Try to load from .env file if it exists (for local development)
@@ -27,15 +45,147 @@ anon_key = os.getenv("ANON_KEY")
 if not supabase_key:
     logger.warning("SERVICE_ROLE_KEY not found in environment variables")
 
+# Limits of the keep-alive HTTP pool shared by every Supabase client
+SUPABASE_HTTP_MAX_CONNECTIONS = int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", "100"))
+SUPABASE_HTTP_MAX_KEEPALIVE = int(os.getenv("SUPABASE_HTTP_MAX_KEEPALIVE", "20"))
+SUPABASE_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_HTTP_KEEPALIVE_EXPIRY", "30"))
+SUPABASE_HTTP_TIMEOUT = float(os.getenv("SUPABASE_HTTP_TIMEOUT", "10"))
+
+# Older supabase-py versions can't be handed an HTTP client; their long-lived
+# clients are still reused, each with its own pool
+SUPPORTS_SHARED_HTTP = "httpx_client" in {field.name for field in dataclasses.fields(ClientOptions)}
+
+
+class SupabaseClientRegistry:
+    """Long-lived Supabase clients over one shared keep-alive HTTP pool
+
+    Clients are created on first use and reused for the life of the process.
+    The auth client never stores a session on a shared client.
+    """
+
+    def __init__(self, url: str, service_key: Optional[str], anon_key: Optional[str]):
+        self.url = url
+        self.service_key = service_key
+        self.anon_key = anon_key
+        self._http: Optional[httpx.Client] = None
+        self._async_http: Optional[httpx.AsyncClient] = None
+        self._service: Optional[Client] = None
+        self._anon: Optional[Client] = None
+        self._auth: Optional[SyncGoTrueClient] = None
+        self._async_service = None
+        self._async_lock = asyncio.Lock()
+
+    def _pool_settings(self) -> dict:
+        return {
+            "limits": httpx.Limits(
+                max_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=SUPABASE_HTTP_KEEPALIVE_EXPIRY,
+            ),
+            "timeout": SUPABASE_HTTP_TIMEOUT,
+            "follow_redirects": True,
+        }
+
+    @property
+    def http(self) -> httpx.Client:
+        if self._http is None:
+            self._http = httpx.Client(**self._pool_settings())
+        return self._http
+
+    @property
+    def async_http(self) -> httpx.AsyncClient:
+        if self._async_http is None:
+            self._async_http = httpx.AsyncClient(**self._pool_settings())
+        return self._async_http
+
+    def _options(self, options_class=ClientOptions, http_client=None, **kwargs):
+        if SUPPORTS_SHARED_HTTP:
+            kwargs["httpx_client"] = http_client
+        return options_class(schema="pomodoro", **kwargs)
+
+    def service(self) -> Client:
+        """Service role client for backend operations"""
+        if self._service is None:
+            self._service = create_client(self.url, self.service_key, options=self._options(http_client=self.http))
+        return self._service
+
+    def anon(self) -> Client:
+        """Client with anonymous role privileges; never signed in, so it stays anonymous"""
+        if self._anon is None:
+            self._anon = create_client(
+                self.url,
+                self.anon_key,
+                options=self._options(http_client=self.http, auto_refresh_token=False, persist_session=False),
+            )
+        return self._anon
+
+    def auth(self) -> SyncGoTrueClient:
+        """Supabase Auth client for sign-in, refresh and sign-out calls
+
+        A bare GoTrue client: a session it returns isn't attached to any
+        data client, so concurrent users never see each other's tokens.
+        """
+        if self._auth is None:
+            self._auth = SyncGoTrueClient(
+                url=f"{self.url}/auth/v1",
+                headers={"apiKey": self.anon_key or "", "Authorization": f"Bearer {self.anon_key}"},
+                auto_refresh_token=False,
+                persist_session=False,
+                http_client=self.http,
+            )
+        return self._auth
+
+    async def async_service(self):
+        """Shared async service role client, or None if unavailable"""
+        if self._async_service is None and acreate_client is not None and self.service_key:
+            async with self._async_lock:
+                if self._async_service is None:
+                    try:
+                        self._async_service = await acreate_client(
+                            self.url,
+                            self.service_key,
+                            options=self._options(AsyncClientOptions, http_client=self.async_http),
+                        )
+                        logger.info("Async Supabase client initialized")
+                    except Exception as e:
+                        logger.error(f"Failed to initialize async Supabase client: {str(e)}")
+        return self._async_service
+
+    async def aclose(self):
+        """Close the async clients' HTTP connections"""
+        if self._async_service is not None:
+            try:
+                await self._async_service.postgrest.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing async Supabase client: {str(e)}")
+            self._async_service = None
+        if self._async_http is not None:
+            await self._async_http.aclose()
+            self._async_http = None
+
+    def close(self):
+        """Close the shared sync HTTP pool"""
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+        self._service = self._anon = self._auth = None
+
+    def get_stats(self) -> dict:
+        return {
+            "shared_http": SUPPORTS_SHARED_HTTP,
+            "max_connections": SUPABASE_HTTP_MAX_CONNECTIONS,
+            "max_keepalive": SUPABASE_HTTP_MAX_KEEPALIVE,
+            "clients": [name for name, client in (
+                ("service", self._service), ("anon", self._anon), ("auth", self._auth), ("async_service", self._async_service)
+            ) if client is not None],
+        }
+
+
+clients = SupabaseClientRegistry(supabase_url, supabase_key, anon_key)
+
 # Create service role client for administrative operations
 try:
-    supabase: Client = create_client(
-        supabase_url,
-        supabase_key,
-        options=ClientOptions(
-            schema="pomodoro",
-        )
-    )
+    supabase: Client = clients.service()
     logger.info(f"Supabase client initialized with URL: {supabase_url}")
 except Exception as e:
     logger.error(f"Failed to initialize Supabase client: {str(e)}")
@@ -43,16 +193,26 @@ except Exception as e:
     # The actual connection will fail later when used
     supabase = None
 
+# Async service role client for code running on the event loop (WebSocket
+# handlers, timer callbacks). Created on first use because acreate_client is
+# a coroutine.
+async def get_async_supabase():
+    """Get the shared async service role client, or None if unavailable"""
+    return await clients.async_service()
+
+async def close_async_supabase():
+    """Close the shared clients' HTTP connections"""
+    await clients.aclose()
+    clients.close()
+
 # Convenience function to get a client with anon privileges
 def get_anon_client():
-    """Get a Supabase client with anonymous role privileges"""
-    return create_client(
-        supabase_url,
-        anon_key,
-        options=ClientOptions(
-            schema="pomodoro",
-        )
-    )
+    """Get the shared Supabase client with anonymous role privileges"""
+    return clients.anon()
+
+def get_auth_client() -> SyncGoTrueClient:
+    """Get the shared Supabase Auth client for sign-in and token refresh"""
+    return clients.auth()
 
 # Create a diagnostic function that can help identify issues
 def get_diagnostics():
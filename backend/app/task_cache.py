@@ -0,0 +1,66 @@
+# app/task_cache.py
+"""
+Bounded LRU cache of task summaries used in timer_sync payloads.
+
+ConnectionManagers read task title and pomodoro counts from here instead of
+querying the tasks table on every sync. The task routers and the completion
+path keep it coherent by invalidating or updating entries they change.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Fields sent to clients as "active_task"
+TASK_SUMMARY_FIELDS = ("id", "title", "completed_pomodoros", "estimated_pomodoros")
+
+
+class TaskSummaryCache:
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, task_id: int) -> bool:
+        return task_id in self._entries
+
+    def get(self, task_id: int) -> Optional[Dict[str, Any]]:
+        """Get a cached summary and mark it as recently used"""
+        summary = self._entries.get(task_id)
+        if summary is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(task_id)
+        self.hits += 1
+        return summary
+
+    def put(self, task_id: int, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Cache the summary fields of a task row and return the summary"""
+        summary = {field: task.get(field) for field in TASK_SUMMARY_FIELDS}
+        self._entries[task_id] = summary
+        self._entries.move_to_end(task_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return summary
+
+    def update(self, task_id: int, **fields: Any):
+        """Change fields of a cached summary; no-op if the task isn't cached.
+
+        Summaries are replaced rather than mutated so payloads that are
+        already queued for sending keep the values they were built with.
+        """
+        summary = self._entries.get(task_id)
+        if summary is not None:
+            self._entries[task_id] = {**summary, **fields}
+
+    def invalidate(self, task_id: int):
+        """Drop a task so the next read goes to the database"""
+        self._entries.pop(task_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,34 @@
+# app/task_positions.py
+"""
+Sparse ordering keys for tasks.
+
+Task positions are integers spaced POSITION_GAP apart, so a task can be
+created at the end, deleted or moved between two neighbours by writing only
+its own row. A move takes the midpoint of its neighbours' positions; when
+two neighbours end up adjacent there is no room left between them and the
+user's tasks are rebalanced onto evenly spaced positions again.
+"""
+from typing import List, Optional
+
+POSITION_GAP = 1024
+
+
+def position_between(before: Optional[int], after: Optional[int]) -> Optional[int]:
+    """Position for a task placed between two neighbours (None for the list's ends)
+
+    Returns None when the neighbours are adjacent and the list needs a rebalance.
+    """
+    if before is None and after is None:
+        return POSITION_GAP
+    if after is None:
+        return before + POSITION_GAP
+    if before is None:
+        return after - POSITION_GAP
+    if after - before < 2:
+        return None
+    return (before + after) // 2
+
+
+def spaced_positions(count: int) -> List[int]:
+    """Evenly spaced positions for `count` tasks in order"""
+    return [(index + 1) * POSITION_GAP for index in range(count)]
@@ -0,0 +1,501 @@
+# app/timer_bus.py
+"""
+Pub/sub bus and shared timer state for running several workers.
+
+Each ConnectionManager publishes envelopes of the form
+
+    {"origin": worker_id, "kind": "state" | "broadcast", "user_id": ..., "data": ...}
+
+"state" envelopes carry a TimerState.to_snapshot() (None once stopped) and
+are also stored, so a worker that gets a user's first connection can load the
+current timer with get_state(). "broadcast" envelopes carry a message for the
+user's connections on every worker.
+
+Implementations, picked with TIMER_BUS:
+    inprocess  single worker (default); managers sharing an InProcessHub see each other
+    ipc        workers on one host, over a unix socket relayed by one of them
+    redis      workers on any host, over a Redis server (PUBLISH/SUBSCRIBE, GET/SET)
+
+Delivery is best effort and in publish order per bus; envelopes published
+while a connection is down are dropped.
+"""
+import asyncio
+import fcntl
+from abc import ABC, abstractmethod
+import itertools
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+from . import json_codec
+
+logger = logging.getLogger(__name__)
+
+KIND_STATE = "state"
+KIND_BROADCAST = "broadcast"
+
+MessageHandler = Callable[[dict], Awaitable[None]]
+
+RECONNECT_DELAY_SECONDS = 1.0
+# A unix socket peer that can't take its frames within this long is disconnected
+IPC_DRAIN_TIMEOUT_SECONDS = float(os.getenv("TIMER_BUS_DRAIN_TIMEOUT", "5"))
+
+
+def _store_state(states: Dict[str, Any], envelope: dict):
+    if envelope.get("kind") == KIND_STATE:
+        if envelope.get("data") is None:
+            states.pop(envelope["user_id"], None)
+        else:
+            states[envelope["user_id"]] = envelope["data"]
+
+
+class TimerBus(ABC):
+    """Base class; received envelopes are handed to on_message one at a time, in order"""
+
+    name = "base"
+
+    def __init__(self):
+        self.published = 0
+        self.received = 0
+        self._on_message: Optional[MessageHandler] = None
+        self._inbox: Optional[asyncio.Queue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def start(self, on_message: MessageHandler):
+        self._on_message = on_message
+        self._inbox = asyncio.Queue()
+        self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    @abstractmethod
+    def publish(self, envelope: dict):
+        """Send an envelope to the other workers without waiting"""
+
+    @abstractmethod
+    async def get_state(self, user_id: str) -> Optional[dict]:
+        """Latest published timer state of a user, or None"""
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+    def _receive(self, envelope: dict):
+        if self._inbox is not None:
+            self.received += 1
+            self._inbox.put_nowait(envelope)
+
+    async def _dispatch(self):
+        while True:
+            envelope = await self._inbox.get()
+            try:
+                await self._on_message(envelope)
+            except Exception as e:
+                logger.error(f"Error handling bus message: {str(e)}")
+
+    def get_stats(self) -> dict:
+        return {"backend": self.name, "published": self.published, "received": self.received}
+
+
+class InProcessHub:
+    """Shared state of the InProcessBus instances in one process"""
+
+    def __init__(self):
+        self.buses: List["InProcessBus"] = []
+        self.states: Dict[str, dict] = {}
+
+
+class InProcessBus(TimerBus):
+    name = "inprocess"
+
+    def __init__(self, hub: Optional[InProcessHub] = None):
+        super().__init__()
+        self.hub = hub if hub is not None else InProcessHub()
+        self.hub.buses.append(self)
+
+    def publish(self, envelope: dict):
+        self.published += 1
+        if len(self.hub.buses) > 1:
+            # A lone bus has nobody to share states with
+            _store_state(self.hub.states, envelope)
+        for bus in self.hub.buses:
+            if bus is not self:
+                bus._receive(envelope)
+
+    async def get_state(self, user_id: str) -> Optional[dict]:
+        return self.hub.states.get(user_id)
+
+
+class LocalIPCBus(TimerBus):
+    """Workers on one host connected over a unix socket.
+
+    The worker holding an exclusive lock on `<path>.lock` serves the socket
+    and relays every envelope to the others; it also keeps the latest states.
+    If it exits, the lock is released and the remaining workers elect a new
+    relay on reconnect. The states it held are gone with it, so every worker
+    republishes the states it published last (and nobody has replaced since)
+    as soon as it has rejoined; timers owned by the relay's own worker are
+    lost with that worker anyway.
+
+    Writes are never awaited by publishers. Each connection with buffered
+    frames gets a drain task instead, and a connection that can't drain
+    within IPC_DRAIN_TIMEOUT_SECONDS is closed, so a stuck peer can't make
+    the relay's buffers grow without bound.
+    """
+
+    name = "ipc"
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.is_relay = False
+        self._lock_file = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: Set[asyncio.StreamWriter] = set()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._states: Dict[str, dict] = {}
+        self._own_states: Dict[str, dict] = {}  # Last state envelope we published, per user
+        self._draining: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self.dropped_connections = 0
+        self._requests: Dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count(1)
+        self._stopping = False
+
+    async def start(self, on_message: MessageHandler):
+        await super().start(on_message)
+        await self._join()
+
+    async def _join(self):
+        while not self._stopping:
+            if self._try_lock():
+                if os.path.exists(self.path):
+                    os.unlink(self.path)  # Left behind by a relay that died
+                self._server = await asyncio.start_unix_server(self._serve_peer, path=self.path)
+                self.is_relay = True
+                logger.info(f"Timer bus relay listening on {self.path}")
+                self._republish()
+                return
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+                self._reader_task = asyncio.get_running_loop().create_task(self._read_relay(reader))
+                self._republish()
+                return
+            except OSError:
+                # Relay elected but not listening yet
+                await asyncio.sleep(0.05)
+
+    def _try_lock(self) -> bool:
+        lock_file = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def publish(self, envelope: dict):
+        self.published += 1
+        if envelope.get("kind") == KIND_STATE:
+            if envelope.get("data") is None:
+                self._own_states.pop(envelope["user_id"], None)
+            else:
+                self._own_states[envelope["user_id"]] = envelope
+        self._send_pub(envelope)
+
+    def _send_pub(self, envelope: dict):
+        if self.is_relay:
+            _store_state(self._states, envelope)
+            self._relay(json_codec.dumps_bytes({"op": "pub", "env": envelope}) + b"\n")
+        elif self._writer is not None:
+            self._send(self._writer, json_codec.dumps_bytes({"op": "pub", "env": envelope}) + b"\n")
+
+    def _republish(self):
+        """Give a newly elected relay the states we published, which the old one took with it"""
+        if self._own_states:
+            logger.info(f"Republishing {len(self._own_states)} timer states to the bus relay")
+        for envelope in list(self._own_states.values()):
+            self._send_pub(envelope)
+
+    def _received_pub(self, envelope: dict):
+        if envelope.get("kind") == KIND_STATE:
+            # Another worker wrote this timer after us; it republishes it from now on
+            self._own_states.pop(envelope["user_id"], None)
+        self._receive(envelope)
+
+    def _send(self, writer: asyncio.StreamWriter, frame: bytes):
+        """Write without waiting; a drain task watches connections with buffered frames"""
+        writer.write(frame)
+        if writer not in self._draining and writer.transport.get_write_buffer_size() > 0:
+            self._draining[writer] = asyncio.get_running_loop().create_task(self._drain(writer))
+
+    async def _drain(self, writer: asyncio.StreamWriter):
+        try:
+            await asyncio.wait_for(writer.drain(), IPC_DRAIN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.dropped_connections += 1
+            logger.warning(f"Closing timer bus connection that didn't drain in {IPC_DRAIN_TIMEOUT_SECONDS}s")
+            self._peers.discard(writer)
+            writer.transport.abort()
+        except (ConnectionError, OSError):
+            self._peers.discard(writer)
+        finally:
+            self._draining.pop(writer, None)
+
+    async def get_state(self, user_id: str) -> Optional[dict]:
+        if self.is_relay:
+            return self._states.get(user_id)
+        if self._writer is None:
+            return None
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._requests[request_id] = future
+        self._send(self._writer, json_codec.dumps_bytes({"op": "get", "user_id": user_id, "req": request_id}) + b"\n")
+        try:
+            return await asyncio.wait_for(future, RECONNECT_DELAY_SECONDS)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._requests.pop(request_id, None)
+
+    def _relay(self, frame: bytes, source: Optional[asyncio.StreamWriter] = None):
+        for peer in list(self._peers):
+            if peer is not source:
+                self._send(peer, frame)
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                frame = json.loads(line)
+                if frame["op"] == "pub":
+                    _store_state(self._states, frame["env"])
+                    self._relay(line, source=writer)
+                    self._received_pub(frame["env"])
+                elif frame["op"] == "get":
+                    state = self._states.get(frame["user_id"])
+                    self._send(writer, json_codec.dumps_bytes({"op": "state", "req": frame["req"], "state": state}) + b"\n")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error(f"Error serving timer bus peer: {str(e)}")
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _read_relay(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                frame = json.loads(line)
+                if frame["op"] == "pub":
+                    self._received_pub(frame["env"])
+                elif frame["op"] == "state":
+                    future = self._requests.get(frame["req"])
+                    if future is not None and not future.done():
+                        future.set_result(frame["state"])
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        self._writer = None
+        if not self._stopping:
+            logger.warning("Lost the timer bus relay, reconnecting")
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+            await self._join()
+
+    async def stop(self):
+        self._stopping = True
+        await super().stop()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        for task in list(self._draining.values()):
+            task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        for peer in list(self._peers):
+            peer.close()
+        if self._server is not None:
+            self._server.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def get_stats(self) -> dict:
+        return {
+            **super().get_stats(),
+            "relay": self.is_relay,
+            "peers": len(self._peers),
+            "dropped_connections": self.dropped_connections,
+        }
+
+
+class RedisError(Exception):
+    pass
+
+
+class RESPConnection:
+    """Just enough of a Redis (RESP2) client for the timer bus"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def open(cls, url: str) -> "RESPConnection":
+        parsed = urlparse(url)
+        reader, writer = await asyncio.open_connection(parsed.hostname or "localhost", parsed.port or 6379)
+        connection = cls(reader, writer)
+        if parsed.password:
+            if parsed.username:
+                await connection.command("AUTH", parsed.username, parsed.password)
+            else:
+                await connection.command("AUTH", parsed.password)
+        db = (parsed.path or "/").lstrip("/")
+        if db and db != "0":
+            await connection.command("SELECT", db)
+        return connection
+
+    @staticmethod
+    def encode(*args: Any) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    async def read_reply(self) -> Any:
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body.decode("utf-8")
+        if prefix == b"-":
+            raise RedisError(body.decode("utf-8"))
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            return (await self.reader.readexactly(length + 2))[:-2]
+        if prefix == b"*":
+            length = int(body)
+            if length < 0:
+                return None
+            return [await self.read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    async def command(self, *args: Any) -> Any:
+        async with self._lock:
+            self.writer.write(self.encode(*args))
+            return await self.read_reply()
+
+    def close(self):
+        self.writer.close()
+
+
+class RedisBus(TimerBus):
+    """Workers on any host connected through a Redis server.
+
+    Envelopes are PUBLISHed on one channel; timer states are also SET under
+    `<key_prefix><user_id>` with a TTL so abandoned timers expire.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, channel: str = "pomodoro:timer-bus", key_prefix: str = "pomodoro:timer:", state_ttl: int = 86400):
+        super().__init__()
+        self.url = url
+        self.channel = channel
+        self.key_prefix = key_prefix
+        self.state_ttl = state_ttl
+        self._commands: Optional[RESPConnection] = None
+        self._outgoing: "asyncio.Queue[dict]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self, on_message: MessageHandler):
+        await super().start(on_message)
+        self._commands = await RESPConnection.open(self.url)
+        subscriber = await RESPConnection.open(self.url)
+        await subscriber.command("SUBSCRIBE", self.channel)
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._send_loop()), loop.create_task(self._subscribe_loop(subscriber))]
+
+    def publish(self, envelope: dict):
+        self.published += 1
+        self._outgoing.put_nowait(envelope)
+
+    async def get_state(self, user_id: str) -> Optional[dict]:
+        if self._commands is None:
+            return None
+        payload = await self._commands.command("GET", self.key_prefix + user_id)
+        return json.loads(payload) if payload is not None else None
+
+    async def _send_loop(self):
+        while True:
+            envelope = await self._outgoing.get()
+            try:
+                if envelope.get("kind") == KIND_STATE:
+                    key = self.key_prefix + envelope["user_id"]
+                    if envelope.get("data") is None:
+                        await self._commands.command("DEL", key)
+                    else:
+                        await self._commands.command("SET", key, json_codec.dumps_bytes(envelope["data"]), "EX", self.state_ttl)
+                await self._commands.command("PUBLISH", self.channel, json_codec.dumps_bytes(envelope))
+            except (ConnectionError, OSError) as e:
+                logger.error(f"Lost Redis connection while publishing: {str(e)}")
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+                try:
+                    self._commands = await RESPConnection.open(self.url)
+                except OSError:
+                    pass
+            except RedisError as e:
+                logger.error(f"Redis rejected timer bus command: {str(e)}")
+
+    async def _subscribe_loop(self, subscriber: RESPConnection):
+        while True:
+            try:
+                reply = await subscriber.read_reply()
+                if isinstance(reply, list) and reply and reply[0] == b"message":
+                    self._receive(json.loads(reply[2]))
+            except (ConnectionError, OSError, asyncio.IncompleteReadError) as e:
+                logger.error(f"Lost Redis subscription: {str(e)}")
+                subscriber.close()
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+                try:
+                    subscriber = await RESPConnection.open(self.url)
+                    await subscriber.command("SUBSCRIBE", self.channel)
+                except OSError:
+                    pass
+
+    async def stop(self):
+        await super().stop()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._commands is not None:
+            self._commands.close()
+            self._commands = None
+
+
+def create_bus() -> TimerBus:
+    """Build the bus selected by the TIMER_BUS environment variable"""
+    kind = os.getenv("TIMER_BUS", "inprocess")
+    if kind == "ipc":
+        return LocalIPCBus(os.getenv("TIMER_BUS_PATH", "/tmp/pomodoro-timer-bus.sock"))
+    if kind == "redis":
+        return RedisBus(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    if kind != "inprocess":
+        logger.warning(f"Unknown TIMER_BUS {kind!r}, using the in-process bus")
+    return InProcessBus()
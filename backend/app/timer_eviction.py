@@ -0,0 +1,36 @@
+# app/timer_eviction.py
+"""
+Least-recently-used bookkeeping for idle timer eviction.
+
+ConnectionManagers touch a user on every timer change, connect or command.
+Eviction walks users from least to most recently active: everyone idle for
+longer than the idle limit goes, and while more than max_resident timers are
+in memory the oldest evictable ones go too. Evicted timers are checkpointed
+and rehydrated on the user's next connect or command.
+"""
+import time
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
+
+
+class IdleTracker:
+    def __init__(self):
+        self._last_active: "OrderedDict[str, float]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._last_active)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._last_active
+
+    def touch(self, user_id: str, now: Optional[float] = None):
+        """Record activity for a user"""
+        self._last_active[user_id] = time.monotonic() if now is None else now
+        self._last_active.move_to_end(user_id)
+
+    def forget(self, user_id: str):
+        self._last_active.pop(user_id, None)
+
+    def oldest_first(self) -> Iterator[Tuple[str, float]]:
+        """(user_id, last activity) from least to most recently active"""
+        return iter(list(self._last_active.items()))
@@ -0,0 +1,105 @@
+# app/timer_repository.py
+"""
+Async data access for the Supabase ConnectionManager.
+
+Everything here runs on the event loop, so queries go through the shared
+async Supabase client. If the installed supabase-py has no async client the
+sync client is used on a worker thread instead; either way a slow PostgREST
+response never blocks other WebSockets.
+"""
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from . import schemas
+from .supabase import supabase, get_async_supabase
+
+logger = logging.getLogger(__name__)
+
+
+async def _execute(build_query: Callable[[Any], Any]):
+    """Run a query built against whichever client is available"""
+    client = await get_async_supabase()
+    if client is not None:
+        return await build_query(client).execute()
+    return await asyncio.to_thread(lambda: build_query(supabase).execute())
+
+
+async def fetch_task_summary(task_id: int) -> Optional[dict]:
+    """Get the fields of a task shown in timer_sync payloads"""
+    response = await _execute(
+        lambda client: client.table("tasks").select("id, title, completed_pomodoros, estimated_pomodoros").eq("id", task_id)
+    )
+    return response.data[0] if response.data else None
+
+
+async def fetch_pomodoro_settings(user_id: str) -> Optional[dict]:
+    """Get a user's pomodoro settings from their profile"""
+    response = await _execute(
+        lambda client: client.table("profiles").select("pomodoro_settings").eq("id", user_id)
+    )
+    if response.data and response.data[0].get("pomodoro_settings"):
+        return response.data[0]["pomodoro_settings"]
+    return None
+
+
+async def increment_completed_pomodoros(task_id: int) -> Optional[int]:
+    """Atomically add one completed pomodoro to a task, returning the new count
+
+    Runs the increment_completed_pomodoros function from setup_supabase.sql,
+    so concurrent completions from several devices are never lost.
+    """
+    response = await _execute(
+        lambda client: client.rpc("increment_completed_pomodoros", {"p_task_id": task_id})
+    )
+    new_count = response.data
+    if isinstance(new_count, list):
+        new_count = new_count[0] if new_count else None
+    return new_count
+
+
+async def pop_evicted_checkpoint(user_id: str) -> Optional[dict]:
+    """Delete a user's evicted-timer checkpoints in one request, returning the newest"""
+    response = await _execute(
+        lambda client: client.table("pomodoro_checkpoints")
+        .delete()
+        .eq("user_id", user_id)
+        .eq("checkpoint_type", schemas.CheckpointType.TIMER_EVICTED.value)
+    )
+    if not response.data:
+        return None
+    return max(response.data, key=lambda row: row.get("timestamp") or "")
+
+
+async def fetch_evicted_user_ids() -> Set[str]:
+    """Users with an evicted timer waiting in pomodoro_checkpoints"""
+    response = await _execute(
+        lambda client: client.table("pomodoro_checkpoints")
+        .select("user_id")
+        .eq("checkpoint_type", schemas.CheckpointType.TIMER_EVICTED.value)
+    )
+    return {str(row["user_id"]) for row in response.data or []}
+
+
+async def flush_writes(increments: Dict[int, int], sessions: List[dict], checkpoints: List[dict]) -> Dict[int, int]:
+    """Write a write-behind batch, returning the new completed_pomodoros per task
+
+    The whole batch goes through one flush_timer_writes call, which applies
+    the increments and inserts the rows in a single transaction, so a failed
+    batch has written nothing and can safely be retried.
+    """
+    task_ids = list(increments)
+    response = await _execute(
+        lambda client: client.rpc("flush_timer_writes", {
+            "p_task_ids": task_ids,
+            "p_amounts": [increments[task_id] for task_id in task_ids],
+            "p_sessions": sessions,
+            "p_checkpoints": checkpoints,
+        })
+    )
+    return {row["task_id"]: row["completed_pomodoros"] for row in response.data or []}
+
+
+def is_constraint_violation(error: Exception) -> bool:
+    """Whether a PostgREST error is an integrity constraint violation (SQLSTATE class 23)"""
+    return str(getattr(error, "code", "") or "").startswith("23")
@@ -0,0 +1,125 @@
+# app/timer_scheduler.py
+"""
+Deadline scheduler for running pomodoro timers.
+
+One asyncio task sleeps until the earliest timer deadline and fires the
+completion callback for every timer that is due, so session transitions
+happen on time even when no client is polling with sync_request.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TimerScheduler:
+    """Min-heap of (deadline, user_id) entries served by a single asyncio task.
+
+    Deadlines are time.monotonic() values. Rescheduling or cancelling a timer
+    only updates the live deadline map; stale heap entries are skipped when
+    they reach the top and the heap is compacted once they pile up.
+    """
+
+    def __init__(self, on_deadline: Callable[[str], Awaitable[None]]):
+        self._on_deadline = on_deadline
+        self._heap: List[Tuple[float, int, str]] = []
+        self._deadlines: Dict[str, float] = {}
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._deadlines
+
+    def get_deadline(self, user_id: str) -> Optional[float]:
+        """Get the monotonic deadline scheduled for a user, if any"""
+        return self._deadlines.get(user_id)
+
+    def schedule(self, user_id: str, deadline: float):
+        """Schedule (or move) the completion deadline of a user's timer"""
+        if self._deadlines.get(user_id) == deadline:
+            return
+        self._deadlines[user_id] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), user_id))
+        self._compact()
+        self._ensure_running()
+        # Only wake the loop when the new entry became the earliest one
+        if self._wakeup is not None and self._heap[0][2] == user_id:
+            self._wakeup.set()
+
+    def cancel(self, user_id: str):
+        """Forget a user's deadline (timer paused, stopped or skipped)"""
+        if self._deadlines.pop(user_id, None) is not None:
+            self._compact()
+
+    async def stop(self):
+        """Stop the scheduler task"""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def _compact(self):
+        """Rebuild the heap once stale entries outnumber live ones"""
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [
+                (deadline, next(self._counter), user_id)
+                for user_id, deadline in self._deadlines.items()
+            ]
+            heapq.heapify(self._heap)
+
+    def _ensure_running(self):
+        """Start the scheduler task on the running event loop if needed"""
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No loop yet (e.g. called from sync code); the next schedule
+            # call made from inside the loop will start the task.
+            return
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    def _pop_due(self, now: float) -> List[str]:
+        """Pop every live entry whose deadline has passed"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, user_id = heapq.heappop(self._heap)
+            if self._deadlines.get(user_id) == deadline:
+                del self._deadlines[user_id]
+                due.append(user_id)
+        return due
+
+    async def _fire(self, user_id: str):
+        try:
+            await self._on_deadline(user_id)
+        except Exception as e:
+            logger.error(f"Error completing timer for user {user_id}: {str(e)}")
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            due = self._pop_due(time.monotonic())
+            if due:
+                # Sessions started together finish together; complete them concurrently
+                await asyncio.gather(*(self._fire(user_id) for user_id in due))
+                continue
+
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, self._heap[0][0] - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
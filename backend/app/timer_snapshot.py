@@ -0,0 +1,160 @@
+# app/timer_snapshot.py
+"""
+Local snapshot file of running timers, so a restart doesn't lose them.
+
+The file holds one JSON line per user. Each line is cached once encoded;
+a save only re-encodes users marked dirty since the previous save, then the
+whole file is rewritten atomically on a worker thread. Restoring reads the
+file in one pass and rebases wall-clock deadlines onto the new process's
+monotonic clock, so time spent down still counts.
+
+A snapshot file belongs to one process at a time: whoever holds the
+exclusive lock on `<path>.lock` restores and saves it, so several workers
+configured with the same path never overwrite each other's timers or
+restore the same ones twice.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, Optional, Set
+
+from . import json_codec
+from .metrics import LatencyStats
+from .timer_state import TimerState
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+
+class TimerSnapshotStore:
+    def __init__(self, path: str, interval: float = 5.0):
+        self.path = path
+        self.interval = interval
+        self.save_stats = LatencyStats()
+        self._lines: Dict[str, str] = {}
+        self._dirty: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+
+    @property
+    def owned(self) -> bool:
+        return self._lock_file is not None
+
+    def acquire(self) -> bool:
+        """Take the snapshot file for this process; False if another process has it"""
+        if self._lock_file is not None:
+            return True
+        lock_file = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def release(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def mark_dirty(self, user_id: str):
+        self._dirty.add(user_id)
+
+    def start(self, get_states: Callable[[], Dict[str, TimerState]]):
+        """Start saving dirty timers every interval seconds"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(get_states))
+
+    async def stop(self, timer_states: Dict[str, TimerState]):
+        """Stop periodic saves and write a final snapshot"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.save(timer_states)
+        finally:
+            self.release()
+
+    async def _run(self, get_states: Callable[[], Dict[str, TimerState]]):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save(get_states())
+            except Exception as e:
+                logger.error(f"Error saving timer snapshot: {str(e)}")
+
+    async def save(self, timer_states: Dict[str, TimerState]):
+        """Re-encode dirty timers and rewrite the snapshot file"""
+        if not self._dirty or not self.acquire():
+            return
+        started = time.perf_counter()
+        now, wall_now = time.monotonic(), time.time()
+        dirty, self._dirty = self._dirty, set()
+        for user_id in dirty:
+            state = timer_states.get(user_id)
+            if state is None:
+                self._lines.pop(user_id, None)
+            else:
+                self._lines[user_id] = json_codec.dumps([user_id, state.to_snapshot(now, wall_now)])
+
+        header = json_codec.dumps({"format": SNAPSHOT_FORMAT, "saved_at": wall_now, "timers": len(self._lines)})
+        text = "\n".join([header, *self._lines.values()]) + "\n"
+        try:
+            await asyncio.to_thread(self._write, text)
+        except Exception:
+            # Keep them dirty so the next save tries again
+            self._dirty |= dirty
+            self.save_stats.record(time.perf_counter() - started, error=True)
+            raise
+        self.save_stats.record(time.perf_counter() - started)
+
+    def _write(self, text: str):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> Dict[str, TimerState]:
+        """Read the snapshot file, returning restored timers by user id
+
+        Returns nothing unless this process could take the file.
+        """
+        if not self.acquire():
+            logger.warning(f"Timer snapshot {self.path} is owned by another process; not restoring it")
+            return {}
+        if not os.path.exists(self.path):
+            return {}
+        now, wall_now = time.monotonic(), time.time()
+        timer_states: Dict[str, TimerState] = {}
+        with open(self.path, encoding="utf-8") as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("format") != SNAPSHOT_FORMAT:
+                logger.warning(f"Ignoring timer snapshot with unknown format: {header.get('format')}")
+                return {}
+            for line in f:
+                try:
+                    user_id, data = json.loads(line)
+                    timer_states[user_id] = TimerState.from_snapshot(data, now, wall_now)
+                    self._lines[user_id] = line.rstrip("\n")
+                except Exception as e:
+                    logger.error(f"Skipping unreadable timer snapshot line: {str(e)}")
+        return timer_states
+
+    def get_stats(self) -> dict:
+        return {
+            "owned": self.owned,
+            "timers": len(self._lines),
+            "dirty": len(self._dirty),
+            "save": self.save_stats.as_dict(),
+        }
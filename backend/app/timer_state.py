@@ -0,0 +1,183 @@
+# app/timer_state.py
+"""
+In-memory pomodoro timer state shared by both ConnectionManagers.
+
+A TimerState keeps a single monotonic deadline while running, or the frozen
+remaining seconds while paused, so reading it never touches the wall clock
+or datetime objects. Session durations come from per-preset tuples that are
+interned, so every timer using the same settings shares one object.
+"""
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_POMODORO_SETTINGS = {
+    "short": {
+        "work_duration": 25,
+        "short_break": 5,
+        "long_break": 15,
+        "sessions_before_long_break": 4
+    },
+    "long": {
+        "work_duration": 50,
+        "short_break": 10,
+        "long_break": 30,
+        "sessions_before_long_break": 4
+    }
+}
+
+# Position of each session's duration inside a preset tuple
+SESSION_INDEX = {'work': 0, 'short_break': 1, 'long_break': 2}
+SESSIONS_BEFORE_LONG_BREAK_INDEX = 3
+
+# (work, short_break, long_break) in seconds, then sessions_before_long_break
+PresetDurations = Tuple[float, float, float, int]
+
+
+def _settings_key(user_settings: Any) -> Tuple[Tuple[str, PresetDurations], ...]:
+    """Flatten nested pomodoro settings (dict or schemas.UserSettings) into a hashable key"""
+    if hasattr(user_settings, "model_dump"):
+        user_settings = user_settings.model_dump()
+    return tuple(sorted(
+        (preset, (
+            values['work_duration'] * 60,
+            values['short_break'] * 60,
+            values['long_break'] * 60,
+            int(values.get('sessions_before_long_break', 4)),
+        ))
+        for preset, values in user_settings.items()
+    ))
+
+
+@lru_cache(maxsize=4096)
+def _intern_presets(key: Tuple[Tuple[str, PresetDurations], ...]) -> Dict[str, PresetDurations]:
+    return dict(key)
+
+
+def compile_settings(user_settings: Any) -> Dict[str, PresetDurations]:
+    """Get the shared preset -> duration tuple mapping for the given settings.
+
+    The returned dict is shared between timers and must not be modified.
+    """
+    return _intern_presets(_settings_key(user_settings or DEFAULT_POMODORO_SETTINGS))
+
+
+class TimerState:
+    __slots__ = (
+        'task_id', 'session_type', 'round_number', 'preset_type', 'presets',
+        'state_version', '_deadline', '_remaining',
+    )
+
+    def __init__(self, task_id: Optional[int], session_type: str, time_remaining: float, user_settings: Any, preset_type: str = 'short'):
+        self.task_id = task_id
+        self.session_type = session_type
+        self.round_number = 1  # Track which round we're on
+        self.preset_type = preset_type  # Current preset type (short/long)
+        self.presets = compile_settings(user_settings)
+        self.state_version = 0  # Bumped by the manager on every state change
+        self._deadline: Optional[float] = None  # time.monotonic() deadline while running
+        self._remaining = float(time_remaining)  # Frozen remaining seconds while paused
+
+    @property
+    def is_paused(self) -> bool:
+        return self._deadline is None
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """Monotonic deadline of the running session, None while paused"""
+        return self._deadline
+
+    @property
+    def time_remaining(self) -> float:
+        """Seconds left in the current session"""
+        return self.seconds_until_deadline()
+
+    @time_remaining.setter
+    def time_remaining(self, seconds: float):
+        if self._deadline is None:
+            self._remaining = float(seconds)
+        else:
+            self._deadline = time.monotonic() + seconds
+
+    def seconds_until_deadline(self, now: Optional[float] = None) -> float:
+        """Seconds left until the running session ends, without modifying the state"""
+        if self._deadline is None:
+            return self._remaining
+        if now is None:
+            now = time.monotonic()
+        return max(0.0, self._deadline - now)
+
+    def get_remaining_time(self) -> int:
+        """Get current remaining time"""
+        return max(0, round(self.seconds_until_deadline()))
+
+    def pause(self):
+        """Pause the timer"""
+        if self._deadline is not None:
+            self._remaining = self.seconds_until_deadline()
+            self._deadline = None
+
+    def resume(self):
+        """Resume the timer"""
+        if self._deadline is None:
+            self._deadline = time.monotonic() + self._remaining
+
+    def apply_settings(self, user_settings: Any):
+        """Switch to new pomodoro settings"""
+        self.presets = compile_settings(user_settings)
+
+    def duration_for(self, session_type: str, preset_type: Optional[str] = None) -> float:
+        """Full length in seconds of a session type under a preset"""
+        return self.presets[preset_type or self.preset_type][SESSION_INDEX[session_type]]
+
+    @property
+    def sessions_before_long_break(self) -> int:
+        return self.presets[self.preset_type][SESSIONS_BEFORE_LONG_BREAK_INDEX]
+
+    def load_session(self, session_type: str):
+        """Switch to a session type with its full duration, paused"""
+        self.session_type = session_type
+        self._deadline = None
+        self._remaining = self.duration_for(session_type)
+
+    def to_snapshot(self, now: Optional[float] = None, wall_now: Optional[float] = None) -> Dict[str, Any]:
+        """Plain-data copy of the state; a running deadline is stored as wall-clock time"""
+        if now is None:
+            now = time.monotonic()
+        if wall_now is None:
+            wall_now = time.time()
+        return {
+            "task_id": self.task_id,
+            "session_type": self.session_type,
+            "round_number": self.round_number,
+            "preset_type": self.preset_type,
+            "presets": self.presets,
+            "state_version": self.state_version,
+            "remaining": self._remaining if self._deadline is None else None,
+            "deadline": None if self._deadline is None else wall_now + self.seconds_until_deadline(now),
+        }
+
+    @classmethod
+    def from_snapshot(cls, data: Dict[str, Any], now: Optional[float] = None, wall_now: Optional[float] = None) -> "TimerState":
+        """Rebuild a state from to_snapshot() output, rebasing the deadline on this process's clock"""
+        if now is None:
+            now = time.monotonic()
+        if wall_now is None:
+            wall_now = time.time()
+        state = cls.__new__(cls)
+        state.task_id = data["task_id"]
+        state.session_type = data["session_type"]
+        state.round_number = data["round_number"]
+        state.preset_type = data["preset_type"]
+        state.presets = _intern_presets(tuple(sorted(
+            (preset, tuple(durations)) for preset, durations in data["presets"].items()
+        )))
+        state.state_version = data["state_version"]
+        if data["deadline"] is None:
+            state._deadline = None
+            state._remaining = float(data["remaining"])
+        else:
+            # Time that passed while the server was down still counts
+            state._deadline = now + max(0.0, data["deadline"] - wall_now)
+            state._remaining = 0.0
+        return state
@@ -0,0 +1,86 @@
+# app/token_cache.py
+"""
+Process-wide cache of verified access tokens.
+
+Entries are keyed by a SHA-256 hash of the token, so raw tokens are never
+held, and live until the token's own `exp`. The value is whatever the auth
+module resolved the token to (UserData for Supabase, a detached User for
+SQLite). Least recently used entries are dropped past maxsize. Logout
+removes a token; account changes remove every token of the user.
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+
+class TokenCache:
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[float, str, Any]]" = OrderedDict()  # key -> (exp, user id, value)
+        self._user_keys: Dict[str, Set[bytes]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[Any]:
+        """Get what a token was verified as, or None if unknown or expired"""
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, user_id, value = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, token: str, user_id: Any, value: Any, expires_at: float):
+        """Cache a verified token until expires_at (a Unix timestamp, the token's exp)"""
+        if expires_at <= time.time():
+            return
+        key = self._key(token)
+        user_id = str(user_id)
+        self._remove(key)
+        self._entries[key] = (expires_at, user_id, value)
+        self._user_keys.setdefault(user_id, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, token: str):
+        self._remove(self._key(token))
+
+    def invalidate_user(self, user_id: Any):
+        """Forget every cached token of a user"""
+        for key in self._user_keys.pop(str(user_id), ()):
+            self._entries.pop(key, None)
+
+    def _remove(self, key: bytes):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._user_keys.get(entry[1])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._user_keys[entry[1]]
+
+    def clear(self):
+        self._entries.clear()
+        self._user_keys.clear()
+
+    def get_stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")))
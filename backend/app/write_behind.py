@@ -0,0 +1,207 @@
+# app/write_behind.py
+"""
+Write-behind queue for timer side effects.
+
+ConnectionManagers hand completed-pomodoro increments and pomodoro session /
+checkpoint rows to a WriteBehindQueue instead of writing them while handling
+a WebSocket message. A background task flushes everything queued in one
+batch every `interval` seconds, or sooner once `max_batch` items are waiting,
+so thousands of sessions ending together become a handful of transactions.
+
+The flush function receives (increments, sessions, checkpoints), where
+increments maps task id -> amount, and returns the new completed_pomodoros
+count of each incremented task it could find. It must write the batch in
+one transaction: a failed batch is requeued whole, so nothing in it may
+have been committed. When it fails with an error `is_permanent` accepts (a
+constraint violation, say) the batch is written again one item at a time
+so the offending rows can be dead-lettered instead of retried forever.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+FlushFn = Callable[[Dict[int, int], List[dict], List[dict]], Awaitable[Dict[int, int]]]
+
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        flush_fn: FlushFn,
+        interval: float = 1.0,
+        max_batch: int = 500,
+        on_counts: Optional[Callable[[Dict[int, int]], None]] = None,
+        is_permanent: Optional[Callable[[Exception], bool]] = None,
+    ):
+        self.interval = interval
+        self.max_batch = max_batch
+        self.flush_stats = LatencyStats()
+        self._flush_fn = flush_fn
+        self._on_counts = on_counts
+        self._is_permanent = is_permanent or (lambda error: False)
+        self.dead_letters = 0
+        self._increments: Dict[int, int] = {}
+        self._sessions: List[dict] = []
+        self._checkpoints: List[dict] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    def __len__(self) -> int:
+        return len(self._increments) + len(self._sessions) + len(self._checkpoints)
+
+    def add_increment(self, task_id: int, amount: int = 1):
+        """Queue completed pomodoros for a task"""
+        self._increments[task_id] = self._increments.get(task_id, 0) + amount
+        self._queued()
+
+    def add_session(self, row: dict):
+        """Queue a pomodoro_sessions row"""
+        self._sessions.append(row)
+        self._queued()
+
+    def add_checkpoint(self, row: dict):
+        """Queue a pomodoro_checkpoints row"""
+        self._checkpoints.append(row)
+        self._queued()
+
+    def pending_increment(self, task_id: int) -> int:
+        """Completed pomodoros for a task that haven't been written yet"""
+        return self._increments.get(task_id, 0)
+
+    def has_checkpoint(self, user_id: str) -> bool:
+        """Whether a checkpoint row for the user is still waiting to be written"""
+        return any(str(row["user_id"]) == user_id for row in self._checkpoints)
+
+    def _queued(self):
+        self._ensure_running()
+        if len(self) >= self.max_batch:
+            self._wakeup.set()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if len(self):
+                await self.flush()
+
+    async def flush(self):
+        """Write everything queued so far in one batch"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not len(self):
+                return
+            increments, sessions, checkpoints = self._increments, self._sessions, self._checkpoints
+            self._increments, self._sessions, self._checkpoints = {}, [], []
+
+            try:
+                counts = await self._write(increments, sessions, checkpoints)
+            except Exception as e:
+                if not self._is_permanent(e) or len(increments) + len(sessions) + len(checkpoints) == 1:
+                    self._failed(e, increments, sessions, checkpoints)
+                    return
+                # Some row can never be written; find it by writing the items one by one
+                counts = {}
+                items = list(self._split(increments, sessions, checkpoints))
+                for index, item in enumerate(items):
+                    try:
+                        counts.update(await self._write(*item))
+                    except asyncio.CancelledError:
+                        for rest in items[index + 1:]:
+                            self._requeue(*rest)
+                        raise
+                    except Exception as item_error:
+                        self._failed(item_error, *item)
+
+            if counts and self._on_counts is not None:
+                try:
+                    self._on_counts(counts)
+                except Exception as e:
+                    logger.error(f"Error applying flushed counts: {str(e)}")
+
+    async def _write(self, increments: Dict[int, int], sessions: List[dict], checkpoints: List[dict]) -> Dict[int, int]:
+        started = time.perf_counter()
+        try:
+            counts = await self._flush_fn(increments, sessions, checkpoints)
+        except asyncio.CancelledError:
+            # Stopped mid-flush; keep the batch for the shutdown flush
+            self._requeue(increments, sessions, checkpoints)
+            raise
+        except Exception:
+            self.flush_stats.record(time.perf_counter() - started, error=True)
+            raise
+        self.flush_stats.record(time.perf_counter() - started)
+        return counts or {}
+
+    def _failed(self, error: Exception, increments: Dict[int, int], sessions: List[dict], checkpoints: List[dict]):
+        """Requeue a batch that failed as a whole, or drop it if it can never be written"""
+        if self._is_permanent(error):
+            self.dead_letters += len(increments) + len(sessions) + len(checkpoints)
+            logger.error(
+                f"Write-behind dropped unwritable rows: {str(error)}; "
+                f"increments={increments} sessions={sessions} checkpoints={checkpoints}"
+            )
+            return
+        logger.error(f"Write-behind flush failed, will retry: {str(error)}")
+        self._requeue(increments, sessions, checkpoints)
+
+    @staticmethod
+    def _split(increments: Dict[int, int], sessions: List[dict], checkpoints: List[dict]):
+        """One single-item batch per increment and row"""
+        for task_id, amount in increments.items():
+            yield {task_id: amount}, [], []
+        for row in sessions:
+            yield {}, [row], []
+        for row in checkpoints:
+            yield {}, [], [row]
+
+    def _requeue(self, increments: Dict[int, int], sessions: List[dict], checkpoints: List[dict]):
+        for task_id, amount in increments.items():
+            self._increments[task_id] = self._increments.get(task_id, 0) + amount
+        self._sessions[:0] = sessions
+        self._checkpoints[:0] = checkpoints
+
+    async def stop(self):
+        """Stop the background task and flush what is left"""
+        if self._task is not None:
+            if self._flush_lock is not None:
+                # Let a flush in progress finish rather than cancel it after its writes committed
+                async with self._flush_lock:
+                    self._task.cancel()
+            else:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if len(self):
+            logger.error(
+                f"Write-behind shutdown flush failed; lost {len(self._increments)} task increments, "
+                f"{len(self._sessions)} sessions and {len(self._checkpoints)} checkpoints"
+            )
+
+    def get_stats(self) -> dict:
+        return {
+            "depth": len(self),
+            "pending_increments": sum(self._increments.values()),
+            "pending_sessions": len(self._sessions),
+            "pending_checkpoints": len(self._checkpoints),
+            "dead_letters": self.dead_letters,
+            "flush": self.flush_stats.as_dict(),
+        }
@@ -0,0 +1,84 @@
+# app/ws_commands.py
+"""
+Registry of WebSocket commands.
+
+Handlers register under a message type together with the pydantic model of
+their payload. The model's TypeAdapter is built once at registration, so
+dispatching a message is a dict lookup plus one validation, and every
+command keeps its own latency and error counters for /api/metrics.
+"""
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Type
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from .metrics import LatencyStats
+from .schemas import WSCommand
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[..., Awaitable[None]]
+
+
+class Command:
+    __slots__ = ("name", "handler", "adapter", "stats")
+
+    def __init__(self, name: str, handler: Handler, payload: Type[BaseModel]):
+        self.name = name
+        self.handler = handler
+        self.adapter = TypeAdapter(payload)
+        self.stats = LatencyStats()
+
+
+class CommandRegistry:
+    def __init__(self):
+        self.commands: Dict[str, Command] = {}
+        self.unknown = 0
+        self.invalid = 0
+
+    def command(self, name: str, payload: Type[BaseModel] = WSCommand) -> Callable[[Handler], Handler]:
+        """Register the decorated coroutine as the handler for `name` messages"""
+        def register(handler: Handler) -> Handler:
+            if name in self.commands:
+                raise ValueError(f"Command already registered: {name}")
+            self.commands[name] = Command(name, handler, payload)
+            return handler
+        return register
+
+    def get(self, message: Any) -> Optional[Command]:
+        """The command a message is for, or None if it has no known type"""
+        if not isinstance(message, dict):
+            return None
+        return self.commands.get(message.get("type"))
+
+    async def dispatch(self, message: Any, *args: Any) -> bool:
+        """Validate a message and run its handler with (*args, payload); False if it was rejected"""
+        command = self.get(message)
+        if command is None:
+            self.unknown += 1
+            logger.warning(f"Ignoring unknown WebSocket command: {message.get('type') if isinstance(message, dict) else message!r}")
+            return False
+        try:
+            payload = command.adapter.validate_python(message)
+        except ValidationError as e:
+            self.invalid += 1
+            command.stats.record(0.0, error=True)
+            logger.warning(f"Invalid {command.name} command: {e.errors(include_url=False)}")
+            return False
+
+        started = time.perf_counter()
+        try:
+            await command.handler(*args, payload)
+        except Exception:
+            command.stats.record(time.perf_counter() - started, error=True)
+            raise
+        command.stats.record(time.perf_counter() - started)
+        return True
+
+    def get_stats(self) -> dict:
+        return {
+            "unknown": self.unknown,
+            "invalid": self.invalid,
+            "by_command": {name: command.stats.as_dict() for name, command in self.commands.items()},
+        }
@@ -0,0 +1,80 @@
+# app/ws_encoding.py
+"""
+WebSocket frame encodings negotiated through Sec-WebSocket-Protocol.
+
+Clients that can decode a compact binary format offer it as a subprotocol
+("msgpack" or "cbor"), most preferred first; the server accepts the first
+one it has a codec for. Connections that offer none keep plain JSON text
+frames. Binary encodings are optional dependencies and are simply not
+offered when their package is missing.
+"""
+import json
+from datetime import timezone
+from typing import Any, Iterable, Optional, Union
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from . import json_codec
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # pragma: no cover - depends on the environment
+    cbor2 = None
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+ENCODING_CBOR = "cbor"
+
+Frame = Union[str, bytes]
+
+
+def _encode_json(message: Any) -> str:
+    return json_codec.dumps(message)
+
+
+def _encode_msgpack(message: Any) -> bytes:
+    # Datetimes and UUIDs become the same strings the JSON encoding uses
+    return msgpack.packb(message, default=json_codec.to_json_compatible, datetime=False)
+
+
+def _encode_cbor(message: Any) -> bytes:
+    # Datetimes and UUIDs use CBOR's standard tags
+    return cbor2.dumps(message, timezone=timezone.utc, default=lambda encoder, obj: encoder.encode(json_codec.to_json_compatible(obj)))
+
+
+ENCODERS = {ENCODING_JSON: _encode_json}
+DECODERS = {ENCODING_JSON: json.loads}
+if msgpack is not None:
+    ENCODERS[ENCODING_MSGPACK] = _encode_msgpack
+    DECODERS[ENCODING_MSGPACK] = msgpack.unpackb
+if cbor2 is not None:
+    ENCODERS[ENCODING_CBOR] = _encode_cbor
+    DECODERS[ENCODING_CBOR] = cbor2.loads
+
+
+def negotiate(offered: Iterable[str]) -> Optional[str]:
+    """Pick the first subprotocol the client offered that we can encode, or None for default JSON"""
+    for subprotocol in offered:
+        if subprotocol in ENCODERS:
+            return subprotocol
+    return None
+
+
+def encode(encoding: str, message: Any) -> Frame:
+    """Encode a message as a text (JSON) or binary frame"""
+    return ENCODERS[encoding](message)
+
+
+async def receive(websocket: WebSocket, encoding: str = ENCODING_JSON) -> Any:
+    """Read one client message; text frames are JSON, binary frames use the connection's encoding"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    if message.get("text") is not None:
+        return json.loads(message["text"])
+    return DECODERS[encoding](message["bytes"])
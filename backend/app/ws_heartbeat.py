@@ -0,0 +1,134 @@
+# app/ws_heartbeat.py
+"""
+Application-level heartbeats for WebSocket connections.
+
+One shared task sweeps every connection each `interval` seconds instead of
+running a timer per socket. A connection that has sent nothing (no command
+and no pong) for `timeout` seconds is reaped with the rest of the sweep's
+dead connections in one batch; every other connection is sent a ping. The
+client answers each ping with {"type": "pong"}, which also gives the
+round-trip time of the connection.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import WebSocket
+
+from .metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+# Reason passed to ConnectionManager._drop_connection for reaped connections
+DEAD_HEARTBEAT = "heartbeat"
+
+
+class _Peer:
+    __slots__ = ("user_id", "connected_at", "last_seen", "ping_sent_at")
+
+    def __init__(self, user_id: str, now: float):
+        self.user_id = user_id
+        self.connected_at = now
+        self.last_seen = now
+        self.ping_sent_at: Optional[float] = None
+
+
+class HeartbeatMonitor:
+    def __init__(self, interval: float = 25.0, timeout: float = 60.0):
+        self.interval = interval
+        self.timeout = timeout
+        self.rtt_stats = LatencyStats()
+        self.reaped = 0
+        self._peers: Dict[WebSocket, _Peer] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._peers)
+
+    def add(self, websocket: WebSocket, user_id: str, now: Optional[float] = None):
+        self._peers[websocket] = _Peer(user_id, time.monotonic() if now is None else now)
+
+    def remove(self, websocket: WebSocket):
+        self._peers.pop(websocket, None)
+
+    def seen(self, websocket: WebSocket, now: Optional[float] = None):
+        """Record that a message arrived on the connection"""
+        peer = self._peers.get(websocket)
+        if peer is not None:
+            peer.last_seen = time.monotonic() if now is None else now
+
+    def pong(self, websocket: WebSocket, now: Optional[float] = None):
+        """Record a pong, measuring the round trip of the ping it answers"""
+        peer = self._peers.get(websocket)
+        if peer is None:
+            return
+        if now is None:
+            now = time.monotonic()
+        peer.last_seen = now
+        if peer.ping_sent_at is not None:
+            self.rtt_stats.record(now - peer.ping_sent_at)
+            peer.ping_sent_at = None
+
+    def sweep(self, now: Optional[float] = None) -> Tuple[List[WebSocket], List[Tuple[WebSocket, str]]]:
+        """Split connections into (to ping, dead (websocket, user id) pairs); dead ones are forgotten"""
+        if now is None:
+            now = time.monotonic()
+        silent_since = now - self.timeout
+        to_ping, dead = [], []
+        for websocket, peer in list(self._peers.items()):
+            if peer.last_seen < silent_since:
+                dead.append((websocket, peer.user_id))
+                del self._peers[websocket]
+            else:
+                to_ping.append(websocket)
+                if peer.ping_sent_at is None:
+                    peer.ping_sent_at = now
+        self.reaped += len(dead)
+        return to_ping, dead
+
+    def start(
+        self,
+        send_pings: Callable[[List[WebSocket]], None],
+        reap: Callable[[List[Tuple[WebSocket, str]]], Awaitable[None]],
+    ):
+        """Start the shared sweep loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(send_pings, reap))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, send_pings, reap):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                to_ping, dead = self.sweep()
+                if dead:
+                    logger.info(f"Reaping {len(dead)} unresponsive WebSocket connections")
+                    await reap(dead)
+                if to_ping:
+                    send_pings(to_ping)
+            except Exception as e:
+                logger.error(f"Error during heartbeat sweep: {str(e)}")
+
+    def get_stats(self, now: Optional[float] = None) -> dict:
+        if now is None:
+            now = time.monotonic()
+        ages = [now - peer.connected_at for peer in self._peers.values()]
+        return {
+            "connections": len(self._peers),
+            "interval": self.interval,
+            "timeout": self.timeout,
+            "reaped": self.reaped,
+            "awaiting_pong": sum(1 for peer in self._peers.values() if peer.ping_sent_at is not None),
+            "avg_age_s": round(sum(ages) / len(ages), 1) if ages else 0.0,
+            "max_age_s": round(max(ages), 1) if ages else 0.0,
+            "rtt": self.rtt_stats.as_dict(),
+        }
@@ -1,77 +1,140 @@
 # app/ws_manager_supabase.py
 from fastapi import WebSocket
-from typing import Dict, Set, Optional
-from datetime import datetime, timezone
+from typing import AsyncContextManager, Dict, List, Set, Optional
+import asyncio
+import itertools
 import json
+import os
+import time
+import uuid
 import logging
+from datetime import datetime, timedelta, timezone
 
 # Create a logger
 logger = logging.getLogger(__name__)
 
-# Import Supabase client
-from .supabase import supabase
-
-class TimerState:
-    def __init__(self, task_id: int, session_type: str, time_remaining: int, user_settings: dict, preset_type: str = 'short'):
-        self.task_id = task_id
-        self.session_type = session_type
-        self.time_remaining = time_remaining
-        self.is_paused = True
-        self.last_update = datetime.now(timezone.utc)
-        self.round_number = 1  # Track which round we're on
-        self.preset_type = preset_type  # Current preset type (short/long)
-        self.settings = user_settings  # Use user's actual settings
-        self.active_task = None  # Store the active task details
-        self.session_completed = False  # New flag to track session completion
-
-    def update_remaining_time(self):
-        """Update remaining time if timer is running"""
-        current_time = datetime.now(timezone.utc)
-        
-        if not self.is_paused:
-            elapsed = (current_time - self.last_update).total_seconds()
-            new_time = max(0, self.time_remaining - elapsed)
-            
-            # Check if timer just reached 0
-            if new_time == 0 and self.time_remaining > 0:
-                self.session_completed = True
-            
-            self.time_remaining = new_time
-            self.last_update = current_time  # Only update timestamp when timer is running
-
-    def get_remaining_time(self) -> int:
-        """Get current remaining time"""
-        self.update_remaining_time()
-        return max(0, round(self.time_remaining))
+# Async data access (never blocks the event loop)
+from . import timer_repository
+from .sharding import ShardedDict, UserLocks
+from .timer_eviction import IdleTracker
+from .timer_bus import KIND_BROADCAST, KIND_STATE, create_bus
+from .timer_scheduler import TimerScheduler
+from .timer_snapshot import TimerSnapshotStore
+from .timer_state import TimerState, DEFAULT_POMODORO_SETTINGS
+from .task_cache import TaskSummaryCache
+from . import ws_encoding
+from .metrics import LatencyStats
+from .write_behind import WriteBehindQueue
+from .ws_heartbeat import DEAD_HEARTBEAT, HeartbeatMonitor
+from .ws_outbox import ConnectionOutbox, DEAD_ERROR, DEAD_OVERFLOW, DEAD_TIMEOUT
+from .settings_cache import settings_cache
+from . import schemas
 
-    def pause(self):
-        """Pause the timer"""
-        self.update_remaining_time()  # Update time before pausing
-        self.is_paused = True
-
-    def resume(self):
-        """Resume the timer"""
-        self.last_update = datetime.now(timezone.utc)  # Reset the update time
-        self.is_paused = False
-    
+# WebSocket sync protocols: "poll" clients ask for state with sync_request,
+# "push" clients render the countdown from the deadline and only receive
+# timer_sync when the state changes.
+PROTOCOL_POLL = "poll"
+PROTOCOL_PUSH = "push"
+PROTOCOLS = (PROTOCOL_POLL, PROTOCOL_PUSH)
 
+# Per-connection send deadline; a socket that can't take a frame in time is dropped
+SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+# Ordered messages a connection may have queued before it's dropped as too slow
+OUTBOX_SIZE = int(os.getenv("WS_OUTBOX_SIZE", "64"))
+# Connections are pinged this often and reaped after this long without any message
+PING_INTERVAL_SECONDS = float(os.getenv("WS_PING_INTERVAL", "25"))
+PING_TIMEOUT_SECONDS = float(os.getenv("WS_PING_TIMEOUT", "60"))
+PING_MESSAGE = {"type": "ping"}
+# Paused timers of users without connections are checkpointed and evicted after
+# this long without activity, or sooner while more than the cap are resident
+TIMER_IDLE_SECONDS = float(os.getenv("TIMER_IDLE_SECONDS", "3600"))
+TIMER_MAX_RESIDENT = int(os.getenv("TIMER_MAX_RESIDENT", "100000"))
+TIMER_EVICTION_INTERVAL = float(os.getenv("TIMER_EVICTION_INTERVAL", "60"))
+# Number of user shards (each with its own command lock)
+SHARD_COUNT = int(os.getenv("WS_SHARD_COUNT", "64"))
+# Timer side effects are written in batches at most this many seconds apart,
+# or as soon as this many are queued
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "1"))
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "500"))
+# Running timers survive restarts when a snapshot file is configured
+TIMER_SNAPSHOT_PATH = os.getenv("TIMER_SNAPSHOT_PATH")
+TIMER_SNAPSHOT_INTERVAL = float(os.getenv("TIMER_SNAPSHOT_INTERVAL", "5"))
 
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[str, Set[WebSocket]] = {}
-        self.timer_states: Dict[str, TimerState] = {}
+        # Per-user state is sharded by user id; commands take a per-user lock
+        self.active_connections: ShardedDict = ShardedDict(SHARD_COUNT)
+        self.timer_states: ShardedDict = ShardedDict(SHARD_COUNT)
+        self.user_locks = UserLocks()
+        self.scheduler = TimerScheduler(self._on_timer_deadline)
+        self.connection_protocols: Dict[WebSocket, str] = {}
+        self.connection_encodings: Dict[WebSocket, str] = {}
+        self.pushed_versions: Dict[WebSocket, int] = {}
+        self._versions = itertools.count(1)
+        self.task_cache = TaskSummaryCache(int(os.getenv("TASK_CACHE_SIZE", "10000")))
+        self.send_timeout = SEND_TIMEOUT_SECONDS
+        self.broadcast_stats = LatencyStats()
+        self.send_stats = LatencyStats()
+        self.send_timeouts = 0
+        self.outboxes: Dict[WebSocket, ConnectionOutbox] = {}
+        self.outbox_size = OUTBOX_SIZE
+        self.outbox_overflows = 0
+        self.heartbeat = HeartbeatMonitor(PING_INTERVAL_SECONDS, PING_TIMEOUT_SECONDS)
+        self.write_behind = WriteBehindQueue(
+            timer_repository.flush_writes,
+            interval=WRITE_BEHIND_INTERVAL,
+            max_batch=WRITE_BEHIND_BATCH,
+            on_counts=self._on_counts_flushed,
+            is_permanent=timer_repository.is_constraint_violation,
+        )
+        # Workers share timer states and broadcasts over the bus. The worker that
+        # last changed a timer owns its deadline; the others keep a replica.
+        self.worker_id = uuid.uuid4().hex
+        self.bus = create_bus()
+        self.replicas: Set[str] = set()
+        self.idle_tracker = IdleTracker()
+        self.evicted: Set[str] = set()  # Users whose timer waits in an evicted checkpoint
+        self.evictions = 0
+        self.rehydrations = 0
+        self._eviction_task: Optional[asyncio.Task] = None
+        # With a shared bus the timers live on several workers, which one local file can't hold
+        self.snapshots: Optional[TimerSnapshotStore] = None
+        if TIMER_SNAPSHOT_PATH and self.bus.name != "inprocess":
+            logger.warning(f"TIMER_SNAPSHOT_PATH is ignored with the {self.bus.name} timer bus")
+        elif TIMER_SNAPSHOT_PATH:
+            self.snapshots = TimerSnapshotStore(TIMER_SNAPSHOT_PATH, TIMER_SNAPSHOT_INTERVAL)
 
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket, user_id: str, protocol: str = PROTOCOL_POLL, encoding: Optional[str] = None):
+        """Accept a connection; encoding is the negotiated subprotocol, or None for JSON"""
+        await websocket.accept(subprotocol=encoding)
+        self.connection_encodings[websocket] = encoding or ws_encoding.ENCODING_JSON
+        self.heartbeat.add(websocket, user_id)
         if user_id not in self.active_connections:
             self.active_connections[user_id] = set()
         self.active_connections[user_id].add(websocket)
+        self.connection_protocols[websocket] = protocol
+        self._open_outbox(websocket, user_id)
+
+        # Another worker may be running this user's timer, or it was evicted
+        if user_id not in self.timer_states:
+            await self._load_shared_state(user_id)
+        if user_id not in self.timer_states and user_id in self.evicted:
+            await self._rehydrate(user_id)
+        elif user_id in self.idle_tracker:
+            self.idle_tracker.touch(user_id)
 
         # Send current timer state if exists
         if user_id in self.timer_states:
-            await self.sync_timer_state(user_id)
+            await self.sync_timer_state(user_id, websocket)
 
     async def disconnect(self, websocket: WebSocket, user_id: str):
+        self.connection_protocols.pop(websocket, None)
+        self.pushed_versions.pop(websocket, None)
+        self.connection_encodings.pop(websocket, None)
+        self.heartbeat.remove(websocket)
+        outbox = self.outboxes.pop(websocket, None)
+        if outbox is not None:
+            outbox.close()
         if user_id in self.active_connections:
             try:
                 self.active_connections[user_id].remove(websocket)
@@ -80,24 +143,11 @@ class ConnectionManager:
             except Exception as e:
                 logger.error(f"Error during disconnect: {str(e)}")
 
-    def start_timer(self, user_id: str, task_id: int, session_type: str, duration: int, preset_type: str = 'short', user_settings: dict = None):
+    async def start_timer(self, user_id: str, task_id: int, session_type: str, duration: int, preset_type: str = 'short', user_settings: dict = None):
         """Start a new timer session with user's settings"""
         if not user_settings:
             # Default settings if none provided
-            user_settings = {
-                "short": {
-                    "work_duration": 25,
-                    "short_break": 5,
-                    "long_break": 15,
-                    "sessions_before_long_break": 4
-                },
-                "long": {
-                    "work_duration": 50,
-                    "short_break": 10,
-                    "long_break": 30,
-                    "sessions_before_long_break": 4
-                }
-            }
+            user_settings = DEFAULT_POMODORO_SETTINGS
         
         # Preserve round_number if exists, otherwise default to 1
         current_round = 1
@@ -115,47 +165,325 @@ class ConnectionManager:
         # Set the preserved round number
         self.timer_states[user_id].round_number = current_round
         self.timer_states[user_id].resume()  # Start running immediately
+        self.mark_changed(user_id)
         
-        # Load and store the active task details
-        try:
-            task_response = supabase.table("tasks").select("id, title").eq("id", task_id).execute()
-            if task_response.data and len(task_response.data) > 0:
-                self.timer_states[user_id].active_task = {
-                    "id": task_response.data[0]["id"],
-                    "title": task_response.data[0]["title"],
-                }
-        except Exception as e:
-            logger.error(f"Error fetching task: {str(e)}")
+        # Warm the task cache so syncs for this session don't hit the database
+        if task_id:
+            await self._get_task_summary(task_id)
 
     def stop_timer(self, user_id: str):
+        self.scheduler.cancel(user_id)
+        self.idle_tracker.forget(user_id)
         if user_id in self.timer_states:
             del self.timer_states[user_id]
+        if self.snapshots is not None:
+            self.snapshots.mark_dirty(user_id)
+        self.replicas.discard(user_id)
+        self._publish_state(user_id)
+
+    async def startup(self):
+        """Join the worker bus, resume snapshotted timers and start idle eviction and heartbeats"""
+        await self.bus.start(self._on_bus_message)
+        await self.restore_timers()
+        await self._load_evicted_users()
+        self._eviction_task = asyncio.get_running_loop().create_task(self._evict_idle_loop())
+        self.heartbeat.start(self._send_pings, self._reap_connections)
+
+    async def restore_timers(self) -> int:
+        """Load timers from the snapshot file and start periodic snapshots"""
+        if self.snapshots is None:
+            return 0
+        restored = self.snapshots.load()
+        if not self.snapshots.owned:
+            # Another worker restores and saves this file
+            self.snapshots = None
+            return 0
+        self.timer_states.update(restored)
+        if restored:
+            # Keep versions increasing so push clients don't ignore new states
+            self._versions = itertools.count(max(state.state_version for state in restored.values()) + 1)
+        for user_id in restored:
+            self.idle_tracker.touch(user_id)
+            self._schedule_completion(user_id)
+        self.snapshots.start(lambda: self.timer_states)
+        logger.info(f"Restored {len(restored)} timers from {self.snapshots.path}")
+        return len(restored)
+
+    async def shutdown(self):
+        """Stop background tasks, flushing queued writes and the timer snapshot"""
+        if self._eviction_task is not None:
+            self._eviction_task.cancel()
+            self._eviction_task = None
+        await self.heartbeat.stop()
+        await self.scheduler.stop()
+        await self.write_behind.stop()
+        if self.snapshots is not None:
+            await self.snapshots.stop(self.timer_states)
+        await self.bus.stop()
+
+    def pause_timer(self, user_id: str):
+        """Pause the user's timer and drop its completion deadline"""
+        if user_id in self.timer_states:
+            self.timer_states[user_id].pause()
+            self.mark_changed(user_id)
+
+    def resume_timer(self, user_id: str):
+        """Resume the user's timer and schedule its completion"""
+        if user_id in self.timer_states:
+            self.timer_states[user_id].resume()
+            self.mark_changed(user_id)
+
+    def mark_changed(self, user_id: str):
+        """Give the user's timer state a new version and reschedule its completion
+
+        Must be called after every mutation so push-mode clients receive the
+        new state and the scheduler fires at the right time.
+        """
+        state = self.timer_states.get(user_id)
+        if state is not None:
+            state.state_version = next(self._versions)
+        self._schedule_completion(user_id)
+        if self.snapshots is not None:
+            self.snapshots.mark_dirty(user_id)
+        self.idle_tracker.touch(user_id)
+        self.replicas.discard(user_id)
+        self._publish_state(user_id)
+
+    def _publish_state(self, user_id: str):
+        """Share the user's timer state (None once stopped) with the other workers"""
+        state = self.timer_states.get(user_id)
+        self.bus.publish({
+            "origin": self.worker_id,
+            "kind": KIND_STATE,
+            "user_id": user_id,
+            "version": state.state_version if state is not None else next(self._versions),
+            "data": state.to_snapshot() if state is not None else None,
+        })
+
+    async def _on_bus_message(self, envelope: dict):
+        """Apply a timer state or broadcast published by another worker"""
+        if envelope["origin"] == self.worker_id:
+            return
+        user_id = envelope["user_id"]
+        if envelope["kind"] == KIND_BROADCAST:
+            if user_id in self.active_connections:
+                await self._send_to_connections(user_id, list(self.active_connections[user_id]), envelope["data"])
+            return
+
+        async with self.lock_for(user_id):
+            if self._newer_here(user_id, envelope):
+                # Changed here after the sender did; the sender takes our state as its replica
+                return
+            # Another worker owns this timer now
+            self._see_version(envelope.get("version", 0))
+            self.scheduler.cancel(user_id)
+            if envelope.get("evicted") and user_id in self.timer_states and user_id in self.active_connections:
+                # Evicted by an idle worker while devices here still show it; take it over
+                self.mark_changed(user_id)
+                return
+            if envelope.get("evicted"):
+                # Its checkpoint is this worker's to rehydrate too
+                self.evicted.add(user_id)
+            else:
+                self.evicted.discard(user_id)
+            if envelope["data"] is None or user_id not in self.active_connections:
+                # Stopped, or nobody here to show it to; reloaded on connect
+                self.timer_states.pop(user_id, None)
+                self.replicas.discard(user_id)
+                return
+            self._apply_replica(user_id, envelope["data"])
+            await self.sync_timer_state(user_id)
+
+    def _newer_here(self, user_id: str, envelope: dict) -> bool:
+        """Whether our copy of the timer is a later write than the envelope's
+
+        Writes are ordered by (state_version, worker id), so when two workers
+        change a timer at once every worker agrees on the last writer, which
+        alone keeps the completion deadline.
+        """
+        state = self.timer_states.get(user_id)
+        if state is None:
+            return False
+        writer = "" if user_id in self.replicas else self.worker_id
+        return (state.state_version, writer) > (envelope.get("version", 0), envelope["origin"])
+
+    async def _load_shared_state(self, user_id: str):
+        """Fetch a timer another worker is running for the user"""
+        try:
+            data = await self.bus.get_state(user_id)
+        except Exception as e:
+            logger.error(f"Error loading shared timer state: {str(e)}")
+            return
+        if data is not None and user_id not in self.timer_states:
+            self._apply_replica(user_id, data)
+
+    def _apply_replica(self, user_id: str, data: dict):
+        state = TimerState.from_snapshot(data)
+        self.timer_states[user_id] = state
+        self.replicas.add(user_id)
+        self.idle_tracker.touch(user_id)
+        self._see_version(state.state_version)
+
+    def _see_version(self, version: int):
+        # Keep versions increasing across workers so push clients accept our next state
+        self._versions = itertools.count(max(next(self._versions), version + 1))
+
+    def _schedule_completion(self, user_id: str):
+        """Keep the scheduler's deadline in step with the user's timer state"""
+        state = self.timer_states.get(user_id)
+        if state is None or state.is_paused:
+            self.scheduler.cancel(user_id)
+        else:
+            self.scheduler.schedule(user_id, time.monotonic() + state.seconds_until_deadline())
+
+    async def ensure_resident(self, user_id: str) -> Optional[TimerState]:
+        """Get the user's timer for a command, rehydrating it if it was evicted"""
+        state = self.timer_states.get(user_id)
+        if state is not None:
+            self.idle_tracker.touch(user_id)
+            return state
+        if user_id in self.evicted:
+            return await self._rehydrate(user_id)
+        return None
+
+    async def _load_evicted_users(self):
+        """Learn which users have evicted timers, so connects only query for those"""
+        try:
+            self.evicted |= await timer_repository.fetch_evicted_user_ids()
+        except Exception as e:
+            logger.error(f"Error loading evicted timers: {str(e)}")
+
+    async def _rehydrate(self, user_id: str) -> Optional[TimerState]:
+        """Bring back a timer that was evicted to pomodoro_checkpoints"""
+        if user_id in self.evicted:
+            # The checkpoint may still be waiting in the write-behind queue
+            await self.write_behind.flush()
+        try:
+            checkpoint = await timer_repository.pop_evicted_checkpoint(user_id)
+        except Exception as e:
+            logger.error(f"Error loading evicted timer: {str(e)}")
+            return None
+        if checkpoint is None and self.write_behind.has_checkpoint(user_id):
+            # The flush failed and the checkpoint is still queued; try again on the next command
+            return self.timer_states.get(user_id)
+        self.evicted.discard(user_id)
+        if checkpoint is None or user_id in self.timer_states:
+            return self.timer_states.get(user_id)
+        user_settings = await self.load_user_settings(user_id)
+        return self._restore_checkpoint(user_id, checkpoint, user_settings)
+
+    def _restore_checkpoint(self, user_id: str, checkpoint: dict, user_settings) -> TimerState:
+        state = TimerState(
+            task_id=checkpoint["task_id"],
+            session_type=checkpoint["session_type"],
+            time_remaining=checkpoint["remaining_time"],
+            user_settings=user_settings or DEFAULT_POMODORO_SETTINGS,
+            preset_type=checkpoint["preset_type"] or 'short'
+        )
+        state.round_number = checkpoint["round_number"] or 1
+        self.timer_states[user_id] = state
+        self.rehydrations += 1
+        self.mark_changed(user_id)
+        return state
+
+    async def _evict_idle_loop(self):
+        while True:
+            await asyncio.sleep(TIMER_EVICTION_INTERVAL)
+            try:
+                evicted = self.evict_idle()
+                if evicted:
+                    logger.info(f"Evicted {evicted} idle timers")
+            except Exception as e:
+                logger.error(f"Error evicting idle timers: {str(e)}")
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Checkpoint and drop idle timers, oldest first; returns how many were evicted"""
+        if now is None:
+            now = time.monotonic()
+        idle_before = now - TIMER_IDLE_SECONDS
+        evicted = 0
+        for user_id, last_active in self.idle_tracker.oldest_first():
+            if last_active > idle_before and len(self.timer_states) <= TIMER_MAX_RESIDENT:
+                break
+            if self._evict(user_id):
+                evicted += 1
+        return evicted
+
+    def _evict(self, user_id: str) -> bool:
+        state = self.timer_states.get(user_id)
+        if state is None:
+            self.idle_tracker.forget(user_id)
+            return False
+        # Running timers, timers on screen and timers mid-command stay resident
+        if not state.is_paused or user_id in self.active_connections or self.user_locks.locked(user_id):
+            return False
+        del self.timer_states[user_id]
+        self.idle_tracker.forget(user_id)
+        self.scheduler.cancel(user_id)
+        if self.snapshots is not None:
+            self.snapshots.mark_dirty(user_id)
+        if user_id in self.replicas:
+            # Owned by another worker, which keeps it
+            self.replicas.discard(user_id)
+            return True
+        self.write_behind.add_checkpoint(self._checkpoint_row(user_id, state))
+        self.evicted.add(user_id)
+        self.evictions += 1
+        self.bus.publish({
+            "origin": self.worker_id,
+            "kind": KIND_STATE,
+            "user_id": user_id,
+            "version": next(self._versions),
+            "data": None,
+            "evicted": True,
+        })
+        return True
+
+    def _checkpoint_row(self, user_id: str, state: TimerState) -> dict:
+        """pomodoro_checkpoints row holding an evicted timer"""
+        return {
+            "user_id": user_id,
+            "task_id": state.task_id,
+            "checkpoint_type": schemas.CheckpointType.TIMER_EVICTED.value,
+            "remaining_time": state.get_remaining_time(),
+            "session_type": state.session_type,
+            "is_paused": True,
+            "round_number": state.round_number,
+            "preset_type": state.preset_type,
+        }
+
+    def lock_for(self, user_id: str) -> AsyncContextManager[None]:
+        """Lock serializing timer commands for user_id"""
+        return self.user_locks.hold(user_id)
 
-    def skip_to_next(self, user_id: str):
+    async def _on_timer_deadline(self, user_id: str):
+        """Complete the session whose deadline the scheduler just reached"""
+        async with self.lock_for(user_id):
+            await self._complete_due_session(user_id)
+
+    async def _complete_due_session(self, user_id: str):
+        state = self.timer_states.get(user_id)
+        if state is None or state.is_paused:
+            return
+        if state.seconds_until_deadline() > 0:
+            # Timer was changed after the deadline was taken; wait for the new one
+            self._schedule_completion(user_id)
+            return
+        await self.handle_session_completion(user_id)
+        await self.sync_timer_state(user_id)
+
+    async def skip_to_next(self, user_id: str):
         """Skip to the next session"""
         if user_id not in self.timer_states:
             return
             
         state = self.timer_states[user_id]
         current_session = state.session_type
-        current_preset = state.preset_type  # Store current preset type
+        completed_task_id = state.task_id if current_session == 'work' else None
 
-        # If it was a work session, update the task completion
-        if current_session == 'work' and state.task_id is not None:
-            try:
-                task_id = state.task_id
-                # Get current completed pomodoros
-                task_response = supabase.table("tasks").select("completed_pomodoros").eq("id", task_id).execute()
-                if task_response.data and len(task_response.data) > 0:
-                    current_count = task_response.data[0]["completed_pomodoros"] or 0
-                    # Update completed pomodoros
-                    supabase.table("tasks").update({"completed_pomodoros": current_count + 1}).eq("id", task_id).execute()
-            except Exception as e:
-                logger.error(f"Error updating task completion: {str(e)}")
-            
         # Determine the next session type
         if current_session == 'work':
-            if state.round_number % state.settings[current_preset]['sessions_before_long_break'] == 0:
+            if state.round_number % state.sessions_before_long_break == 0:
                 next_session = 'long_break'
             else:
                 next_session = 'short_break'
@@ -166,28 +494,22 @@ class ConnectionManager:
             else:
                 state.round_number += 1
             
-        # Set up the next session
-        state.session_type = next_session
-        if next_session == 'work':
-            state.time_remaining = state.settings[current_preset]['work_duration'] * 60
-        elif next_session == 'short_break':
-            state.time_remaining = state.settings[current_preset]['short_break'] * 60
-        else:  # long_break
-            state.time_remaining = state.settings[current_preset]['long_break'] * 60
-            
-        # Update timestamp and pause the timer
-        state.last_update = datetime.now(timezone.utc)
-        state.is_paused = True
+        # Set up the next session, paused
+        state.load_session(next_session)
+        self.mark_changed(user_id)
+
+        # If it was a work session, record the completed pomodoro
+        if completed_task_id is not None:
+            self._record_pomodoro(completed_task_id)
 
-    def reset_rounds(self, user_id: str):
+    async def reset_rounds(self, user_id: str):
         """Reset the round counter and timer for a user"""
         if user_id not in self.timer_states:
             # If there's no active timer state, create a default one
             try:
-                # Get user settings from profiles table
-                user_response = supabase.table("profiles").select("pomodoro_settings").eq("id", user_id).execute()
-                if user_response.data and len(user_response.data) > 0:
-                    user_settings = user_response.data[0]["pomodoro_settings"]
+                # Get user settings (cached profiles lookup)
+                user_settings = await self.load_user_settings(user_id)
+                if user_settings:
                     preset_type = 'short'  # Default preset
                     
                     # Create a new timer state with default values
@@ -195,53 +517,33 @@ class ConnectionManager:
                     self.timer_states[user_id] = TimerState(
                         task_id=None,
                         session_type='work',
-                        time_remaining=user_settings[preset_type]['work_duration'] * 60,
+                        time_remaining=0,
                         user_settings=user_settings,
                         preset_type=preset_type
                     )
-                    # Set round number to 1
-                    self.timer_states[user_id].round_number = 1
-                    # Pause the timer
-                    self.timer_states[user_id].is_paused = True
+                    self.timer_states[user_id].load_session('work')
+                    # New timer states start paused at round 1
+                    self.mark_changed(user_id)
                     return
             except Exception as e:
                 logger.error(f"Error creating default timer state: {str(e)}")
                 # Create a timer state with default settings
-                default_settings = {
-                    "short": {
-                        "work_duration": 25,
-                        "short_break": 5,
-                        "long_break": 15,
-                        "sessions_before_long_break": 4
-                    },
-                    "long": {
-                        "work_duration": 50,
-                        "short_break": 10,
-                        "long_break": 30,
-                        "sessions_before_long_break": 4
-                    }
-                }
-                
                 self.timer_states[user_id] = TimerState(
                     task_id=None,
                     session_type='work',
                     time_remaining=25 * 60,  # 25 minutes in seconds
-                    user_settings=default_settings,
+                    user_settings=DEFAULT_POMODORO_SETTINGS,
                     preset_type='short'
                 )
-                self.timer_states[user_id].is_paused = True
+                self.mark_changed(user_id)
         else:
             # Reset existing timer state
             state = self.timer_states[user_id]
             # Reset round number
             state.round_number = 1
-            # Reset to work session
-            state.session_type = 'work'
-            # Reset timer duration based on preset
-            state.time_remaining = state.settings[state.preset_type]['work_duration'] * 60
-            # Update timestamp and pause the timer
-            state.last_update = datetime.now(timezone.utc)
-            state.is_paused = True
+            # Reset to a paused work session based on preset
+            state.load_session('work')
+            self.mark_changed(user_id)
 
     async def handle_session_completion(self, user_id: str):
         """Handle the completion of a timer session"""
@@ -249,59 +551,50 @@ class ConnectionManager:
             return
 
         state = self.timer_states[user_id]
-        current_session = state.session_type
-
-        # Update task completion if it was a work session and task_id is not None
-        if current_session == 'work' and state.task_id is not None:
-            try:
-                task_id = state.task_id
-                # Get current completed pomodoros
-                task_response = supabase.table("tasks").select("completed_pomodoros").eq("id", task_id).execute()
-                if task_response.data and len(task_response.data) > 0:
-                    current_count = task_response.data[0]["completed_pomodoros"] or 0
-                    # Update completed pomodoros
-                    supabase.table("tasks").update({"completed_pomodoros": current_count + 1}).eq("id", task_id).execute()
-            except Exception as e:
-                logger.error(f"Error updating task completion: {str(e)}")
 
         # Update state to reflect completion
         state.time_remaining = 0
         
+        # Record the finished session; it is written with the next write-behind batch
+        self.write_behind.add_session(self._session_row(user_id, state))
+
         # Automatically transition to the next session
-        self.skip_to_next(user_id)
+        # (skip_to_next records the completed pomodoro for work sessions)
+        await self.skip_to_next(user_id)
+
+    async def sync_timer_state(self, user_id: str, websocket: Optional[WebSocket] = None):
+        """Send current timer state to the user's connections
 
-    async def sync_timer_state(self, user_id: str):
-        """Send current timer state to all user's connections"""
+        With a websocket given (a sync_request reply or a new connection) only
+        that connection gets the state. Otherwise poll-mode connections always
+        get it and push-mode connections only get versions they haven't seen.
+        """
         if user_id not in self.timer_states:
             return
 
         state = self.timer_states[user_id]
         
-        # Don't modify the actual state, just calculate the current time
-        current_time = datetime.now(timezone.utc)
-        remaining_time = state.time_remaining
+        # Don't modify the actual state, just calculate the remaining time
+        remaining_time = state.seconds_until_deadline()
         
-        # Only calculate elapsed time if timer is running
-        if not state.is_paused:
-            elapsed = (current_time - state.last_update).total_seconds()
-            remaining_time = max(0, state.time_remaining - elapsed)
-            
+        # Only check for completion if timer is running here (the owning worker completes replicas)
+        if not state.is_paused and user_id not in self.replicas:
             # Check if timer just completed
-            if remaining_time == 0 and state.time_remaining > 0:
-                # Handle completion without modifying the state
+            if remaining_time == 0:
+                # Transition to the next session and broadcast the new state
                 await self.handle_session_completion(user_id)
-                return
+                remaining_time = state.time_remaining
+            else:
+                self._schedule_completion(user_id)
 
-        # Get updated task information
-        task_info = None
-        if state.task_id:
-            try:
-                task_response = supabase.table("tasks").select("id, title, completed_pomodoros, estimated_pomodoros").eq("id", state.task_id).execute()
-                if task_response.data and len(task_response.data) > 0:
-                    task_info = task_response.data[0]
-            except Exception as e:
-                logger.error(f"Error fetching task info: {str(e)}")
+        recipients = self._sync_recipients(user_id, state, websocket)
+        if not recipients:
+            return
 
+        # Get task information (cached; invalidated by the task routes)
+        task_info = await self._get_task_summary(state.task_id) if state.task_id else None
+
+        server_time = time.time()
         message = {
             "type": "timer_sync",
             "data": {
@@ -311,43 +604,197 @@ class ConnectionManager:
                 "is_paused": state.is_paused,
                 "round_number": state.round_number,
                 "active_task": task_info,
-                "preset_type": state.preset_type
+                "preset_type": state.preset_type,
+                # Absolute deadline lets clients count down locally between pushes
+                "deadline": None if state.is_paused else server_time + remaining_time,
+                "server_time": server_time,
+                "state_version": state.state_version
             },
         }
-        await self.broadcast_to_user(user_id, message)
+        await self._send_to_connections(user_id, recipients, message)
+        for connection in recipients:
+            if connection in self.connection_protocols:
+                self.pushed_versions[connection] = state.state_version
+
+    def _sync_recipients(self, user_id: str, state: TimerState, websocket: Optional[WebSocket] = None) -> List[WebSocket]:
+        """Pick the connections that need the current timer state"""
+        if websocket is not None:
+            return [websocket]
+        recipients = []
+        for connection in self.active_connections.get(user_id, ()):
+            if (self.connection_protocols.get(connection) == PROTOCOL_PUSH
+                    and self.pushed_versions.get(connection) == state.state_version):
+                continue
+            recipients.append(connection)
+        return recipients
+
+    async def _get_task_summary(self, task_id: int) -> Optional[dict]:
+        """Get the summary of a task, from the cache when possible"""
+        task_info = self.task_cache.get(task_id)
+        if task_info is None:
+            try:
+                task = await timer_repository.fetch_task_summary(task_id)
+                if task:
+                    task_info = self.task_cache.put(task_id, task)
+            except Exception as e:
+                logger.error(f"Error fetching task info: {str(e)}")
+        return task_info
+
+    async def load_user_settings(self, user_id: str) -> Optional[schemas.UserSettings]:
+        """Get the user's pomodoro settings, from the settings cache when possible"""
+        user_settings = settings_cache.get(user_id)
+        if user_settings is None:
+            pomodoro_settings = await timer_repository.fetch_pomodoro_settings(user_id)
+            if pomodoro_settings:
+                user_settings = settings_cache.put(user_id, pomodoro_settings)
+        return user_settings
+
+    def _record_pomodoro(self, task_id: int):
+        """Queue a completed pomodoro and show it in the cached summary right away"""
+        self.write_behind.add_increment(task_id)
+        summary = self.task_cache.get(task_id)
+        if summary is not None:
+            self.task_cache.update(task_id, completed_pomodoros=(summary["completed_pomodoros"] or 0) + 1)
+
+    def _on_counts_flushed(self, counts: Dict[int, int]):
+        """Replace optimistic counts with the written ones, plus anything queued since"""
+        for task_id, count in counts.items():
+            self.task_cache.update(task_id, completed_pomodoros=count + self.write_behind.pending_increment(task_id))
+
+    def _session_row(self, user_id: str, state: TimerState) -> dict:
+        """pomodoro_sessions row for the session that just finished"""
+        end_time = datetime.now(timezone.utc)
+        return {
+            "user_id": user_id,
+            "task_id": state.task_id,
+            "session_type": state.session_type,
+            "start_time": (end_time - timedelta(seconds=state.duration_for(state.session_type))).isoformat(),
+            "end_time": end_time.isoformat(),
+            "completed": True,
+            "current_session_number": state.round_number,
+        }
+
+    def invalidate_task(self, task_id: int):
+        """Forget the cached summary of a task that was changed or deleted"""
+        self.task_cache.invalidate(task_id)
 
     def refresh_user_settings(self, user_id: str, user_settings: dict):
         """Update user settings in timer state"""
         if user_id in self.timer_states:
-            self.timer_states[user_id].settings = user_settings
-            # Update remaining time based on current session type and preset
             state = self.timer_states[user_id]
+            state.apply_settings(user_settings)
+            # Update remaining time based on current session type and preset
             if state.is_paused:  # Only update time if timer is paused
-                current_session = state.session_type
-                current_preset = state.preset_type
-                if current_session == 'work':
-                    state.time_remaining = state.settings[current_preset]['work_duration'] * 60
-                elif current_session == 'short_break':
-                    state.time_remaining = state.settings[current_preset]['short_break'] * 60
-                else:  # long_break
-                    state.time_remaining = state.settings[current_preset]['long_break'] * 60
+                state.time_remaining = state.duration_for(state.session_type)
+            self.mark_changed(user_id)
 
     async def broadcast_to_user(self, user_id: str, message: dict):
-        """Send message to all user's connections"""
+        """Send message to all user's connections, on this and the other workers"""
         if user_id in self.active_connections:
-            dead_connections = set()
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    logger.error(f"Error broadcasting to user: {str(e)}")
-                    dead_connections.add(connection)
-
-            # Clean up dead connections
-            for dead in dead_connections:
-                try:
-                    await self.disconnect(dead, user_id)
-                except Exception as e:
-                    logger.error(f"Error during cleanup: {str(e)}")
+            await self._send_to_connections(user_id, list(self.active_connections[user_id]), message)
+        self.bus.publish({"origin": self.worker_id, "kind": KIND_BROADCAST, "user_id": user_id, "data": message})
+
+    async def _send_to_connections(self, user_id: str, connections: List[WebSocket], message: dict):
+        """Encode a message once per encoding and queue it on each connection's outbox; the writer tasks do the sending"""
+        if not connections:
+            return
+        started = time.perf_counter()
+        frames: Dict[str, ws_encoding.Frame] = {}  # Shared by all of the user's devices with the same encoding
+        delivered = True
+        for connection in connections:
+            outbox = self.outboxes.get(connection)
+            if outbox is None:  # Not `or`: an outbox with nothing queued is falsy
+                outbox = self._open_outbox(connection, user_id)
+            frame = frames.get(outbox.encoding)
+            if frame is None:
+                frame = frames[outbox.encoding] = ws_encoding.encode(outbox.encoding, message)
+            delivered = outbox.put(message, frame) and delivered
+        self.broadcast_stats.record(time.perf_counter() - started, error=not delivered)
+
+    def _open_outbox(self, websocket: WebSocket, user_id: str) -> ConnectionOutbox:
+        async def on_dead(reason: str):
+            await self._drop_connection(websocket, user_id, reason)
+
+        outbox = ConnectionOutbox(
+            websocket,
+            on_dead,
+            maxsize=self.outbox_size,
+            send_timeout=self.send_timeout,
+            send_stats=self.send_stats,
+            encoding=self.connection_encodings.get(websocket, ws_encoding.ENCODING_JSON),
+        )
+        self.outboxes[websocket] = outbox
+        return outbox
+
+    def _send_pings(self, connections: List[WebSocket]):
+        """Queue a heartbeat ping on each connection, encoded once per encoding"""
+        frames: Dict[str, ws_encoding.Frame] = {}
+        for connection in connections:
+            outbox = self.outboxes.get(connection)
+            if outbox is None:
+                continue
+            frame = frames.get(outbox.encoding)
+            if frame is None:
+                frame = frames[outbox.encoding] = ws_encoding.encode(outbox.encoding, PING_MESSAGE)
+            outbox.put(PING_MESSAGE, frame)
+
+    async def _reap_connections(self, dead: List[tuple]):
+        """Close connections that stopped answering heartbeats"""
+        await asyncio.gather(
+            *(self._drop_connection(websocket, user_id, DEAD_HEARTBEAT) for websocket, user_id in dead),
+            return_exceptions=True,
+        )
+
+    async def _drop_connection(self, websocket: WebSocket, user_id: str, reason: str):
+        """Close and forget a connection whose outbox or heartbeat gave up on it"""
+        if reason == DEAD_TIMEOUT:
+            self.send_timeouts += 1
+        elif reason == DEAD_OVERFLOW:
+            self.outbox_overflows += 1
+        try:
+            await self.disconnect(websocket, user_id)
+        except Exception as e:
+            logger.error(f"Error during cleanup: {str(e)}")
+        if reason != DEAD_ERROR:
+            try:
+                await asyncio.wait_for(websocket.close(code=1013 if reason == DEAD_OVERFLOW else 1011), self.send_timeout)
+            except Exception:
+                pass
+
+    def get_metrics(self) -> dict:
+        """Connection, timer and broadcast counters for the metrics endpoint"""
+        return {
+            "users_connected": len(self.active_connections),
+            "connections": sum(len(connections) for connections in self.active_connections.values()),
+            "timers": len(self.timer_states),
+            "evicted_timers": len(self.evicted),
+            "evictions": self.evictions,
+            "rehydrations": self.rehydrations,
+            "scheduled_timers": len(self.scheduler),
+            "task_cache": self.task_cache.get_stats(),
+            "broadcast": self.broadcast_stats.as_dict(),
+            "send": self.send_stats.as_dict(),
+            "send_timeouts": self.send_timeouts,
+            "write_behind": self.write_behind.get_stats(),
+            "snapshots": self.snapshots.get_stats() if self.snapshots is not None else None,
+            "bus": self.bus.get_stats(),
+            "replicas": len(self.replicas),
+            "shards": {
+                "count": self.timer_states.shard_count,
+                "max_timers": max(self.timer_states.shard_sizes()),
+            },
+            "locked_users": self.user_locks.locked_count(),
+            "connections_by_encoding": self._count_encodings(),
+            "heartbeat": self.heartbeat.get_stats(),
+            "outbox_overflows": self.outbox_overflows,
+            "queued_messages": sum(len(outbox) for outbox in self.outboxes.values()),
+            "coalesced_syncs": sum(outbox.coalesced for outbox in self.outboxes.values()),
+        }
+
+    def _count_encodings(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for encoding in self.connection_encodings.values():
+            counts[encoding] = counts.get(encoding, 0) + 1
+        return counts
 
 manager = ConnectionManager()
\ No newline at end of file
@@ -0,0 +1,125 @@
+# app/ws_outbox.py
+"""
+Bounded outbound queue and writer task for a single WebSocket.
+
+Broadcasts only enqueue, so a slow device never holds up the sender or the
+user's other devices. timer_sync messages are coalesced: a connection has at
+most one pending sync and a newer one replaces it, so a lagging client gets
+the latest state instead of a backlog. Every other message is delivered in
+order; if those pile up past maxsize the connection is given up on and the
+client is expected to reconnect and resync.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Tuple
+
+from fastapi import WebSocket
+
+from . import ws_encoding
+from .metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+# Message types where only the newest pending one matters
+COALESCED_TYPES = frozenset({"timer_sync"})
+
+# Reasons passed to on_dead
+DEAD_TIMEOUT = "timeout"
+DEAD_ERROR = "error"
+DEAD_OVERFLOW = "overflow"
+
+
+class ConnectionOutbox:
+    def __init__(
+        self,
+        websocket: WebSocket,
+        on_dead: Callable[[str], Awaitable[None]],
+        maxsize: int = 64,
+        send_timeout: float = 5.0,
+        send_stats: Optional[LatencyStats] = None,
+        encoding: str = ws_encoding.ENCODING_JSON,
+    ):
+        self.websocket = websocket
+        self.encoding = encoding
+        self.maxsize = maxsize
+        self.send_timeout = send_timeout
+        self.send_stats = send_stats if send_stats is not None else LatencyStats()
+        self.coalesced = 0
+        self.closed = False
+        self._on_dead = on_dead
+        self._queue: Deque[Tuple[Optional[str], ws_encoding.Frame]] = deque()  # (message type, encoded frame)
+        self._pending_sync: Optional[Tuple[Optional[str], ws_encoding.Frame]] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def put(self, message: dict, frame: Optional[ws_encoding.Frame] = None) -> bool:
+        """Queue a message for sending; False if the connection is closed or overflowed
+
+        frame is the message already in this connection's encoding, so a
+        broadcast can encode once per encoding and share the frame between
+        all of the user's connections.
+        """
+        if self.closed:
+            return False
+        entry = (message.get("type"), frame if frame is not None else ws_encoding.encode(self.encoding, message))
+        if entry[0] in COALESCED_TYPES:
+            if self._pending_sync is not None:
+                # Drop the stale sync and queue the new one behind any ordered events
+                self._queue.remove(self._pending_sync)
+                self.coalesced += 1
+            self._pending_sync = entry
+        elif len(self._queue) >= self.maxsize:
+            logger.warning(f"WebSocket outbox full ({self.maxsize} messages), dropping slow connection")
+            self._fail(DEAD_OVERFLOW)
+            return False
+        self._queue.append(entry)
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        return True
+
+    def close(self):
+        """Stop the writer; queued messages are discarded"""
+        self.closed = True
+        self._queue.clear()
+        self._pending_sync = None
+        self._wakeup.set()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    def _fail(self, reason: str):
+        if not self.closed:
+            self.close()
+            asyncio.ensure_future(self._on_dead(reason))
+
+    async def _run(self):
+        while not self.closed:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            entry = self._queue.popleft()
+            if entry is self._pending_sync:
+                self._pending_sync = None
+
+            frame = entry[1]
+            send = self.websocket.send_bytes if isinstance(frame, bytes) else self.websocket.send_text
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(send(frame), self.send_timeout)
+            except asyncio.TimeoutError:
+                self.send_stats.record(time.perf_counter() - started, error=True)
+                logger.warning(f"WebSocket send timed out after {self.send_timeout}s, dropping connection")
+                self._fail(DEAD_TIMEOUT)
+                return
+            except Exception as e:
+                self.send_stats.record(time.perf_counter() - started, error=True)
+                logger.error(f"Error sending to WebSocket: {str(e)}")
+                self._fail(DEAD_ERROR)
+                return
+            self.send_stats.record(time.perf_counter() - started)
@@ -0,0 +1,76 @@
+# benchmarks/ws_encoding_benchmark.py
+"""
+Frame size and encode cost of WebSocket messages in each available encoding.
+
+Run from the backend directory:
+
+    python -m benchmarks.ws_encoding_benchmark [--iterations N]
+"""
+import argparse
+import time
+import timeit
+
+from app import ws_encoding
+from app.timer_state import DEFAULT_POMODORO_SETTINGS
+
+
+def sample_messages() -> dict:
+    """One of each message the server sends, shaped like production traffic"""
+    server_time = time.time()
+    return {
+        "timer_sync": {
+            "type": "timer_sync",
+            "data": {
+                "task_id": 1234,
+                "session_type": "work",
+                "remaining_time": 1312,
+                "is_paused": False,
+                "round_number": 3,
+                "active_task": {"id": 1234, "title": "Write quarterly report", "completed_pomodoros": 2, "estimated_pomodoros": 4},
+                "preset_type": "short",
+                "deadline": server_time + 1312,
+                "server_time": server_time,
+                "state_version": 48213,
+            },
+        },
+        "timer_sync (paused, no task)": {
+            "type": "timer_sync",
+            "data": {
+                "task_id": None,
+                "session_type": "short_break",
+                "remaining_time": 300,
+                "is_paused": True,
+                "round_number": 1,
+                "active_task": None,
+                "preset_type": "short",
+                "deadline": None,
+                "server_time": server_time,
+                "state_version": 7,
+            },
+        },
+        "settings_updated": {"type": "settings_updated", "data": {"settings": DEFAULT_POMODORO_SETTINGS}},
+        "task_order_updated": {"type": "task_order_updated", "data": {"task_ids": list(range(1000, 1020))}},
+        "timer_stopped": {"type": "timer_stopped"},
+        "rounds_reset": {"type": "rounds_reset"},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+
+    encodings = list(ws_encoding.ENCODERS)
+    print(f"Encodings: {', '.join(encodings)} ({args.iterations} encodes each)\n")
+    print(f"{'message':<30}{'encoding':<10}{'bytes':>8}{'vs json':>10}{'us/encode':>12}")
+    for name, message in sample_messages().items():
+        json_size = len(ws_encoding.encode(ws_encoding.ENCODING_JSON, message).encode("utf-8"))
+        for encoding in encodings:
+            frame = ws_encoding.encode(encoding, message)
+            size = len(frame) if isinstance(frame, bytes) else len(frame.encode("utf-8"))
+            seconds = timeit.timeit(lambda: ws_encoding.encode(encoding, message), number=args.iterations)
+            print(f"{name:<30}{encoding:<10}{size:>8}{size / json_size:>10.0%}{seconds / args.iterations * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
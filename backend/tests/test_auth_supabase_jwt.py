@@ -0,0 +1,102 @@
+import time
+import jwt
+import pytest
+from fastapi import HTTPException
+from app import auth_supabase
+
+SECRET = "test-jwt-secret-with-at-least-32-bytes"
+
+def make_token(**overrides):
+    claims = {
+        "sub": "7d5c1f1e-0000-4000-8000-000000000001",
+        "email": "ada@example.com",
+        "aud": "authenticated",
+        "exp": int(time.time()) + 3600,
+        "user_metadata": {"username": "ada"},
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, SECRET, algorithm="HS256")
+
+@pytest.fixture
+def local_secret(monkeypatch):
+    monkeypatch.setattr(auth_supabase, "SUPABASE_JWT_SECRET", SECRET)
+
+    async def fetch_auth_user(token):
+        raise AssertionError("network validation should not be used")
+
+    monkeypatch.setattr(auth_supabase, "_fetch_auth_user", fetch_auth_user)
+
+@pytest.mark.asyncio
+async def test_valid_token_is_verified_locally(local_secret):
+    """Test that a signed token is accepted without calling Supabase Auth"""
+    user = await auth_supabase.verify_token(make_token())
+    assert user == {
+        "id": "7d5c1f1e-0000-4000-8000-000000000001",
+        "email": "ada@example.com",
+        "user_metadata": {"username": "ada"},
+    }
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("token", [
+    make_token(exp=int(time.time()) - 3600),
+    make_token(aud="anon"),
+    jwt.encode({"sub": "x", "aud": "authenticated", "exp": int(time.time()) + 60}, "another-secret-with-at-least-32-bytes", algorithm="HS256"),
+    "not-a-jwt",
+])
+async def test_bad_tokens_are_rejected(local_secret, token):
+    """Test that expired, wrong-audience, forged and malformed tokens get a 401"""
+    with pytest.raises(HTTPException) as exc:
+        await auth_supabase.verify_token(token)
+    assert exc.value.status_code == 401
+
+@pytest.mark.asyncio
+async def test_revocation_check_uses_supabase_auth(local_secret, monkeypatch):
+    """Test that sensitive paths still ask Supabase Auth after the local check"""
+    calls = []
+
+    async def fetch_auth_user(token):
+        calls.append(token)
+        return {"id": "from-auth", "email": "ada@example.com", "user_metadata": {}}
+
+    monkeypatch.setattr(auth_supabase, "_fetch_auth_user", fetch_auth_user)
+    token = make_token()
+    user = await auth_supabase.get_current_user_verified(token)
+    assert user.id == "from-auth"
+    assert calls == [token]
+
+@pytest.mark.asyncio
+async def test_unknown_key_ids_dont_refetch_the_jwks(monkeypatch):
+    """Test that the JWKS is fetched once per interval, however many unknown key ids arrive"""
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+    jwk.update({"kid": "current", "alg": "RS256", "use": "sig"})
+
+    class FakeJWKSClient:
+        fetches = 0
+
+        def get_jwk_set(self, refresh=False):
+            self.fetches += 1
+            return jwt.PyJWKSet.from_dict({"keys": [jwk]})
+
+    client = FakeJWKSClient()
+    monkeypatch.setattr(auth_supabase, "_jwks_client", client)
+    monkeypatch.setattr(auth_supabase, "_signing_keys", {})
+    monkeypatch.setattr(auth_supabase, "_jwks_fetched_at", None)
+
+    claims = {"sub": "user", "aud": "authenticated", "exp": int(time.time()) + 3600}
+    good = jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": "current"})
+    assert (await auth_supabase.decode_token(good))["sub"] == "user"
+
+    for i in range(20):
+        forged = jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": f"unknown-{i}"})
+        with pytest.raises(jwt.InvalidTokenError):
+            await auth_supabase.decode_token(forged)
+    assert client.fetches == 1
+    assert set(auth_supabase._signing_keys) == {"current"}
+
+    # Once the interval has passed an unknown key id may refresh the set again
+    monkeypatch.setattr(auth_supabase, "_jwks_fetched_at", time.monotonic() - auth_supabase.JWKS_REFRESH_SECONDS)
+    with pytest.raises(jwt.InvalidTokenError):
+        await auth_supabase.decode_token(forged)
+    assert client.fetches == 2
@@ -0,0 +1,122 @@
+import asyncio
+import json
+from app.ws_manager_supabase import ConnectionManager
+from app.ws_outbox import ConnectionOutbox
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.sent = []
+        self.closed = False
+
+    async def send_text(self, text):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("connection lost")
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed = True
+
+def test_slow_socket_does_not_block_others():
+    """Test that a stalled socket times out and is dropped without delaying the rest"""
+    async def run():
+        manager = ConnectionManager()
+        manager.send_timeout = 0.05
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=1)
+        manager.active_connections["user"] = {fast, slow}
+        await manager.broadcast_to_user("user", {"type": "ping"})
+        await asyncio.sleep(0.2)
+        return manager, fast, slow
+
+    manager, fast, slow = asyncio.run(run())
+    assert fast.sent == [{"type": "ping"}]
+    assert slow.closed
+    assert manager.active_connections["user"] == {fast}
+    metrics = manager.get_metrics()
+    assert metrics["send_timeouts"] == 1
+    assert metrics["broadcast"]["count"] == 1
+
+def test_failed_socket_is_disconnected():
+    """Test that a socket raising on send is removed"""
+    async def run():
+        manager = ConnectionManager()
+        ok, broken = FakeWebSocket(), FakeWebSocket(fail=True)
+        manager.active_connections["user"] = {ok, broken}
+        await manager.broadcast_to_user("user", {"type": "ping"})
+        await asyncio.sleep(0.05)
+        return manager, ok
+
+    manager, ok = asyncio.run(run())
+    assert manager.active_connections["user"] == {ok}
+    assert manager.get_metrics()["send"]["errors"] == 1
+
+def test_idle_socket_keeps_one_outbox():
+    """Test that broadcasts to a socket whose outbox has drained reuse it instead of opening another writer"""
+    async def run():
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        manager.active_connections["user"] = {websocket}
+        for i in range(5):
+            await manager.broadcast_to_user("user", {"type": "ping", "i": i})
+            await asyncio.sleep(0.01)  # Let the writer empty the queue
+        writers = [
+            task for task in asyncio.all_tasks()
+            if getattr(task.get_coro(), "__qualname__", "") == "ConnectionOutbox._run"
+        ]
+        outboxes = list(manager.outboxes.values())
+        await manager.disconnect(websocket, "user")
+        await asyncio.sleep(0.01)
+        return websocket, outboxes, writers
+
+    websocket, outboxes, writers = asyncio.run(run())
+    assert len(outboxes) == 1
+    assert len(writers) == 1
+    assert all(writer.done() for writer in writers)
+    assert [message["i"] for message in websocket.sent] == [0, 1, 2, 3, 4]
+
+def test_outbox_coalesces_timer_sync():
+    """Test that a lagging connection only gets the newest timer_sync, after ordered events"""
+    async def run():
+        websocket = FakeWebSocket(delay=0.01)
+
+        async def on_dead(reason):
+            pass
+
+        outbox = ConnectionOutbox(websocket, on_dead)
+        outbox.put({"type": "timer_sync", "data": 1})
+        await asyncio.sleep(0)  # writer takes the first sync
+        outbox.put({"type": "timer_sync", "data": 2})
+        outbox.put({"type": "timer_stopped"})
+        outbox.put({"type": "timer_sync", "data": 3})
+        outbox.put({"type": "rounds_reset"})
+        await asyncio.sleep(0.1)
+        return websocket, outbox
+
+    websocket, outbox = asyncio.run(run())
+    assert websocket.sent == [
+        {"type": "timer_sync", "data": 1},
+        {"type": "timer_stopped"},
+        {"type": "timer_sync", "data": 3},
+        {"type": "rounds_reset"},
+    ]
+    assert outbox.coalesced == 1
+
+def test_outbox_overflow_drops_connection():
+    """Test that too many undelivered ordered events give up on the connection"""
+    async def run():
+        reasons = []
+
+        async def on_dead(reason):
+            reasons.append(reason)
+
+        outbox = ConnectionOutbox(FakeWebSocket(delay=1), on_dead, maxsize=2)
+        results = [outbox.put({"type": "rounds_reset"}) for _ in range(3)]
+        await asyncio.sleep(0)
+        return outbox, results, reasons
+
+    outbox, results, reasons = asyncio.run(run())
+    assert results == [True, True, False]
+    assert outbox.closed
+    assert reasons == ["overflow"]
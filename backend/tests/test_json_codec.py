@@ -0,0 +1,23 @@
+import json
+import uuid
+from datetime import datetime
+from app import json_codec
+
+def test_dumps_is_compact_and_round_trips():
+    """Test that encoded frames decode back to the original message"""
+    message = {"type": "timer_sync", "data": {"remaining_time": 1500, "is_paused": False, "deadline": None}}
+    frame = json_codec.dumps(message)
+    assert " " not in frame
+    assert json.loads(frame) == message
+
+def test_dumps_handles_datetimes_and_uuids():
+    """Test that values from database rows encode the same with either backend"""
+    user_id = uuid.uuid4()
+    created = datetime(2024, 1, 2, 3, 4, 5)
+    decoded = json.loads(json_codec.dumps({"id": user_id, "created_at": created}))
+    assert decoded == {"id": str(user_id), "created_at": "2024-01-02T03:04:05"}
+
+def test_response_renders_with_shared_encoder():
+    """Test that the default response class uses the shared encoder"""
+    response = json_codec.FastJSONResponse({"status": "ok"})
+    assert response.body == json_codec.dumps_bytes({"status": "ok"})
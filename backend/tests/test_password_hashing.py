@@ -0,0 +1,30 @@
+import pytest
+from fastapi import HTTPException
+from app.password_hashing import PasswordHasher, hash_password
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_run_on_the_pool():
+    """Test that hashes made on the pool verify, and a changed cost asks for a rehash"""
+    hasher = PasswordHasher(workers=1, max_queue=4, rounds=4)
+    try:
+        hashed = await hasher.hash("correct horse")
+        assert hashed.startswith("$2b$04$")
+        assert await hasher.verify("correct horse", hashed) == (True, False)
+        assert await hasher.verify("wrong", hashed) == (False, False)
+        assert await hasher.verify("correct horse", hash_password("correct horse", 5)) == (True, True)
+        assert hasher.get_stats()["hash"]["count"] == 4
+    finally:
+        hasher.shutdown()
+
+@pytest.mark.asyncio
+async def test_overload_is_rejected_with_503():
+    """Test that work beyond the running and queued limit is turned away without touching the pool"""
+    hasher = PasswordHasher(workers=1, max_queue=1, rounds=4)
+    hasher._pending = 2  # One hashing, one waiting
+
+    with pytest.raises(HTTPException) as exc:
+        await hasher.hash("password")
+    assert exc.value.status_code == 503
+    assert exc.value.headers == {"Retry-After": "1"}
+    assert hasher.rejected == 1
+    assert hasher._executor is None
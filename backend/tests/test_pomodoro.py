@@ -16,7 +16,7 @@ class MockWebSocket:
     async def receive_json(self):
         return {"type": "test_message"}
 
-    async def accept(self):
+    async def accept(self, subprotocol=None):
         pass
 
 def test_websocket_connection(client, test_user, test_user_token):
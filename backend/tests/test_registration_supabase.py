@@ -0,0 +1,34 @@
+import pytest
+from fastapi import HTTPException
+from supabase_auth.errors import AuthApiError
+from app import auth_supabase
+from app.routers import users_supabase
+from app.schemas import UserCreate
+
+class FakeAdmin:
+    def __init__(self):
+        self.calls = []
+
+    def list_users(self, *args, **kwargs):
+        raise AssertionError("registration must not page through auth users")
+
+    def create_user(self, attributes):
+        self.calls.append(attributes["email"])
+        raise AuthApiError("A user with this email address has already been registered", 422, "email_exists")
+
+class FakeSupabase:
+    def __init__(self):
+        self.auth = type("Auth", (), {"admin": FakeAdmin()})()
+
+@pytest.mark.asyncio
+async def test_duplicate_email_maps_to_400(monkeypatch):
+    """Test that Supabase Auth's unique-email error becomes "Email already registered" without a pre-check"""
+    fake = FakeSupabase()
+    monkeypatch.setattr(auth_supabase, "supabase", fake)
+    monkeypatch.setattr(users_supabase, "supabase", fake)
+
+    with pytest.raises(HTTPException) as exc:
+        await users_supabase.register_user(UserCreate(email="ada@example.com", username="ada", password="secret123"))
+    assert exc.value.status_code == 400
+    assert exc.value.detail == "Email already registered"
+    assert fake.auth.admin.calls == ["ada@example.com"]
@@ -0,0 +1,43 @@
+import pytest
+from app import timer_repository
+from app.routers import pomodoro_session_supabase
+
+class FakeQuery:
+    def __init__(self, data):
+        self.data = data
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return self
+
+class FakeSupabase:
+    def table(self, name):
+        return FakeQuery([{"id": 1, "task_id": 7, "session_type": "work"}])
+
+class FakeUser:
+    id = "user-1"
+
+@pytest.mark.asyncio
+async def test_completion_keeps_queued_increments_in_cached_count(monkeypatch):
+    """Test that the cached count includes increments the write-behind queue hasn't written yet"""
+    manager = pomodoro_session_supabase.manager
+
+    async def increment_completed_pomodoros(task_id):
+        return 5
+
+    async def flush(increments, sessions, checkpoints):
+        return {}
+
+    monkeypatch.setattr(pomodoro_session_supabase, "supabase", FakeSupabase())
+    monkeypatch.setattr(timer_repository, "increment_completed_pomodoros", increment_completed_pomodoros)
+    monkeypatch.setattr(manager.write_behind, "_flush_fn", flush)
+    manager.task_cache.put(7, {"id": 7, "title": "Task", "completed_pomodoros": 6, "estimated_pomodoros": 8})
+    manager.write_behind.add_increment(7, 2)
+
+    await pomodoro_session_supabase.complete_pomodoro_session(1, current_user=FakeUser())
+
+    assert manager.task_cache.get(7)["completed_pomodoros"] == 7
+    await manager.write_behind.stop()
+    manager.task_cache.invalidate(7)
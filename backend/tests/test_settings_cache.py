@@ -0,0 +1,39 @@
+import pytest
+import time
+from app import schemas
+from app.settings_cache import SettingsCache
+from app.timer_state import DEFAULT_POMODORO_SETTINGS
+
+def test_put_validates_settings():
+    """Test that raw settings dicts are stored as UserSettings models"""
+    cache = SettingsCache(ttl=60)
+    settings = cache.put("user-1", DEFAULT_POMODORO_SETTINGS)
+    assert isinstance(settings, schemas.UserSettings)
+    assert cache.get("user-1") is settings
+    assert settings.short.work_duration == 25
+
+def test_invalid_settings_are_rejected():
+    """Test that malformed settings never reach the cache"""
+    cache = SettingsCache(ttl=60)
+    with pytest.raises(ValueError):
+        cache.put("user-1", {"short": {"work_duration": 25}})
+    assert cache.get("user-1") is None
+
+def test_entries_expire_after_ttl():
+    """Test that entries older than the TTL are dropped"""
+    cache = SettingsCache(ttl=0.01)
+    cache.put("user-1", DEFAULT_POMODORO_SETTINGS)
+    time.sleep(0.02)
+    assert cache.get("user-1") is None
+    assert len(cache) == 0
+
+def test_write_through_replaces_entry():
+    """Test that a settings update replaces the cached value"""
+    cache = SettingsCache(ttl=60)
+    cache.put("user-1", DEFAULT_POMODORO_SETTINGS)
+    updated = schemas.UserSettings.model_validate({
+        **DEFAULT_POMODORO_SETTINGS,
+        "short": {**DEFAULT_POMODORO_SETTINGS["short"], "work_duration": 30}
+    })
+    cache.put("user-1", updated)
+    assert cache.get("user-1").short.work_duration == 30
@@ -0,0 +1,31 @@
+import pytest
+import asyncio
+from app.sharding import ShardedDict, UserLocks
+
+def test_sharded_dict_behaves_like_dict():
+    """Test that entries spread over shards but read back as one mapping"""
+    timers = ShardedDict(shard_count=8)
+    for i in range(100):
+        timers[f"user-{i}"] = i
+    del timers["user-0"]
+
+    assert len(timers) == 99
+    assert "user-0" not in timers and "user-1" in timers
+    assert timers.get("user-2") == 2
+    assert timers.pop("user-3") == 3
+    assert sorted(timers.values())[:2] == [1, 2]
+    assert sum(timers.shard_sizes()) == 98
+    assert max(timers.shard_sizes()) < 98
+
+@pytest.mark.asyncio
+async def test_user_lock_only_blocks_its_user():
+    """Test that a busy user holds up only their own commands and the lock is dropped after"""
+    locks = UserLocks()
+
+    async with locks.hold("busy-user"):
+        assert locks.locked("busy-user")
+        assert not locks.locked("other-user")
+        async with locks.hold("other-user"):
+            assert locks.locked_count() == 2
+
+    assert len(locks) == 0
@@ -0,0 +1,19 @@
+import jwt
+from app.supabase import SupabaseClientRegistry, SUPPORTS_SHARED_HTTP
+
+SERVICE_KEY = jwt.encode({"role": "service_role"}, "secret-with-at-least-32-bytes-of-key", algorithm="HS256")
+ANON_KEY = jwt.encode({"role": "anon"}, "secret-with-at-least-32-bytes-of-key", algorithm="HS256")
+
+def test_clients_are_reused_over_one_pool():
+    """Test that each client is built once and all of them share the registry's HTTP pool"""
+    registry = SupabaseClientRegistry("http://localhost:54321", SERVICE_KEY, ANON_KEY)
+    service, anon, auth = registry.service(), registry.anon(), registry.auth()
+
+    assert registry.service() is service
+    assert registry.anon() is anon
+    assert registry.auth() is auth
+    if SUPPORTS_SHARED_HTTP:
+        assert service.postgrest.session is registry.http
+        assert anon.postgrest.session is registry.http
+    assert auth._http_client is registry.http
+    registry.close()
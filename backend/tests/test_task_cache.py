@@ -0,0 +1,42 @@
+import pytest
+from app.task_cache import TaskSummaryCache
+
+def _task(task_id, completed=0):
+    return {
+        "id": task_id,
+        "title": f"Task {task_id}",
+        "completed_pomodoros": completed,
+        "estimated_pomodoros": 4,
+        "description": "not part of the summary"
+    }
+
+def test_put_keeps_only_summary_fields():
+    """Test that cached summaries only hold the timer_sync fields"""
+    cache = TaskSummaryCache(maxsize=10)
+    cache.put(1, _task(1))
+    assert cache.get(1) == {"id": 1, "title": "Task 1", "completed_pomodoros": 0, "estimated_pomodoros": 4}
+
+def test_evicts_least_recently_used():
+    """Test that the cache stays within maxsize, dropping the oldest entry"""
+    cache = TaskSummaryCache(maxsize=2)
+    cache.put(1, _task(1))
+    cache.put(2, _task(2))
+    cache.get(1)
+    cache.put(3, _task(3))
+    assert 1 in cache
+    assert 2 not in cache
+    assert len(cache) == 2
+
+def test_update_and_invalidate():
+    """Test that completion updates and router invalidations keep entries coherent"""
+    cache = TaskSummaryCache()
+    first = cache.put(1, _task(1))
+    cache.update(1, completed_pomodoros=1)
+    assert cache.get(1)["completed_pomodoros"] == 1
+    assert first["completed_pomodoros"] == 0
+
+    cache.update(2, completed_pomodoros=5)
+    assert 2 not in cache
+
+    cache.invalidate(1)
+    assert cache.get(1) is None
@@ -0,0 +1,37 @@
+from app.task_positions import POSITION_GAP, position_between, spaced_positions
+
+
+def test_empty_list_starts_one_gap_in():
+    assert position_between(None, None) == POSITION_GAP
+
+
+def test_ends_of_the_list_step_one_gap_out():
+    assert position_between(3 * POSITION_GAP, None) == 4 * POSITION_GAP
+    assert position_between(None, POSITION_GAP) == 0
+
+
+def test_between_neighbours_takes_the_midpoint():
+    assert position_between(1024, 2048) == 1536
+    assert position_between(10, 13) == 11
+
+
+def test_adjacent_neighbours_need_a_rebalance():
+    assert position_between(10, 11) is None
+    assert position_between(10, 12) == 11
+
+
+def test_repeated_moves_into_the_same_gap_run_out_after_log2_gap():
+    before, after = POSITION_GAP, 2 * POSITION_GAP
+    moves = 0
+    while True:
+        position = position_between(before, after)
+        if position is None:
+            break
+        after = position
+        moves += 1
+    assert moves == 10
+
+
+def test_spaced_positions():
+    assert spaced_positions(0) == []
+    assert spaced_positions(3) == [POSITION_GAP, 2 * POSITION_GAP, 3 * POSITION_GAP]
@@ -0,0 +1,140 @@
+import threading
+import pytest
+from fastapi import HTTPException
+from app.routers import tasks_supabase
+from app.schemas import TaskMove, TaskOrder
+from app.task_positions import POSITION_GAP
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+class FakeRpc:
+    def __init__(self, supabase, data):
+        self.supabase = supabase
+        self.data = data
+
+    def execute(self):
+        self.supabase.threads.append(threading.get_ident())
+        return FakeResponse(self.data)
+
+class FakeSupabase:
+    def __init__(self, owned_ids):
+        self.owned_ids = set(owned_ids)
+        self.rpc_calls = []
+        self.threads = []
+
+    def rpc(self, name, params):
+        self.rpc_calls.append((name, params))
+        # reorder_tasks writes nothing unless every ID is the user's
+        if set(params["p_task_ids"]) <= self.owned_ids:
+            return FakeRpc(self, len(params["p_task_ids"]))
+        return FakeRpc(self, 0)
+
+    def table(self, name):
+        raise AssertionError("reordering must not issue per-task requests")
+
+class FakeTable:
+    """tasks table holding {id: position}, answering the move's select and update"""
+    def __init__(self, positions, threads):
+        self.positions = positions
+        self.threads = threads
+        self.filters = {}
+        self.values = None
+
+    def select(self, columns):
+        return self
+
+    def update(self, values):
+        self.values = values
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def in_(self, column, values):
+        self.filters[column] = values
+        return self
+
+    def execute(self):
+        self.threads.append(threading.get_ident())
+        if self.values is None:
+            return FakeResponse([{"id": i, "position": self.positions[i]} for i in self.filters["id"] if i in self.positions])
+        self.positions[self.filters["id"]] = self.values["position"]
+        return FakeResponse([{"id": self.filters["id"], **self.values}])
+
+class FakeManager:
+    def __init__(self):
+        self.broadcasts = []
+
+    async def broadcast_to_user(self, user_id, message):
+        self.broadcasts.append((user_id, message))
+
+class FakeUser:
+    id = "user-1"
+
+@pytest.fixture
+def fakes(monkeypatch):
+    supabase = FakeSupabase(owned_ids=range(1, 501))
+    manager = FakeManager()
+    monkeypatch.setattr(tasks_supabase, "supabase", supabase)
+    monkeypatch.setattr(tasks_supabase, "manager", manager)
+    return supabase, manager
+
+@pytest.mark.asyncio
+async def test_reorder_is_one_rpc(fakes):
+    """Test that a 500-task reorder is a single reorder_tasks call with spaced positions"""
+    supabase, manager = fakes
+    task_ids = list(range(500, 0, -1))
+
+    result = await tasks_supabase.update_tasks_order(TaskOrder(task_ids=task_ids), current_user=FakeUser())
+
+    assert len(supabase.rpc_calls) == 1
+    name, params = supabase.rpc_calls[0]
+    assert name == "reorder_tasks"
+    assert params["p_user_id"] == "user-1"
+    assert params["p_task_ids"] == task_ids
+    assert params["p_positions"][:3] == [POSITION_GAP, 2 * POSITION_GAP, 3 * POSITION_GAP]
+    assert result["data"]["updated_count"] == 500
+    assert manager.broadcasts == [("user-1", {"type": "task_order_updated", "data": {"task_ids": task_ids}})]
+    # The blocking client call ran in the threadpool, not on the event loop
+    assert supabase.threads and threading.get_ident() not in supabase.threads
+
+@pytest.mark.asyncio
+async def test_reorder_rejects_foreign_task(fakes):
+    """Test that an ID the user doesn't own fails the whole reorder"""
+    supabase, manager = fakes
+    with pytest.raises(HTTPException) as exc:
+        await tasks_supabase.update_tasks_order(TaskOrder(task_ids=[1, 999]), current_user=FakeUser())
+    assert exc.value.status_code == 400
+    assert exc.value.detail == "Invalid task IDs"
+    assert manager.broadcasts == []
+
+@pytest.mark.asyncio
+async def test_reorder_rejects_duplicates_without_a_request(fakes):
+    """Test that duplicate IDs are refused before calling Supabase"""
+    supabase, _ = fakes
+    with pytest.raises(HTTPException) as exc:
+        await tasks_supabase.update_tasks_order(TaskOrder(task_ids=[1, 2, 1]), current_user=FakeUser())
+    assert exc.value.status_code == 400
+    assert supabase.rpc_calls == []
+
+def test_order_route_is_not_shadowed_by_task_id():
+    """Test that PUT /tasks/order is matched before PUT /tasks/{task_id}"""
+    paths = [route.path for route in tasks_supabase.router.routes if "PUT" in route.methods]
+    assert paths.index("/tasks/order") < paths.index("/tasks/{task_id}")
+
+@pytest.mark.asyncio
+async def test_move_runs_queries_off_the_loop(fakes, monkeypatch):
+    """Test that a move writes the midpoint position from the threadpool and then broadcasts"""
+    supabase, manager = fakes
+    positions = {1: POSITION_GAP, 2: 2 * POSITION_GAP, 3: 3 * POSITION_GAP}
+    monkeypatch.setattr(supabase, "table", lambda name: FakeTable(positions, supabase.threads))
+
+    result = await tasks_supabase.move_task(3, TaskMove(previous_task_id=1, next_task_id=2), current_user=FakeUser())
+
+    assert result["data"]["position"] == POSITION_GAP + POSITION_GAP // 2
+    assert positions[3] == result["data"]["position"]
+    assert len(supabase.threads) == 2 and threading.get_ident() not in supabase.threads
+    assert manager.broadcasts[0][1]["type"] == "task_moved"
@@ -0,0 +1,231 @@
+import pytest
+import asyncio
+import json
+from app import timer_bus
+from app.timer_bus import InProcessBus, InProcessHub, LocalIPCBus, RedisBus, TimerBus, KIND_STATE
+from app.timer_state import DEFAULT_POMODORO_SETTINGS
+from app.ws_manager_supabase import ConnectionManager
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    def types(self):
+        return [message["type"] for message in self.sent]
+
+class RESPStandIn:
+    """Tiny in-memory server speaking the parts of RESP the RedisBus uses"""
+
+    def __init__(self):
+        self.values = {}
+        self.subscribers = {}
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    @staticmethod
+    def bulk(value):
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    async def handle(self, reader, writer):
+        while True:
+            header = await reader.readline()
+            if not header:
+                break
+            args = []
+            for _ in range(int(header[1:])):
+                length = int((await reader.readline())[1:])
+                args.append((await reader.readexactly(length + 2))[:-2])
+            command = args[0].upper()
+            if command == b"SET":
+                self.values[args[1]] = args[2]
+                writer.write(b"+OK\r\n")
+            elif command == b"GET":
+                writer.write(self.bulk(self.values.get(args[1])))
+            elif command == b"DEL":
+                writer.write(b":%d\r\n" % int(self.values.pop(args[1], None) is not None))
+            elif command == b"SUBSCRIBE":
+                self.subscribers.setdefault(args[1], []).append(writer)
+                writer.write(b"*3\r\n" + self.bulk(b"subscribe") + self.bulk(args[1]) + b":1\r\n")
+            elif command == b"PUBLISH":
+                receivers = self.subscribers.get(args[1], [])
+                for subscriber in receivers:
+                    subscriber.write(b"*3\r\n" + self.bulk(b"message") + self.bulk(args[1]) + self.bulk(args[2]))
+                writer.write(b":%d\r\n" % len(receivers))
+
+async def collect(bus):
+    received = []
+
+    async def on_message(envelope):
+        received.append(envelope)
+
+    await bus.start(on_message)
+    return received
+
+async def exchange(first, second):
+    """Publish a state from the first bus and check the second sees and stores it"""
+    received = await collect(second)
+    await collect(first)
+    envelope = {"origin": "a", "kind": KIND_STATE, "user_id": "user", "data": {"round_number": 2}}
+    first.publish(envelope)
+    for _ in range(100):
+        if received:
+            break
+        await asyncio.sleep(0.01)
+    assert received == [envelope]
+    assert await second.get_state("user") == {"round_number": 2}
+
+@pytest.mark.asyncio
+async def test_managers_share_timers_over_bus():
+    """Test that a timer started on one worker reaches the user's devices on another"""
+    hub = InProcessHub()
+    worker_a, worker_b = ConnectionManager(), ConnectionManager()
+    worker_a.bus, worker_b.bus = InProcessBus(hub), InProcessBus(hub)
+    await worker_a.startup()
+    await worker_b.startup()
+    phone, watch = FakeWebSocket(), FakeWebSocket()
+    await worker_a.connect(phone, "user")
+    await worker_b.connect(watch, "user")
+
+    await worker_a.start_timer("user", None, "work", 25 * 60, user_settings=DEFAULT_POMODORO_SETTINGS)
+    await worker_a.sync_timer_state("user")
+    await worker_a.broadcast_to_user("user", {"type": "rounds_reset"})
+    await asyncio.sleep(0.05)
+
+    assert watch.types() == ["timer_sync", "rounds_reset"]
+    assert watch.sent[0]["data"]["state_version"] == phone.sent[0]["data"]["state_version"]
+    assert "user" in worker_b.replicas
+    assert worker_b.scheduler.get_deadline("user") is None
+
+    # A command on the watch's worker takes over the deadline
+    worker_b.pause_timer("user")
+    await asyncio.sleep(0.05)
+    assert worker_a.timer_states["user"].is_paused
+    assert "user" in worker_a.replicas
+
+    for worker in (worker_a, worker_b):
+        await worker.shutdown()
+
+@pytest.mark.asyncio
+async def test_ipc_bus_relays_between_workers(tmp_path):
+    """Test that the unix socket bus delivers envelopes and serves stored states"""
+    path = str(tmp_path / "bus.sock")
+    relay, worker = LocalIPCBus(path), LocalIPCBus(path)
+    await exchange(worker, relay)
+    assert relay.is_relay and not worker.is_relay
+    assert await worker.get_state("user") == {"round_number": 2}
+    await worker.stop()
+    await relay.stop()
+
+@pytest.mark.asyncio
+async def test_redis_bus_against_resp_stand_in():
+    """Test the RESP client against a local stand-in server"""
+    server = RESPStandIn()
+    port = await server.start()
+    url = f"redis://127.0.0.1:{port}/0"
+    first, second = RedisBus(url), RedisBus(url)
+    await exchange(first, second)
+    assert server.values[b"pomodoro:timer:user"] == b'{"round_number":2}'
+
+    first.publish({"origin": "a", "kind": KIND_STATE, "user_id": "user", "data": None})
+    await asyncio.sleep(0.05)
+    assert await second.get_state("user") is None
+    await first.stop()
+    await second.stop()
+    server.server.close()
+
+@pytest.mark.asyncio
+async def test_concurrent_changes_leave_exactly_one_owner():
+    """Test that two workers changing one timer at once agree on a single deadline owner"""
+    hub = InProcessHub()
+    worker_a, worker_b = ConnectionManager(), ConnectionManager()
+    worker_a.bus, worker_b.bus = InProcessBus(hub), InProcessBus(hub)
+    await worker_a.startup()
+    await worker_b.startup()
+    await worker_a.connect(FakeWebSocket(), "user")
+    await worker_b.connect(FakeWebSocket(), "user")
+
+    await worker_a.start_timer("user", None, "work", 25 * 60, user_settings=DEFAULT_POMODORO_SETTINGS)
+    await asyncio.sleep(0.05)
+    assert "user" in worker_b.replicas
+
+    # Both change the timer before either hears about the other's change
+    worker_a.pause_timer("user")
+    worker_a.resume_timer("user")
+    worker_b.pause_timer("user")
+    worker_b.resume_timer("user")
+    await asyncio.sleep(0.05)
+
+    owners = [worker for worker in (worker_a, worker_b) if worker.scheduler.get_deadline("user") is not None]
+    assert len(owners) == 1
+    owner = owners[0]
+    other = worker_b if owner is worker_a else worker_a
+    assert "user" not in owner.replicas
+    assert "user" in other.replicas
+    assert other.timer_states["user"].state_version == owner.timer_states["user"].state_version
+
+    for worker in (worker_a, worker_b):
+        await worker.shutdown()
+
+def test_bus_without_publish_fails_on_construction():
+    """Test that a TimerBus subclass missing methods can't be instantiated"""
+    class Incomplete(TimerBus):
+        async def get_state(self, user_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+@pytest.mark.asyncio
+async def test_ipc_relay_drops_peer_that_stops_reading(tmp_path, monkeypatch):
+    """Test that a peer whose socket buffer never drains is disconnected"""
+    monkeypatch.setattr(timer_bus, "IPC_DRAIN_TIMEOUT_SECONDS", 0.1)
+    path = str(tmp_path / "bus.sock")
+    relay = LocalIPCBus(path)
+    await collect(relay)
+    _, stuck_writer = await asyncio.open_unix_connection(path)  # Never reads
+    for _ in range(100):
+        if relay._peers:
+            break
+        await asyncio.sleep(0.01)
+
+    payload = "x" * 4096
+    for i in range(2000):
+        relay.publish({"origin": "a", "kind": "broadcast", "user_id": "user", "data": {"i": i, "pad": payload}})
+    await asyncio.sleep(0.3)
+
+    assert relay.get_stats()["dropped_connections"] == 1
+    assert not relay._peers
+    stuck_writer.close()
+    await relay.stop()
+
+@pytest.mark.asyncio
+async def test_ipc_states_survive_relay_failover(tmp_path, monkeypatch):
+    """Test that workers hand their states to the relay elected after the old one exits"""
+    monkeypatch.setattr(timer_bus, "RECONNECT_DELAY_SECONDS", 0.01)
+    path = str(tmp_path / "bus.sock")
+    relay, worker = LocalIPCBus(path), LocalIPCBus(path)
+    await collect(relay)
+    await collect(worker)
+    worker.publish({"origin": "b", "kind": KIND_STATE, "user_id": "user", "data": {"round_number": 3}})
+    await asyncio.sleep(0.05)
+    assert await relay.get_state("user") == {"round_number": 3}
+
+    await relay.stop()
+    for _ in range(100):
+        if worker.is_relay:
+            break
+        await asyncio.sleep(0.01)
+
+    newcomer = LocalIPCBus(path)
+    await collect(newcomer)
+    assert await newcomer.get_state("user") == {"round_number": 3}
+    await newcomer.stop()
+    await worker.stop()
@@ -0,0 +1,144 @@
+import pytest
+from app import timer_repository
+from app.timer_eviction import IdleTracker
+from app.ws_manager_supabase import ConnectionManager
+from app.timer_state import DEFAULT_POMODORO_SETTINGS
+
+def test_idle_tracker_orders_by_last_activity():
+    """Test that touching a user moves them to the back of the eviction order"""
+    tracker = IdleTracker()
+    tracker.touch("a", now=1.0)
+    tracker.touch("b", now=2.0)
+    tracker.touch("a", now=3.0)
+
+    assert [user_id for user_id, _ in tracker.oldest_first()] == ["b", "a"]
+    tracker.forget("b")
+    assert "b" not in tracker
+    assert len(tracker) == 1
+
+@pytest.mark.asyncio
+async def test_idle_paused_timer_is_evicted_and_rehydrated(monkeypatch):
+    """Test that an idle paused timer is checkpointed, dropped and restored on the next command"""
+    manager = ConnectionManager()
+    checkpoints = []
+
+    async def flush_writes(increments, sessions, rows):
+        checkpoints.extend(rows)
+        return {}
+
+    async def pop_evicted_checkpoint(user_id):
+        return checkpoints.pop() if checkpoints else None
+
+    async def fetch_pomodoro_settings(user_id):
+        return DEFAULT_POMODORO_SETTINGS
+
+    manager.write_behind._flush_fn = flush_writes
+    monkeypatch.setattr(timer_repository, "pop_evicted_checkpoint", pop_evicted_checkpoint)
+    monkeypatch.setattr(timer_repository, "fetch_pomodoro_settings", fetch_pomodoro_settings)
+
+    await manager.start_timer("idle", 7, "work", 25 * 60, user_settings=DEFAULT_POMODORO_SETTINGS)
+    manager.timer_states["idle"].pause()
+    manager.timer_states["idle"].round_number = 3
+    remaining = manager.timer_states["idle"].get_remaining_time()
+    await manager.start_timer("busy", 8, "work", 25 * 60, user_settings=DEFAULT_POMODORO_SETTINGS)
+
+    # Only paused timers are evicted; the running one stays
+    last_active = dict(manager.idle_tracker.oldest_first())
+    assert manager.evict_idle(now=max(last_active.values()) + 10 ** 6) == 1
+    assert "idle" not in manager.timer_states
+    assert "busy" in manager.timer_states
+    assert manager.evicted == {"idle"}
+
+    state = await manager.ensure_resident("idle")
+    assert state is manager.timer_states["idle"]
+    assert state.task_id == 7
+    assert state.is_paused
+    assert state.round_number == 3
+    assert state.get_remaining_time() == remaining
+    assert manager.evicted == set()
+    assert manager.rehydrations == 1
+
+    manager.stop_timer("busy")
+    await manager.write_behind.stop()
+    await manager.scheduler.stop()
+
+@pytest.mark.asyncio
+async def test_connected_user_is_not_evicted():
+    """Test that a timer shown on a connected device stays resident"""
+    manager = ConnectionManager()
+    await manager.start_timer("watching", 7, "work", 25 * 60, user_settings=DEFAULT_POMODORO_SETTINGS)
+    manager.timer_states["watching"].pause()
+    manager.active_connections["watching"] = []
+
+    assert manager.evict_idle(now=10 ** 12) == 0
+    assert "watching" in manager.timer_states
+
+    await manager.write_behind.stop()
+    await manager.scheduler.stop()
+
+class FakeWebSocket:
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text):
+        pass
+
+@pytest.mark.asyncio
+async def test_connect_only_rehydrates_evicted_users(monkeypatch):
+    """Test that connecting doesn't query checkpoints for users who were never evicted"""
+    manager = ConnectionManager()
+    popped = []
+
+    async def pop_evicted_checkpoint(user_id):
+        popped.append(user_id)
+        return None
+
+    monkeypatch.setattr(timer_repository, "pop_evicted_checkpoint", pop_evicted_checkpoint)
+    await manager.connect(FakeWebSocket(), "fresh")
+    assert popped == []
+
+    # Evicted by another worker
+    await manager._on_bus_message({"origin": "other", "kind": "state", "user_id": "old", "version": 5, "data": None, "evicted": True})
+    await manager.connect(FakeWebSocket(), "old")
+    assert popped == ["old"]
+    assert manager.evicted == set()
+
+    await manager.write_behind.stop()
+    await manager.scheduler.stop()
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_user_evicted(monkeypatch):
+    """Test that a rehydrate whose checkpoint flush failed is retried on the next command"""
+    manager = ConnectionManager()
+    checkpoints = []
+    failures = [ConnectionError("database unavailable")]
+
+    async def flush_writes(increments, sessions, rows):
+        if failures:
+            raise failures.pop()
+        checkpoints.extend(rows)
+        return {}
+
+    async def pop_evicted_checkpoint(user_id):
+        return checkpoints.pop() if checkpoints else None
+
+    async def fetch_pomodoro_settings(user_id):
+        return DEFAULT_POMODORO_SETTINGS
+
+    manager.write_behind._flush_fn = flush_writes
+    monkeypatch.setattr(timer_repository, "pop_evicted_checkpoint", pop_evicted_checkpoint)
+    monkeypatch.setattr(timer_repository, "fetch_pomodoro_settings", fetch_pomodoro_settings)
+
+    await manager.start_timer("idle", 7, "work", 25 * 60, user_settings=DEFAULT_POMODORO_SETTINGS)
+    manager.timer_states["idle"].pause()
+    assert manager.evict_idle(now=10 ** 12) == 1
+
+    assert await manager.ensure_resident("idle") is None
+    assert manager.evicted == {"idle"}
+
+    state = await manager.ensure_resident("idle")
+    assert state is not None and state.task_id == 7
+    assert manager.evicted == set()
+
+    await manager.write_behind.stop()
+    await manager.scheduler.stop()
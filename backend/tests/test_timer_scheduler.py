@@ -0,0 +1,63 @@
+import pytest
+import asyncio
+import time
+from app.timer_scheduler import TimerScheduler
+
+@pytest.mark.asyncio
+async def test_fires_in_deadline_order():
+    """Test that due timers fire in deadline order"""
+    fired = []
+
+    async def on_deadline(user_id):
+        fired.append(user_id)
+
+    scheduler = TimerScheduler(on_deadline)
+    now = time.monotonic()
+    scheduler.schedule("late", now + 0.10)
+    scheduler.schedule("early", now + 0.02)
+    await asyncio.sleep(0.2)
+
+    assert fired == ["early", "late"]
+    assert len(scheduler) == 0
+    await scheduler.stop()
+
+@pytest.mark.asyncio
+async def test_cancel_and_reschedule():
+    """Test that cancelled or moved deadlines don't fire at the old time"""
+    fired = []
+
+    async def on_deadline(user_id):
+        fired.append((user_id, time.monotonic()))
+
+    scheduler = TimerScheduler(on_deadline)
+    now = time.monotonic()
+    scheduler.schedule("cancelled", now + 0.02)
+    scheduler.schedule("moved", now + 0.02)
+    scheduler.cancel("cancelled")
+    scheduler.schedule("moved", now + 0.15)
+    await asyncio.sleep(0.08)
+    assert fired == []
+
+    await asyncio.sleep(0.15)
+    assert [user_id for user_id, _ in fired] == ["moved"]
+    assert fired[0][1] >= now + 0.15
+    await scheduler.stop()
+
+@pytest.mark.asyncio
+async def test_callback_error_does_not_stop_scheduler():
+    """Test that a failing completion doesn't block other timers"""
+    fired = []
+
+    async def on_deadline(user_id):
+        if user_id == "broken":
+            raise RuntimeError("boom")
+        fired.append(user_id)
+
+    scheduler = TimerScheduler(on_deadline)
+    now = time.monotonic()
+    scheduler.schedule("broken", now)
+    scheduler.schedule("ok", now + 0.02)
+    await asyncio.sleep(0.1)
+
+    assert fired == ["ok"]
+    await scheduler.stop()
@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+import time
+from app.timer_snapshot import TimerSnapshotStore
+from app.timer_state import TimerState, DEFAULT_POMODORO_SETTINGS
+
+def make_state(task_id, running):
+    state = TimerState(task_id=task_id, session_type="work", time_remaining=600, user_settings=DEFAULT_POMODORO_SETTINGS)
+    state.round_number = 3
+    state.state_version = task_id
+    if running:
+        state.resume()
+    return state
+
+@pytest.mark.asyncio
+async def test_snapshot_round_trip(tmp_path):
+    """Test that saved timers come back with their session and remaining time"""
+    path = str(tmp_path / "timers.jsonl")
+    store = TimerSnapshotStore(path)
+    timer_states = {"paused": make_state(1, running=False), "running": make_state(2, running=True)}
+    for user_id in timer_states:
+        store.mark_dirty(user_id)
+    await store.save(timer_states)
+    store.release()
+
+    restored = TimerSnapshotStore(path).load()
+    assert set(restored) == {"paused", "running"}
+    assert restored["paused"].is_paused
+    assert restored["paused"].time_remaining == 600
+    assert restored["running"].round_number == 3
+    assert restored["running"].state_version == 2
+    assert restored["running"].time_remaining == pytest.approx(600, abs=1)
+    assert restored["running"].presets is timer_states["running"].presets
+
+def test_restore_counts_downtime():
+    """Test that a running deadline is rebased on wall-clock time"""
+    data = make_state(1, running=True).to_snapshot()
+    restored = TimerState.from_snapshot(data, wall_now=time.time() + 120)
+    assert restored.time_remaining == pytest.approx(480, abs=1)
+
+    expired = TimerState.from_snapshot(data, wall_now=time.time() + 3600)
+    assert not expired.is_paused
+    assert expired.time_remaining == 0
+
+@pytest.mark.asyncio
+async def test_save_only_reencodes_dirty_timers(tmp_path):
+    """Test that stopped timers are removed and unchanged ones keep their encoded line"""
+    path = str(tmp_path / "timers.jsonl")
+    store = TimerSnapshotStore(path)
+    timer_states = {"a": make_state(1, running=False), "b": make_state(2, running=False)}
+    store.mark_dirty("a")
+    store.mark_dirty("b")
+    await store.save(timer_states)
+    line_a = store._lines["a"]
+
+    del timer_states["b"]
+    timer_states["a"].round_number = 4  # Not marked dirty, so not re-encoded
+    store.mark_dirty("b")
+    await store.save(timer_states)
+
+    assert store._lines == {"a": line_a}
+    store.release()
+    assert TimerSnapshotStore(path).load()["a"].round_number == 3
+
+@pytest.mark.asyncio
+async def test_two_stores_on_one_path_never_mix_timers(tmp_path):
+    """Test that only the store owning the file restores and saves it when two write at once"""
+    path = str(tmp_path / "timers.jsonl")
+    first, second = TimerSnapshotStore(path), TimerSnapshotStore(path)
+    assert first.load() == {}
+    assert second.load() == {}
+    assert first.owned and not second.owned
+
+    first_states = {f"a{i}": make_state(i, running=True) for i in range(50)}
+    second_states = {f"b{i}": make_state(i, running=True) for i in range(50)}
+    for user_id in first_states:
+        first.mark_dirty(user_id)
+    for user_id in second_states:
+        second.mark_dirty(user_id)
+    await asyncio.gather(first.save(first_states), second.save(second_states))
+    await first.stop(first_states)
+
+    assert list(tmp_path.glob("*.tmp")) == []
+    restored = TimerSnapshotStore(path).load()
+    assert set(restored) == set(first_states)
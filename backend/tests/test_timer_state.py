@@ -0,0 +1,43 @@
+import pytest
+import time
+from app.timer_state import TimerState, compile_settings, DEFAULT_POMODORO_SETTINGS
+
+def test_paused_state_keeps_remaining_time():
+    """Test that a paused timer doesn't count down"""
+    state = TimerState(task_id=1, session_type="work", time_remaining=90, user_settings=DEFAULT_POMODORO_SETTINGS)
+    assert state.is_paused
+    assert state.deadline is None
+    assert state.get_remaining_time() == 90
+
+def test_resume_and_pause_track_deadline():
+    """Test that running time is derived from the monotonic deadline"""
+    state = TimerState(task_id=1, session_type="work", time_remaining=60, user_settings=DEFAULT_POMODORO_SETTINGS)
+    state.resume()
+    assert not state.is_paused
+    assert state.deadline == pytest.approx(time.monotonic() + 60, abs=0.1)
+    assert state.seconds_until_deadline(now=state.deadline - 15) == pytest.approx(15)
+    assert state.seconds_until_deadline(now=state.deadline + 5) == 0
+
+    state.pause()
+    assert state.is_paused
+    assert state.time_remaining == pytest.approx(60, abs=0.1)
+
+def test_load_session_uses_preset_durations():
+    """Test that session durations come from the selected preset"""
+    state = TimerState(task_id=None, session_type="work", time_remaining=0, user_settings=DEFAULT_POMODORO_SETTINGS, preset_type="long")
+    state.load_session("short_break")
+    assert state.session_type == "short_break"
+    assert state.is_paused
+    assert state.time_remaining == 10 * 60
+    assert state.duration_for("work", "short") == 25 * 60
+    assert state.sessions_before_long_break == 4
+
+def test_identical_settings_share_presets():
+    """Test that timers with equal settings share one preset mapping"""
+    settings_copy = {preset: dict(values) for preset, values in DEFAULT_POMODORO_SETTINGS.items()}
+    assert compile_settings(settings_copy) is compile_settings(DEFAULT_POMODORO_SETTINGS)
+
+def test_timer_state_has_no_instance_dict():
+    """Test that TimerState uses __slots__"""
+    state = TimerState(task_id=1, session_type="work", time_remaining=60, user_settings=DEFAULT_POMODORO_SETTINGS)
+    assert not hasattr(state, "__dict__")
@@ -0,0 +1,58 @@
+import time
+import pytest
+from app import auth_supabase
+from app.token_cache import TokenCache, token_cache
+from tests.test_auth_supabase_jwt import SECRET, make_token
+
+def test_entries_expire_with_the_token():
+    """Test that a cached token is served until its exp and no longer"""
+    cache = TokenCache()
+    cache.put("live", 1, "user-1", time.time() + 60)
+    cache.put("expired", 1, "user-1", time.time() - 1)
+
+    assert cache.get("live") == "user-1"
+    assert cache.get("expired") is None
+    assert cache.get_stats() == {"size": 1, "hits": 1, "misses": 1}
+
+def test_lru_cap_and_invalidation():
+    """Test that the size cap drops the least recently used token and users can be logged out everywhere"""
+    cache = TokenCache(maxsize=2)
+    exp = time.time() + 60
+    cache.put("a", 1, "user-1", exp)
+    cache.put("b", 2, "user-2", exp)
+    cache.get("a")
+    cache.put("c", 1, "user-1", exp)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "user-1"
+    cache.invalidate("a")
+    assert cache.get("a") is None
+
+    cache.put("d", 1, "user-1", exp)
+    cache.invalidate_user(1)
+    assert cache.get("c") is None and cache.get("d") is None
+    assert len(cache) == 0
+
+@pytest.mark.asyncio
+async def test_verified_tokens_skip_reverification(monkeypatch):
+    """Test that a second request with the same token doesn't decode it again"""
+    monkeypatch.setattr(auth_supabase, "SUPABASE_JWT_SECRET", SECRET)
+    decodes = []
+    decode_token = auth_supabase.decode_token
+
+    async def counting_decode(token):
+        decodes.append(token)
+        return await decode_token(token)
+
+    monkeypatch.setattr(auth_supabase, "decode_token", counting_decode)
+    token_cache.clear()
+    token = make_token()
+    first = await auth_supabase.get_current_user(token)
+    second = await auth_supabase.get_current_user(token)
+
+    assert first == second
+    assert len(decodes) == 1
+    token_cache.invalidate(token)
+    await auth_supabase.get_current_user(token)
+    assert len(decodes) == 2
+    token_cache.clear()
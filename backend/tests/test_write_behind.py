@@ -0,0 +1,111 @@
+import pytest
+import asyncio
+from app.write_behind import WriteBehindQueue
+
+@pytest.mark.asyncio
+async def test_batches_by_interval():
+    """Test that queued writes are merged and flushed together"""
+    batches = []
+
+    async def flush(increments, sessions, checkpoints):
+        batches.append((increments, sessions, checkpoints))
+        return {}
+
+    queue = WriteBehindQueue(flush, interval=0.05)
+    queue.add_increment(1)
+    queue.add_increment(1)
+    queue.add_increment(2)
+    queue.add_session({"session_type": "work"})
+    assert queue.pending_increment(1) == 2
+    await asyncio.sleep(0.15)
+
+    assert batches == [({1: 2, 2: 1}, [{"session_type": "work"}], [])]
+    assert len(queue) == 0
+    await queue.stop()
+
+@pytest.mark.asyncio
+async def test_size_threshold_flushes_early():
+    """Test that reaching max_batch doesn't wait for the interval"""
+    batches = []
+
+    async def flush(increments, sessions, checkpoints):
+        batches.append(len(checkpoints))
+        return {}
+
+    queue = WriteBehindQueue(flush, interval=10, max_batch=3)
+    for _ in range(3):
+        queue.add_checkpoint({"checkpoint_type": "evicted"})
+    await asyncio.sleep(0.05)
+
+    assert batches == [3]
+    await queue.stop()
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_retried_on_stop():
+    """Test that a failed batch is kept and written by the shutdown flush"""
+    attempts = []
+
+    async def flush(increments, sessions, checkpoints):
+        attempts.append(dict(increments))
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+        return {5: 10}
+
+    counts = []
+    queue = WriteBehindQueue(flush, interval=10, on_counts=counts.append)
+    queue.add_increment(5)
+    await queue.flush()
+    queue.add_increment(5)
+    await queue.stop()
+
+    assert attempts == [{5: 1}, {5: 2}]
+    assert counts == [{5: 10}]
+    assert queue.get_stats()["flush"]["errors"] == 1
+
+class ConstraintViolation(Exception):
+    code = "23503"
+
+@pytest.mark.asyncio
+async def test_unwritable_row_is_dropped_without_repeating_increments():
+    """Test that a row failing a constraint is dead-lettered and the rest written exactly once"""
+    written = {"increments": {}, "sessions": []}
+
+    async def flush(increments, sessions, checkpoints):
+        # All or nothing, like the flush_timer_writes transaction
+        if any(row["task_id"] is None for row in sessions):
+            raise ConstraintViolation("violates foreign key constraint")
+        for task_id, amount in increments.items():
+            written["increments"][task_id] = written["increments"].get(task_id, 0) + amount
+        written["sessions"].extend(sessions)
+        return {}
+
+    queue = WriteBehindQueue(flush, interval=0.01, is_permanent=lambda e: getattr(e, "code", "").startswith("23"))
+    queue.add_increment(1)
+    queue.add_session({"task_id": None})
+    queue.add_session({"task_id": 1})
+    await asyncio.sleep(0.1)
+    await queue.stop()
+
+    assert written == {"increments": {1: 1}, "sessions": [{"task_id": 1}]}
+    assert queue.get_stats()["dead_letters"] == 1
+    assert len(queue) == 0
+
+@pytest.mark.asyncio
+async def test_stop_waits_for_a_flush_in_progress():
+    """Test that stopping doesn't cancel a flush whose writes may already be committed"""
+    started = asyncio.Event()
+    calls = []
+
+    async def flush(increments, sessions, checkpoints):
+        calls.append(dict(increments))
+        started.set()
+        await asyncio.sleep(0.05)
+        return {}
+
+    queue = WriteBehindQueue(flush, interval=0.01)
+    queue.add_increment(7)
+    await started.wait()
+    await queue.stop()
+
+    assert calls == [{7: 1}]
+    assert len(queue) == 0
@@ -0,0 +1,58 @@
+import pytest
+from app import schemas
+from app.ws_commands import CommandRegistry
+
+@pytest.mark.asyncio
+async def test_dispatch_validates_payload_and_counts_latency():
+    """Test that a command's payload is validated into its model before the handler runs"""
+    commands = CommandRegistry()
+    received = []
+
+    @commands.command("start", schemas.StartTimerCommand)
+    async def start(user_id, command):
+        received.append((user_id, command))
+
+    assert await commands.dispatch({"type": "start", "task_id": 7, "preset_type": "long"}, "user")
+    user_id, command = received[0]
+    assert user_id == "user"
+    assert command.task_id == 7
+    assert command.session_type == schemas.SessionType.WORK
+    assert command.preset_type == schemas.PresetType.LONG
+    assert command.duration == 25 * 60
+    assert commands.get_stats()["by_command"]["start"]["count"] == 1
+
+@pytest.mark.asyncio
+async def test_dispatch_rejects_unknown_and_invalid_messages():
+    """Test that unknown types and invalid payloads never reach a handler"""
+    commands = CommandRegistry()
+    received = []
+
+    @commands.command("change_preset", schemas.ChangePresetCommand)
+    async def change_preset(command):
+        received.append(command)
+
+    assert not await commands.dispatch({"type": "launch"})
+    assert not await commands.dispatch(["change_preset"])
+    assert not await commands.dispatch({"type": "change_preset", "preset_type": "medium"})
+    assert received == []
+
+    stats = commands.get_stats()
+    assert stats["unknown"] == 2
+    assert stats["invalid"] == 1
+    assert stats["by_command"]["change_preset"]["errors"] == 1
+
+@pytest.mark.asyncio
+async def test_handler_errors_are_counted_and_raised():
+    """Test that a failing handler is recorded as an error for its command"""
+    commands = CommandRegistry()
+
+    @commands.command("stop")
+    async def stop(command):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await commands.dispatch({"type": "stop"})
+    assert commands.get_stats()["by_command"]["stop"]["errors"] == 1
+
+    with pytest.raises(ValueError):
+        commands.command("stop")(stop)
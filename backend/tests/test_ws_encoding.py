@@ -0,0 +1,54 @@
+import asyncio
+import json
+import pytest
+from app import ws_encoding
+from app.ws_manager_supabase import ConnectionManager
+
+msgpack = pytest.importorskip("msgpack")
+
+class FakeWebSocket:
+    def __init__(self):
+        self.texts = []
+        self.binaries = []
+        self.subprotocol = None
+
+    async def accept(self, subprotocol=None):
+        self.subprotocol = subprotocol
+
+    async def send_text(self, text):
+        self.texts.append(text)
+
+    async def send_bytes(self, data):
+        self.binaries.append(data)
+
+def test_negotiate_picks_first_supported_subprotocol():
+    """Test that the client's most preferred encoding we support wins and JSON is the default"""
+    assert ws_encoding.negotiate(["protobuf", "msgpack", "json"]) == "msgpack"
+    assert ws_encoding.negotiate(["protobuf"]) is None
+    assert ws_encoding.negotiate([]) is None
+
+@pytest.mark.asyncio
+async def test_broadcast_encodes_once_per_encoding(monkeypatch):
+    """Test that JSON and msgpack devices of one user each get the message in their own encoding"""
+    calls = []
+    encode = ws_encoding.encode
+
+    def counting_encode(encoding, message):
+        calls.append(encoding)
+        return encode(encoding, message)
+
+    monkeypatch.setattr(ws_encoding, "encode", counting_encode)
+    manager = ConnectionManager()
+    phone, laptop, watch = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await manager.connect(phone, "user")
+    await manager.connect(laptop, "user")
+    await manager.connect(watch, "user", encoding="msgpack")
+    await manager.broadcast_to_user("user", {"type": "rounds_reset"})
+    await asyncio.sleep(0.05)
+
+    assert watch.subprotocol == "msgpack"
+    assert phone.subprotocol is None
+    assert sorted(calls) == ["json", "msgpack"]
+    assert json.loads(phone.texts[0]) == json.loads(laptop.texts[0]) == {"type": "rounds_reset"}
+    assert msgpack.unpackb(watch.binaries[0]) == {"type": "rounds_reset"}
+    assert manager.get_metrics()["connections_by_encoding"] == {"json": 2, "msgpack": 1}
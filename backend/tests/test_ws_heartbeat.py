@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+from app.ws_heartbeat import HeartbeatMonitor
+from app.ws_manager_supabase import ConnectionManager
+
+def test_sweep_pings_live_and_reaps_silent_connections():
+    """Test that one sweep pings responsive sockets and hands back the silent ones together"""
+    monitor = HeartbeatMonitor(interval=10, timeout=30)
+    monitor.add("live", "a", now=0)
+    monitor.add("silent", "b", now=0)
+    monitor.add("also-silent", "c", now=0)
+    monitor.seen("live", now=25)
+
+    to_ping, dead = monitor.sweep(now=40)
+    assert to_ping == ["live"]
+    assert sorted(dead) == [("also-silent", "c"), ("silent", "b")]
+    assert len(monitor) == 1
+    assert monitor.reaped == 2
+
+    monitor.pong("live", now=40.2)
+    stats = monitor.get_stats(now=50)
+    assert stats["rtt"]["count"] == 1
+    assert stats["rtt"]["last_ms"] == pytest.approx(200, abs=1)
+    assert stats["max_age_s"] == 50
+    assert stats["awaiting_pong"] == 0
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+@pytest.mark.asyncio
+async def test_manager_reaps_dead_connections():
+    """Test that reaped connections are closed and removed from active_connections"""
+    manager = ConnectionManager()
+    live, dead = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(live, "user")
+    await manager.connect(dead, "user")
+
+    manager._send_pings([live])
+    await manager._reap_connections([(dead, "user")])
+    await asyncio.sleep(0.05)
+
+    assert live.sent == ['{"type":"ping"}']
+    assert dead.closed_with == 1011
+    assert manager.active_connections["user"] == {live}
+    assert dead not in manager.outboxes
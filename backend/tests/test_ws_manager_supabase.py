@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from app import timer_repository
+from app.ws_manager_supabase import ConnectionManager
+from app.timer_state import DEFAULT_POMODORO_SETTINGS
+
+@pytest.mark.asyncio
+async def test_completion_is_written_behind(monkeypatch):
+    """Test that a finished work session is queued, shown at once and written in one batch"""
+    manager = ConnectionManager()
+    manager.task_cache.put(7, {"id": 7, "title": "Write report", "completed_pomodoros": 2, "estimated_pomodoros": 4})
+    batches = []
+
+    async def flush_writes(increments, sessions, checkpoints):
+        batches.append((dict(increments), list(sessions)))
+        return {7: 3}
+
+    manager.write_behind._flush_fn = flush_writes
+    await manager.start_timer("user", 7, "work", 25 * 60, user_settings=DEFAULT_POMODORO_SETTINGS)
+    await manager.handle_session_completion("user")
+
+    assert manager.timer_states["user"].session_type == "short_break"
+    assert manager.task_cache.get(7)["completed_pomodoros"] == 3
+    assert batches == []
+
+    await manager.write_behind.stop()
+    await manager.scheduler.stop()
+    increments, sessions = batches[0]
+    assert increments == {7: 1}
+    assert sessions[0]["session_type"] == "work"
+    assert sessions[0]["completed"] is True
+    assert manager.task_cache.get(7)["completed_pomodoros"] == 3
+
+@pytest.mark.asyncio
+async def test_load_user_settings_queries_once(monkeypatch):
+    """Test that settings are fetched asynchronously and then served from the cache"""
+    calls = []
+
+    async def fetch_pomodoro_settings(user_id):
+        calls.append(user_id)
+        return DEFAULT_POMODORO_SETTINGS
+
+    monkeypatch.setattr(timer_repository, "fetch_pomodoro_settings", fetch_pomodoro_settings)
+    manager = ConnectionManager()
+    first = await manager.load_user_settings("settings-user")
+    second = await manager.load_user_settings("settings-user")
+
+    assert first is second
+    assert first.short.work_duration == 25
+    assert calls == ["settings-user"]
+
+@pytest.mark.asyncio
+async def test_increment_uses_single_rpc(monkeypatch):
+    """Test that completing a pomodoro is one RPC call returning the new count"""
+    calls = []
+
+    class FakeResponse:
+        data = 5
+
+    class FakeRPC:
+        async def execute(self):
+            return FakeResponse()
+
+    class FakeClient:
+        def rpc(self, name, params):
+            calls.append((name, params))
+            return FakeRPC()
+
+    async def get_async_supabase():
+        return FakeClient()
+
+    monkeypatch.setattr(timer_repository, "get_async_supabase", get_async_supabase)
+    assert await timer_repository.increment_completed_pomodoros(7) == 5
+    assert calls == [("increment_completed_pomodoros", {"p_task_id": 7})]
+
+@pytest.mark.asyncio
+async def test_hung_rehydrate_does_not_block_shard(monkeypatch):
+    """Test that a user stuck on the database doesn't hold up another user in the same shard"""
+    manager = ConnectionManager()
+    slow = "slow-user"
+    other = next(f"user-{i}" for i in range(1000) if manager.timer_states.shard(f"user-{i}") is manager.timer_states.shard(slow))
+    manager.evicted.add(slow)
+    hung = asyncio.Event()
+
+    async def pop_evicted_checkpoint(user_id):
+        await hung.wait()
+
+    monkeypatch.setattr(timer_repository, "pop_evicted_checkpoint", pop_evicted_checkpoint)
+
+    async def command(user_id):
+        async with manager.lock_for(user_id):
+            await manager.ensure_resident(user_id)
+
+    stuck = asyncio.create_task(command(slow))
+    await asyncio.sleep(0.01)
+    await asyncio.wait_for(command(other), timeout=1)
+    assert not stuck.done()
+
+    hung.set()
+    await stuck
+    await manager.write_behind.stop()
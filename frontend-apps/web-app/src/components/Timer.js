@@ -26,6 +26,12 @@ export default function Timer({ currentTask, currentPreset, setCurrentPreset, se
   
     ws.onmessage = (event) => {
       const data = JSON.parse(event.data);
+
+      // Answer server heartbeats so the connection isn't reaped as dead
+      if (data.type === 'ping') {
+        ws.send(JSON.stringify({ type: 'pong' }));
+        return;
+      }
   
       if (data.type === 'timer_sync') {
         const { preset_type, ...otherData } = data.data;
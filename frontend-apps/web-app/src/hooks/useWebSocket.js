@@ -45,6 +45,12 @@ export default function useWebSocket(token, onMessageCallback = null) {
       websocket.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
+
+          // Answer server heartbeats so the connection isn't reaped as dead
+          if (data.type === 'ping') {
+            websocket.send(JSON.stringify({ type: 'pong' }));
+            return;
+          }
           console.log('WebSocket message received:', data);
           
           // Call the callback function if provided
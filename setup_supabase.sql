@@ -19,9 +19,12 @@ CREATE TABLE IF NOT EXISTS tasks (
   created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
   completed_at TIMESTAMP WITH TIME ZONE,
   is_active BOOLEAN DEFAULT TRUE,
-  position INTEGER DEFAULT 999999
+  position INTEGER
 );
 
+-- Positions are spaced 1024 apart and filled in by tasks_assign_position
+ALTER TABLE tasks ALTER COLUMN position DROP DEFAULT;
+
 -- Create Pomodoro Sessions Table
 CREATE TABLE IF NOT EXISTS pomodoro_sessions (
   id SERIAL PRIMARY KEY,
@@ -93,8 +96,112 @@ CREATE POLICY "Allow anonymous to view checkpoints" ON pomodoro.pomodoro_checkpo
 FOR SELECT TO anon
 USING (true);
 
+-- Create Functions
+-- Atomically add one completed pomodoro to a task and return the new count
+CREATE OR REPLACE FUNCTION pomodoro.increment_completed_pomodoros(p_task_id INTEGER)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+  UPDATE pomodoro.tasks
+  SET completed_pomodoros = COALESCE(completed_pomodoros, 0) + 1
+  WHERE id = p_task_id
+  RETURNING completed_pomodoros;
+$$;
+
+GRANT EXECUTE ON FUNCTION pomodoro.increment_completed_pomodoros(INTEGER) TO authenticated, service_role;
+
+-- Write a write-behind batch (pomodoro increments, session rows, checkpoint rows) in one transaction
+CREATE OR REPLACE FUNCTION pomodoro.flush_timer_writes(p_task_ids INTEGER[], p_amounts INTEGER[], p_sessions JSONB, p_checkpoints JSONB)
+RETURNS TABLE (task_id INTEGER, completed_pomodoros INTEGER)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+BEGIN
+  INSERT INTO pomodoro.pomodoro_sessions (user_id, task_id, start_time, end_time, session_type, completed, current_session_number)
+  SELECT s.user_id, s.task_id, COALESCE(s.start_time, NOW()), s.end_time, s.session_type, COALESCE(s.completed, FALSE), s.current_session_number
+  FROM jsonb_populate_recordset(NULL::pomodoro.pomodoro_sessions, COALESCE(p_sessions, '[]'::JSONB)) AS s;
+
+  INSERT INTO pomodoro.pomodoro_checkpoints (user_id, task_id, checkpoint_type, timestamp, remaining_time, session_type, is_paused, round_number, preset_type, last_active)
+  SELECT c.user_id, c.task_id, c.checkpoint_type, COALESCE(c.timestamp, NOW()), c.remaining_time, c.session_type,
+         COALESCE(c.is_paused, FALSE), c.round_number, c.preset_type, COALESCE(c.last_active, NOW())
+  FROM jsonb_populate_recordset(NULL::pomodoro.pomodoro_checkpoints, COALESCE(p_checkpoints, '[]'::JSONB)) AS c;
+
+  RETURN QUERY
+  UPDATE pomodoro.tasks AS t
+  SET completed_pomodoros = COALESCE(t.completed_pomodoros, 0) + d.amount
+  FROM unnest(p_task_ids, p_amounts) AS d(id, amount)
+  WHERE t.id = d.id
+  RETURNING t.id, t.completed_pomodoros;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION pomodoro.flush_timer_writes(INTEGER[], INTEGER[], JSONB, JSONB) TO service_role;
+
+-- Give a new task without a position one gap (1024) after the user's last task.
+-- Concurrent inserts for one user take turns on an advisory lock, so they can't read the same MAX.
+CREATE OR REPLACE FUNCTION pomodoro.assign_task_position()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF NEW.position IS NULL THEN
+    PERFORM pg_advisory_xact_lock(hashtext(NEW.user_id::text));
+    SELECT COALESCE(MAX(position), 0) + 1024 INTO NEW.position
+    FROM pomodoro.tasks
+    WHERE user_id = NEW.user_id;
+  END IF;
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tasks_assign_position ON pomodoro.tasks;
+CREATE TRIGGER tasks_assign_position
+  BEFORE INSERT ON pomodoro.tasks
+  FOR EACH ROW EXECUTE FUNCTION pomodoro.assign_task_position();
+
+-- Respace a user's tasks 1024 apart, keeping their order, once a move finds no gap left
+CREATE OR REPLACE FUNCTION pomodoro.rebalance_task_positions(p_user_id UUID)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+  UPDATE pomodoro.tasks AS t
+  SET position = r.rank * 1024
+  FROM (
+    SELECT id, row_number() OVER (ORDER BY position, id) AS rank
+    FROM pomodoro.tasks
+    WHERE user_id = p_user_id
+  ) AS r
+  WHERE t.id = r.id;
+$$;
+
+GRANT EXECUTE ON FUNCTION pomodoro.rebalance_task_positions(UUID) TO service_role;
+
+-- Set a user's task positions in one statement, returning how many were set.
+-- Nothing is written unless every ID belongs to the user.
+CREATE OR REPLACE FUNCTION pomodoro.reorder_tasks(p_user_id UUID, p_task_ids INTEGER[], p_positions INTEGER[])
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+  WITH updated AS (
+    UPDATE pomodoro.tasks AS t
+    SET position = d.position
+    FROM unnest(p_task_ids, p_positions) AS d(id, position)
+    WHERE t.id = d.id
+      AND t.user_id = p_user_id
+      AND (
+        SELECT count(*) FROM pomodoro.tasks
+        WHERE user_id = p_user_id AND id = ANY(p_task_ids)
+      ) = cardinality(p_task_ids)
+    RETURNING t.id
+  )
+  SELECT count(*)::INTEGER FROM updated;
+$$;
+
+GRANT EXECUTE ON FUNCTION pomodoro.reorder_tasks(UUID, INTEGER[], INTEGER[]) TO service_role;
+
 -- Create Indexes for Better Performance
 CREATE INDEX IF NOT EXISTS idx_tasks_user_id ON tasks(user_id);
+CREATE INDEX IF NOT EXISTS idx_tasks_user_id_position ON tasks(user_id, position);
 CREATE INDEX IF NOT EXISTS idx_pomodoro_sessions_user_id ON pomodoro_sessions(user_id);
 CREATE INDEX IF NOT EXISTS idx_pomodoro_sessions_task_id ON pomodoro_sessions(task_id);
 CREATE INDEX IF NOT EXISTS idx_pomodoro_checkpoints_user_id ON pomodoro_checkpoints(user_id);